@@ -26,7 +26,7 @@ from dataclasses import dataclass, field
 from os.path import dirname, join as pj
 from typing import Dict, List, Optional
 
-from Bio import SeqIO  # type: ignore
+from gffstruct.utils import FastaIndex
 
 
 @dataclass
@@ -142,13 +142,9 @@ class SeqRegionConf:
         """load actual seq_region nmaes and length from the fasta file if provided"""
         if not fasta_file:
             return
-        _open = fasta_file.endswith(".gz") and gzip.open or open
-        with _open(fasta_file, "rt") as fasta:
-            fasta_parser = SeqIO.parse(fasta, "fasta")
-            for rec in fasta_parser:
-                self.seq_regions[rec.name] = dc.replace(
-                    self.seq_regions[rec.name], name=rec.name, length=len(rec)
-                )
+        # lengths from the cached index (.fai or .seqlen, built and stored next to the fasta if absent)
+        for name, length in FastaIndex(fasta_file).lengths().items():
+            self.seq_regions[name] = dc.replace(self.seq_regions[name], name=name, length=length)
         return
 
     def fill_info_from_tech(self, tech_data: Optional[dict]) -> None:
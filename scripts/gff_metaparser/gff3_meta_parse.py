@@ -75,6 +75,14 @@ def get_args():
         required=False,
         help="do not extend contig length based on the feature boundaries (try to omit, if fails)",
     )
+    parser.add_argument(
+        "--workers",
+        metavar="1",
+        required=False,
+        type=int,
+        default=1,
+        help="number of processes to walk the batches of contigs in parallel [1]",
+    )
     # output
     parser.add_argument(
         "--gff_out",
@@ -144,11 +152,19 @@ def main():
     )
 
     gff3_walker.walk(
-        out_file=args.gff_out, seq_len_dict=seq_len, contig_length_extension=not args.no_contig_len_extenstion
+        out_file=args.gff_out,
+        seq_len_dict=seq_len,
+        contig_length_extension=not args.no_contig_len_extenstion,
+        workers=args.workers,
     )
 
-    fann_ctx.dump(args.fann_out, maps=[xref_map], dump_filter=lambda x: not seq_region_filter(x))
-    fann_ctx.dump(args.seq_region_out, dump_filter=lambda x: seq_region_filter(x))
+    fann_ctx.dump_json_many(
+        [
+            (args.fann_out, lambda x: not seq_region_filter(x)),
+            (args.seq_region_out, lambda x: seq_region_filter(x)),
+        ],
+        maps=[xref_map],
+    )
 
 
 # main
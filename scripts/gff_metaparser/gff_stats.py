@@ -42,6 +42,14 @@ def get_args():
     parser.add_argument(
         "--no_id_stats", action="store_true", required=False, help="do not dump stemmed id stats"
     )
+    parser.add_argument(
+        "--id_stats_top",
+        metavar="10",
+        required=False,
+        type=int,
+        default=0,
+        help="dump only this number of the most common stemmed ids for each type [all]",
+    )
     parser.add_argument(
         "--fail_unknown", action="store_true", required=False, help="fail if unknown structure met"
     )
@@ -73,6 +81,14 @@ def get_args():
         required=False,
         help="do not extend contig length based on the feature boundaries (try to omit, if fails)",
     )
+    parser.add_argument(
+        "--workers",
+        metavar="1",
+        required=False,
+        type=int,
+        default=1,
+        help="number of processes to walk the batches of contigs in parallel [1]",
+    )
     # output
     parser.add_argument(
         "--stats_out",
@@ -133,18 +149,26 @@ def main():
 
     no_id_stats_rules = ["UNSEEN", "IGNORE"]  # no id stats for these rules
     stats_keeper = StatsKeeper(
-        detailed=args.detailed_report, no_longest_pfx=args.no_longest_pfx, no_id_stats_rules=no_id_stats_rules
+        detailed=args.detailed_report,
+        no_longest_pfx=args.no_longest_pfx,
+        no_id_stats_rules=no_id_stats_rules,
+        no_id_stats=args.no_id_stats,
     )
     gff3_walker = GFF3Walker(parser, args.gff_in, structure_tags="fullPath", global_ctx=stats_keeper)
 
     gff_out = args.gff_out
     if args.stats_only:
         gff_out = None
+    # detailed report lines are written in the walk order, no parallel walk
+    workers = not args.detailed_report and args.workers or 1
     gff3_walker.walk(
-        out_file=gff_out, seq_len_dict=seq_len, contig_length_extension=not args.no_contig_len_extenstion
+        out_file=gff_out,
+        seq_len_dict=seq_len,
+        contig_length_extension=not args.no_contig_len_extenstion,
+        workers=workers,
     )
 
-    stats_keeper.dump(args.stats_out, id_stats=not args.no_id_stats)
+    stats_keeper.dump(args.stats_out, id_stats=not args.no_id_stats, id_stats_top=args.id_stats_top)
 
     if args.fail_unknown:
         unseen_stats = stats_keeper.summary("UNSEEN")
@@ -24,3 +24,10 @@ class BaseKeeper:
 
     def dump(self):
         pass
+
+    def spawn(self):
+        # empty keeper with the same settings (i.e. for a parallel walk shard)
+        return self.__class__()
+
+    def merge(self, other):
+        pass
@@ -16,6 +16,7 @@
 
 # base structures
 
+import re
 import sys
 
 from collections import defaultdict
@@ -26,6 +27,9 @@ from .rules import UnseenRule
 # BASE STRUCTURES class
 class BaseStructures:
     KNOWN_RULES = []
+    # to merge the regex rules
+    _NAMED_GROUP_RE = re.compile(r"\(\?P<\w+>")
+    _BACKREF_RE = re.compile(r"\(\?P=|\\[1-9]")
 
     def __init__(self, config, conf_patch=None, rule_options=None):
         self.rule_names = [r.NAME.lower().strip() for r in self.KNOWN_RULES]
@@ -56,6 +60,38 @@ class BaseStructures:
             # regex_pattersn are checked dynamically for multiple hits
             self.regex_patterns += factory.regex_patterns()
 
+        self.compile_dispatch()
+
+    def compile_dispatch(self):
+        # tag -> (lower-cased tag, matched rules), filled on the first sight of a tag
+        self._dispatch = dict()
+        # all the regex rules merged into a single alternation, to reject the tags matching none of them
+        # (named groups are made anonymous, because the same alias can be used by several rules)
+        self._any_regex = None
+        if not self.regex_patterns:
+            return
+        patterns = [it.pattern for it in self.regex_patterns]
+        if any(self._BACKREF_RE.search(pat) for pat in patterns):
+            return
+        merged = "|".join("(?:%s)" % self._NAMED_GROUP_RE.sub("(?:", pat) for pat in patterns)
+        try:
+            self._any_regex = re.compile(merged, flags=re.I)
+        except re.error as e:
+            print("can't merge regex patterns, matching them one by one: %s" % str(e), file=sys.stderr)
+
+    def match_rules(self, tag_raw):
+        tag = tag_raw.lower().strip()
+
+        matched_rules = [MatchedRuleCtx(rule) for rule in self.const_patterns.get(tag, [])]
+        # all the matching regex rules are used, in the config order
+        if self._any_regex is None or self._any_regex.fullmatch(tag_raw):
+            for it in self.regex_patterns:
+                matching = it.re.fullmatch(tag_raw)
+                if matching:
+                    matched_rules.append(MatchedRuleCtx(it.rule, matching))
+
+        return tag, tuple(matched_rules)
+
     def parse_conf_str(self, raw):
         (nocmt, *_) = raw.partition("#")
         nocmt = nocmt.strip()
@@ -138,17 +174,10 @@ class BaseStructures:
 
     def process(self, context, ignore_unseen=False):
         tag_raw = context.tag()
-        tag = tag_raw.lower().strip()
-
-        matched_rules = []
-        if tag in self.const_patterns:
-            matched_rules += list(map(lambda x: MatchedRuleCtx(x), self.const_patterns[tag]))
-        # or stop if there's a constant match
-        for it in self.regex_patterns:
-            # print("matching regexp ", it.pattern, "tag", tag, file = sys.stderr )
-            matching = it.re.fullmatch(tag_raw)
-            if matching:
-                matched_rules.append(MatchedRuleCtx(it.rule, matching))
+        dispatched = self._dispatch.get(tag_raw)
+        if dispatched is None:
+            dispatched = self._dispatch[tag_raw] = self.match_rules(tag_raw)
+        tag, matched_rules = dispatched
 
         processed_rules = defaultdict(list)
 
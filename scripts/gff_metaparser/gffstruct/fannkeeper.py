@@ -22,10 +22,32 @@ from collections import defaultdict, OrderedDict
 from .basekeeper import BaseKeeper
 
 
+_JSON_ENCODER = json.JSONEncoder(indent=2, sort_keys=True)
+
+
 class FannKeeper(BaseKeeper):
     # storing result functional annotation object
     def __init__(self):
         self._data = defaultdict(lambda: defaultdict(OrderedDict))
+        # id(list) -> [list, canonical keys of its items, list length the keys were built for]
+        self._list_keys = dict()
+
+    def __getstate__(self):
+        # no lambdas and no list ids
+        return {"_data": {tag: objs for tag, objs in self._data.items()}}
+
+    def __setstate__(self, state):
+        self._data = defaultdict(lambda: defaultdict(OrderedDict), state["_data"])
+        self._list_keys = dict()
+
+    def merge(self, other):
+        # add objects from the other keeper, lists are extended and the already present values are kept
+        for obj_tag, objs in other._data.items():
+            for obj_id, obj in objs.items():
+                if obj_id not in self._data[obj_tag]:
+                    self._data[obj_tag][obj_id] = obj
+                else:
+                    self.add(obj_tag, obj_id, None, obj)
 
     def get(self, obj_tag, obj_id, path):
         if not obj_tag:
@@ -74,11 +96,12 @@ class FannKeeper(BaseKeeper):
         # update top
         if type(top) == list:
             if not force:
-                if not self.list_has(top, value):
-                    top.append(value)
+                self.extend_uniq(top, [value])
             else:
                 top.clear()
                 top.append(value)
+                # the length may be the same, the stored keys are stale
+                self._list_keys.pop(id(top), None)
             return
         for k, v in value.items():
             if not v:
@@ -88,9 +111,9 @@ class FannKeeper(BaseKeeper):
                 continue
             if type(v) == list:
                 if not force:
-                    top[k] += v
-                    top[k] = self.uniq_list(top[k])
+                    self.extend_uniq(top[k], v)
                 else:
+                    self._list_keys.pop(id(top[k]), None)
                     top[k] = [v]
                 continue
             if not force:
@@ -98,33 +121,101 @@ class FannKeeper(BaseKeeper):
             top[k] = v
         return
 
+    @classmethod
+    def canonical_key(cls, obj):
+        # hashable form, the same for the objects with the same json representation
+        obj_type = type(obj)
+        if obj_type == str:
+            return obj
+        if obj_type == dict:
+            return ("_DICT",) + tuple(sorted((k, cls.canonical_key(v)) for k, v in obj.items()))
+        if obj_type == list:
+            return ("_LIST",) + tuple(map(cls.canonical_key, obj))
+        # 1, 1.0 and True are the same keys for python
+        return (obj_type, obj)
+
+    def list_keys(self, lst):
+        # canonical keys of the list items, (re)built and deduplicating the list if it was changed elsewhere
+        entry = self._list_keys.get(id(lst))
+        if entry is None or entry[0] is not lst or entry[2] != len(lst):
+            uniq, keys = self.uniq_keys(lst)
+            if len(uniq) != len(lst):
+                lst[:] = uniq
+            entry = self._list_keys[id(lst)] = [lst, keys, len(lst)]
+        return entry
+
+    def extend_uniq(self, lst, items):
+        # append the items not in the list yet, keeping the order
+        entry = self.list_keys(lst)
+        keys = entry[1]
+        for it in items:
+            key = self.canonical_key(it)
+            if key not in keys:
+                keys.add(key)
+                lst.append(it)
+        entry[2] = len(lst)
+
+    def uniq_keys(self, lst):
+        keys = set()
+        uniq = []
+        for it in lst:
+            key = self.canonical_key(it)
+            if key not in keys:
+                keys.add(key)
+                uniq.append(it)
+        return uniq, keys
+
     def uniq_list(self, lst):
-        # slow
         if len(lst) <= 1:
             return lst
-        return [json.loads(p) for p in frozenset(map(lambda x: json.dumps(x, sort_keys=True), lst))]
+        return self.uniq_keys(lst)[0]
 
     def list_has(self, lst, obj):
-        # slow
         if not lst or obj is None or len(lst) < 1:
             return False
-        prj = json.dumps(obj, sort_keys=True)
-        return prj in frozenset(map(lambda x: json.dumps(x, sort_keys=True), lst))
-
-    def dump_json(self, out_file, maps=None, dump_filter=None):
-        if not out_file:
+        return self.canonical_key(obj) in self.list_keys(lst)[1]
+
+    @staticmethod
+    def has_data(obj):
+        return any(k != "_STASH" for k in obj)
+
+    @staticmethod
+    def obj2json(obj):
+        # the same as an item of json.dump(..., indent=2, sort_keys=True), without "_STASH"
+        if "_STASH" in obj:
+            # a short-lived view, not to keep copies of all the objects
+            obj = {k: v for k, v in obj.items() if k != "_STASH"}
+        return _JSON_ENCODER.encode(obj).replace("\n", "\n  ")
+
+    def dump_json_many(self, outputs, maps=None):
+        # single pass over the stored objects, writing each one to all the outputs accepting it
+        #   outputs: list of (out_file, dump_filter) pairs,
+        #   dump_filter gets stored objects (with "_STASH"), the ones with no data are skipped if it's None
+        outputs = [(out_file, dump_filter or self.has_data) for out_file, dump_filter in outputs if out_file]
+        out_files = [out_file for out_file, _ in outputs]
+        if len(set(map(id, out_files))) != len(out_files):
+            # can't interleave arrays on the same stream (i.e. STDOUT), dumping one after another
+            for out_file, dump_filter in outputs:
+                self.dump_json_many([(out_file, dump_filter)], maps)
             return
-        vals = []
+
+        seps = ["[\n  "] * len(outputs)
         for tag in sorted(self._data.keys()):
-            no_stashed = []
-            for h in self._data[tag].values():
-                x = h
-                if "_STASH" in x:
-                    x = h.copy()
-                    x.pop("_STASH")
-                no_stashed.append(x)
-            vals += list(filter(dump_filter, no_stashed))
-        json.dump(vals, out_file, indent=2, sort_keys=True)
+            for obj in self._data[tag].values():
+                encoded = None
+                for i, (out_file, dump_filter) in enumerate(outputs):
+                    if not dump_filter(obj):
+                        continue
+                    if encoded is None:
+                        encoded = self.obj2json(obj)
+                    out_file.write(seps[i])
+                    out_file.write(encoded)
+                    seps[i] = ",\n  "
+        for i, (out_file, _) in enumerate(outputs):
+            out_file.write(seps[i] == "[\n  " and "[]" or "\n]")
+
+    def dump_json(self, out_file, maps=None, dump_filter=None):
+        self.dump_json_many([(out_file, dump_filter)], maps)
 
     def dump(self, out_file, maps=None, dump_filter=None):
         self.dump_json(out_file, maps, dump_filter)
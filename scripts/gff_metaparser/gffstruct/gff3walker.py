@@ -15,8 +15,15 @@
 
 
 import functools
+import multiprocessing
+import os
 import re
+import shutil
 import sys
+import tempfile
+
+from collections import defaultdict
+from contextlib import nullcontext
 
 from BCBio import GFF
 
@@ -26,6 +33,20 @@ from .utils import UpdatingLen
 from .walkcontext import WalkContext
 
 
+# walker and walk options for the forked workers of GFF3Walker.walk_parallel
+_SHARD_JOB = None
+
+
+def _walk_shard(shard):
+    walker, seq_len_dict, contig_length_extension = _SHARD_JOB
+    shard_in, shard_out = shard
+    # each shard gets its own global context, merged back in the shards order
+    global_ctx = walker.global_context.spawn()
+    with open(shard_in) as in_file, shard_out and open(shard_out, "w") or nullcontext() as out_file:
+        walker.walk_contigs(GFF.parse(in_file), global_ctx, out_file, seq_len_dict, contig_length_extension)
+    return global_ctx
+
+
 class GFF3Walker:
     _valid_structure_tags = frozenset("fullPath anyQual".split())  # /gene/mrna/exon vs exon/id, exon
 
@@ -71,10 +92,19 @@ class GFF3Walker:
             self._supported_fields[tp] = frozenset(obj.__dir__())
         return field in self._supported_fields[tp]
 
-    def walk(self, out_file=None, seq_len_dict=None, contig_length_extension=True):
+    def walk(self, out_file=None, seq_len_dict=None, contig_length_extension=True, workers=1):
+        can_fork = "fork" in multiprocessing.get_all_start_methods()
+        if workers > 1 and self.global_context is not None and can_fork:
+            self.walk_parallel(out_file, seq_len_dict, contig_length_extension, workers)
+            return
         gff = GFF.parse(self._in_file)
+        self.walk_contigs(gff, self.global_context, out_file, seq_len_dict, contig_length_extension)
+
+    def walk_contigs(
+        self, contigs, global_ctx, out_file=None, seq_len_dict=None, contig_length_extension=True
+    ):
         sf_composer = SeqFeatComposer()  #  ?? init composer once, get on __init__???
-        for contig in gff:
+        for contig in contigs:
             # get len from gff or fna file, try to infere if not available
             ctg_len_pre = len(contig)
             if not contig_length_extension:
@@ -87,20 +117,163 @@ class GFF3Walker:
                 out_rec_features = []
             for cnt, topft in enumerate(contig.features):
                 # iterate through all of the features
-                context = WalkContext(global_context=self.global_context, ctg_len_inferer=ctg_len)
+                context = WalkContext(global_context=global_ctx, ctg_len_inferer=ctg_len)
                 context.update("_SEQID", contig.id)
                 self.process_feature(topft, context)
                 # compose gff
                 sf_composer.compose(context, out_rec_features)
+                context.release()
             # dump gff
             sf_composer.gff_write(
                 out_rec_features,
                 contig_id=contig.id,
                 contig_len=len(ctg_len),
                 out_file=out_file,
-                global_context=context.global_context,
+                global_context=global_ctx,
             )
 
+    def walk_parallel(self, out_file=None, seq_len_dict=None, contig_length_extension=True, workers=2):
+        # walk batches of contigs in forked processes, each one with its own global context
+        # contexts are merged and gff outputs concatenated in the order of the sequential walk
+        # NB: ID suffixes are fixed per top-level feature (WalkContext), so they don't depend on sharding,
+        #     but stashed values are rendered with the data from the same shard only
+        #     contigs sharing IDs (or Parent references) are kept in the same shard, GFF.parse links them
+        global _SHARD_JOB
+        with tempfile.TemporaryDirectory(prefix="gff3walker_") as shards_dir:
+            shards_in = self.split_by_contigs(shards_dir, workers * 4)
+            if shards_in is None:
+                print("can't split input by contigs, walking sequentially", file=sys.stderr)
+                gff = GFF.parse(self._in_file)
+                self.walk_contigs(gff, self.global_context, out_file, seq_len_dict, contig_length_extension)
+                return
+            shards_out = [out_file and "%s.out" % shard_in or None for shard_in in shards_in]
+
+            # forked workers flush the inherited std streams buffers on exit
+            for stream in (out_file, sys.stdout, sys.stderr):
+                if stream:
+                    stream.flush()
+
+            _SHARD_JOB = (self, seq_len_dict, contig_length_extension)
+            try:
+                with multiprocessing.get_context("fork").Pool(min(workers, len(shards_in))) as pool:
+                    for shard_ctx in pool.imap(_walk_shard, zip(shards_in, shards_out)):
+                        self.global_context.merge(shard_ctx)
+            finally:
+                _SHARD_JOB = None
+
+            if out_file:
+                for shard_out in shards_out:
+                    with open(shard_out) as shard_file:
+                        shutil.copyfileobj(shard_file, out_file)
+
+    def split_by_contigs(self, shards_dir, shards_num):
+        # split input into files with the batches of contigs (in the GFF.parse order, i.e. sorted ids)
+        #   header lines are copied to every file
+        #   contigs with the same IDs (ID or Parent values) go to the same batch, with the contigs in between
+        #   returns None if input can't be split (has ##FASTA, or all the contigs are linked)
+        in_file = self._in_file
+        if not in_file.seekable():
+            in_file = open(os.path.join(shards_dir, "input.gff3"), "w+")
+            shutil.copyfileobj(self._in_file, in_file)
+            in_file.seek(0)
+            self._in_file = in_file
+        start = in_file.tell()
+
+        header = []
+        contig_lines = defaultdict(int)
+        id_contig = dict()  # the first contig for every ID
+        linked = dict()  # union-find forest of the contigs sharing IDs
+        for line in in_file:
+            if line.startswith("##FASTA"):
+                in_file.seek(start)
+                return None
+            if line.startswith("#"):
+                if not contig_lines:
+                    header.append(line)
+                continue
+            if line.strip():
+                fields = line.strip().split("\t", 8)
+                contig = fields[0]
+                contig_lines[contig] += 1
+                for _id in len(fields) == 9 and self._line_ids(fields[8]) or []:
+                    first = id_contig.setdefault(_id, contig)
+                    if first != contig:
+                        self._link(linked, first, contig)
+        if not contig_lines:
+            in_file.seek(start)
+            return None
+
+        # can't split inside the spans of the linked contigs (in the sorted order)
+        contigs = sorted(contig_lines)
+        span_end = dict()
+        for idx, contig in enumerate(contigs):
+            span_end[self._link_root(linked, contig)] = idx
+        can_split = [True] * len(contigs)
+        reach = -1
+        for idx, contig in enumerate(contigs):
+            can_split[idx] = idx > reach
+            reach = max(reach, span_end[self._link_root(linked, contig)])
+        if not any(can_split[1:]):
+            in_file.seek(start)
+            return None
+
+        # batches of consecutive contigs with about the same number of lines
+        contig_shard = dict()
+        shard_size = sum(contig_lines.values()) / shards_num
+        shard, lines = 0, 0
+        for idx, contig in enumerate(contigs):
+            if lines >= shard_size * (shard + 1) and can_split[idx]:
+                shard += 1
+            contig_shard[contig] = shard
+            lines += contig_lines[contig]
+
+        shards_in = [os.path.join(shards_dir, "shard_%06d.gff3" % i) for i in range(shard + 1)]
+        shard_files = [open(shard_in, "w") for shard_in in shards_in]
+        try:
+            for shard_file in shard_files:
+                shard_file.writelines(header)
+            in_file.seek(start)
+            shard_file = None
+            for line in in_file:
+                if line.startswith("#"):
+                    # the header is already there, the other comments go with the preceding feature lines
+                    if shard_file:
+                        shard_file.write(line)
+                    continue
+                if line.strip():
+                    shard_file = shard_files[contig_shard[line.strip().split("\t", 1)[0]]]
+                    shard_file.write(line)
+        finally:
+            for shard_file in shard_files:
+                shard_file.close()
+        return shards_in
+
+    @staticmethod
+    def _line_ids(attributes):
+        # raw ID and Parent values of the gff3 attributes column
+        for attr in attributes.split(";"):
+            key, _, val = attr.strip().partition("=")
+            if key == "ID":
+                yield val
+            elif key == "Parent":
+                yield from val.split(",")
+
+    @staticmethod
+    def _link_root(linked, contig):
+        root = contig
+        while linked.get(root, root) != root:
+            root = linked[root]
+        # compress path
+        while contig != root:
+            linked[contig], contig = root, linked[contig]
+        return root
+
+    @classmethod
+    def _link(cls, linked, contig_a, contig_b):
+        root_a, root_b = cls._link_root(linked, contig_a), cls._link_root(linked, contig_b)
+        if root_a != root_b:
+            linked[max(root_a, root_b)] = min(root_a, root_b)
+
     def process_feature(self, feat, context):
         # store stats in the context
         loc = feat.location
@@ -0,0 +1,129 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import re
+
+from urllib.parse import quote
+
+
+class GFF3Feature:
+    # composed feature, only the fields used for writing
+    __slots__ = ("location", "strand", "type", "qualifiers", "source", "sub_features")
+
+    def __init__(self, location, strand=None, type=None, qualifiers=None, source=None):
+        self.location = location
+        # strand argument overrides the location one (as for SeqFeature)
+        self.strand = strand if strand is not None else location.strand
+        self.type = type
+        self.qualifiers = dict(qualifiers or {})
+        self.source = source
+        self.sub_features = []
+
+
+class GFF3Writer:
+    # writes composed features as GFF3 lines, the same ones BCBio.GFF.write produces for a SeqRecord
+    _STD_QUALS = ("source", "score", "phase")
+    _STRANDS = {1: "+", -1: "-"}
+    # characters never quoted, no need to call quote for the values with only these
+    _NO_QUOTE_RE = re.compile(r"[A-Za-z0-9_.\-~:/ ]*")
+
+    def __init__(self, out_file):
+        self._out_file = out_file
+        self._seen_ids = set()
+        self._counter = 1
+
+    def write(self, features, contig_id, contig_len=0):
+        # one contig: header, sequence region and the feature trees
+        self._seen_ids = set()
+        self._counter = 1
+        lines = ["##gff-version 3\n"]
+        if contig_len > 0:
+            lines.append("##sequence-region %s 1 %s\n" % (contig_id, contig_len))
+        for feature in features:
+            self.feature_lines(feature, str(contig_id), lines)
+        self._out_file.write("".join(lines))
+
+    def feature_lines(self, feature, contig_id, lines, parent_id=None):
+        quals = {
+            key: [str(val) for val in (vals if isinstance(vals, (list, tuple)) else [vals])]
+            for key, vals in feature.qualifiers.items()
+        }
+
+        out_quals = dict(quals)
+        for std_qual in self._STD_QUALS:
+            if std_qual in out_quals and len(out_quals[std_qual]) == 1:
+                del out_quals[std_qual]
+        if parent_id:
+            out_quals["Parent"] = out_quals.get("Parent", []) + [parent_id]
+        self.update_id(out_quals, len(feature.sub_features) > 0)
+
+        if "phase" in quals:
+            phase = quals["phase"][0]
+        elif feature.type == "CDS":
+            phase = int(quals.get("codon_start", [1])[0]) - 1
+        else:
+            phase = "."
+
+        location = feature.location
+        parts = [
+            contig_id,
+            quals.get("source", ["feature"])[0],
+            feature.type or "sequence_feature",
+            str(location.start + 1),  # 1-based
+            str(location.end),
+            quals.get("score", ["."])[0],
+            self._STRANDS.get(feature.strand, "."),
+            str(phase),
+            self.format_quals(out_quals),
+        ]
+        lines.append("\t".join(parts) + "\n")
+
+        for sub_feature in feature.sub_features:
+            self.feature_lines(sub_feature, contig_id, lines, out_quals["ID"][0])
+
+    def update_id(self, quals, has_children):
+        # record ID, or add a new one if there're children to refer to it
+        cur_id = quals.get("ID")
+        if cur_id:
+            self._seen_ids.update(cur_id)
+        elif has_children:
+            new_id = self.standard_id(quals)
+            if new_id is None:
+                new_id = "biopygen%s" % self._counter
+                while new_id in self._seen_ids:
+                    self._counter += 1
+                    new_id = "biopygen%s" % self._counter
+            self._seen_ids.add(new_id)
+            quals["ID"] = [new_id]
+
+    def standard_id(self, quals):
+        for key in ("transcript_id", "protein_id"):
+            if key in quals:
+                return quals[key][0]
+        return None
+
+    def format_quals(self, quals):
+        out = []
+        for key in sorted(quals.keys()):
+            vals = []
+            for val in quals[key]:
+                val = val.strip()
+                if not self._NO_QUOTE_RE.fullmatch(val):
+                    val = quote(val, safe=":/ ")
+                if key.strip() and val and val not in vals:
+                    vals.append(val)
+            out.append("%s=%s" % (key.strip(), ",".join(vals)))
+        return ";".join(out)
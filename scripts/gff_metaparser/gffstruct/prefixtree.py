@@ -14,30 +14,34 @@
 # limitations under the License.
 
 
+from os.path import commonprefix
+
+
 # finding most commomn prefix
-class PfxTr:
+#   the one shared by all the added strings (what the former trie walk ended with, as no string is empty),
+#   so only the current longest common prefix and the number of strings are kept, not a node per letter
+class CommonPfx:
+    __slots__ = ("pfx", "count")
+
     def __init__(self):
-        self.letters = dict()
+        self.pfx = None
         self.count = int(0)
 
     def add(self, s):
         if s is None or s == "":
             return
-        root = self
-        for c in [""] + list(s):
-            if c not in root.letters:
-                root.letters[c] = PfxTr()
-            root = root.letters[c]
-            root.count += 1
+        self.count += 1
+        if self.pfx is None:
+            self.pfx = s
+        elif not s.startswith(self.pfx):
+            self.pfx = commonprefix((self.pfx, s))
+
+    def merge(self, other):
+        self.count += other.count
+        if self.pfx is None:
+            self.pfx = other.pfx
+        elif other.pfx is not None and not other.pfx.startswith(self.pfx):
+            self.pfx = commonprefix((self.pfx, other.pfx))
 
     def get_max(self):
-        (pfx, max_cnt) = ("", 0)
-        root = self
-        while root.letters:
-            c = max(root.letters.keys(), key=lambda x: root.letters[x].count)
-            if root.letters[c].count < max_cnt:
-                return (pfx, max_cnt)
-            max_cnt = root.letters[c].count
-            pfx += c
-            root = root.letters[c]
-        return (pfx, max_cnt)
+        return (self.pfx or "", self.count)
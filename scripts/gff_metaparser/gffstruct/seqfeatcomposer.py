@@ -16,11 +16,7 @@
 
 import sys
 
-from BCBio import GFF
-
-from Bio.Seq import UnknownSeq
-from Bio.SeqFeature import SeqFeature
-from Bio.SeqRecord import SeqRecord
+from .gff3writer import GFF3Feature, GFF3Writer
 
 
 class SeqFeatComposer:
@@ -37,9 +33,7 @@ class SeqFeatComposer:
             return
         if out_rec_features:
             self.update_stashed(out_rec_features, global_context)
-            out_rec = SeqRecord(UnknownSeq(length=contig_len), id=contig_id)
-            out_rec.features = out_rec_features
-            GFF.write([out_rec], out_file)
+            GFF3Writer(out_file).write(out_rec_features, contig_id, contig_len or 0)
 
     def update_stashed(self, features, global_context):
         if not features or not global_context:
@@ -100,9 +94,8 @@ class SeqFeatComposer:
                 quals["phase"] = phase
             # create feat object
             quals = self.sort_quals(quals)
-            obj = SeqFeature(
-                location, strand=strand, type=_type, qualifiers=quals
-            )  # NB referebce to quals / allows post assign modifications
+            # NB qualifiers are copied
+            obj = GFF3Feature(location, strand=strand, type=_type, qualifiers=quals)
             obj.source = source
             # fill processed
             feat = {
@@ -167,10 +160,8 @@ class SeqFeatComposer:
         # update subfeatures
         for cid, feat in self._processed.items():
             if feat["kids"]:
-                feat["obj"].sub_features = [
-                    self._processed[cid]["obj"]
-                    for cid, _ in sorted(feat["kids"].items(), key=lambda k: -k[1])
-                ]
+                # kids in the reversed order of addition
+                feat["obj"].sub_features = [self._processed[cid]["obj"] for cid in reversed(feat["kids"])]
             else:
                 feat["obj"].sub_features = []
         # fill out
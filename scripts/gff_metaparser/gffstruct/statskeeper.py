@@ -14,26 +14,78 @@
 # limitations under the License.
 
 
+import heapq
 import re
 import sys
 
-from collections import defaultdict, OrderedDict
+from collections import Counter, defaultdict, OrderedDict
 
 from .basekeeper import BaseKeeper
-from .prefixtree import PfxTr
+from .prefixtree import CommonPfx
 
 
 class StatsKeeper(BaseKeeper):
     # storing stats
-    def __init__(self, detailed=None, no_longest_pfx=False, no_id_stats_rules=[]):
+    # number of ids of a type to collect before stemming them at once
+    _ID_BATCH = 1 << 16
+    # ids in a batch are joined with this one, no batch stemming if it's in any of them
+    _ID_SEP = "\0"
+
+    def __init__(self, detailed=None, no_longest_pfx=False, no_id_stats_rules=[], no_id_stats=False):
         self._data = defaultdict(lambda: defaultdict(dict))
         self._detailed = detailed
         self._no_longest_pfx = no_longest_pfx
         self._no_id_stats_rules = frozenset(no_id_stats_rules)
-        self._idstat = defaultdict(lambda: defaultdict(int))
+        self._no_id_stats = no_id_stats
+        # type -> stemmed id -> count (and "_ALL" for the total), filled from the batches of raw ids
+        self._idstat = defaultdict(Counter)
+        self._idbatch = defaultdict(list)
         self._tr_d_0 = str.maketrans("123456789", "0" * 9)
         self._tr_00_0 = re.compile("0+")
 
+    def __getstate__(self):
+        # no lambdas and no detailed report file
+        self.flush_ids()
+        state = self.__dict__.copy()
+        state["_data"] = {rule: dict(tags) for rule, tags in self._data.items()}
+        state["_idstat"] = dict(self._idstat)
+        state["_idbatch"] = None
+        state["_detailed"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._data = defaultdict(
+            lambda: defaultdict(dict),
+            {rule: defaultdict(dict, tags) for rule, tags in state["_data"].items()},
+        )
+        self._idstat = defaultdict(Counter, state["_idstat"])
+        self._idbatch = defaultdict(list)
+
+    def spawn(self):
+        return StatsKeeper(
+            detailed=self._detailed,
+            no_longest_pfx=self._no_longest_pfx,
+            no_id_stats_rules=self._no_id_stats_rules,
+            no_id_stats=self._no_id_stats,
+        )
+
+    def merge(self, other):
+        # sum counts and prefixes, keeping the order of the first appearance
+        for rule_name, tags in other._data.items():
+            for _fulltag, other_stat in tags.items():
+                tagstat = self._data[rule_name][_fulltag]
+                tagstat["counts"] = tagstat.get("counts", 0) + other_stat.get("counts", 0)
+                if "pfx" in other_stat:
+                    if "pfx" not in tagstat:
+                        tagstat["pfx"] = defaultdict(CommonPfx)
+                    for _type, pfx in other_stat["pfx"].items():
+                        tagstat["pfx"][_type].merge(pfx)
+        self.flush_ids()
+        other.flush_ids()
+        for _type, counts in other._idstat.items():
+            self._idstat[_type].update(counts)
+
     def add(self, rule_name, context):
         _fulltag = context.get("_FULLTAG")
         tagstat = self._data[rule_name][_fulltag]
@@ -42,26 +94,49 @@ class StatsKeeper(BaseKeeper):
             tagstat["counts"] = 0
         tagstat["counts"] += 1
 
-        type_id_coords = context.get_to_root(getter=lambda x: self.type_id_coords_from_ctx(x))
-
         if self._detailed:
+            type_id_coords = context.get_to_root(getter=self.type_id_coords_from_ctx)
             print("rule %s for %s: %s " % (rule_name, _fulltag, type_id_coords), file=self._detailed)
 
         if not self._no_longest_pfx:
             if "pfx" not in tagstat:
-                tagstat["pfx"] = defaultdict(PfxTr)
-            for _type, _id, _ in type_id_coords:
+                tagstat["pfx"] = defaultdict(CommonPfx)
+            id_stats = not self._no_id_stats and rule_name not in self._no_id_stats_rules
+            # only types and ids are needed, no coordinates
+            for _type, _id in context.get_to_root(getter=self.type_id_from_ctx):
                 if _id and _id != ".":
                     tagstat["pfx"][_type].add(_id)
-                    if not self._no_id_stats_rules or rule_name not in self._no_id_stats_rules:
-                        self._idstat[_type][self.stem_id(_id)] += 1
-                        self._idstat[_type]["_ALL"] += 1
+                    if id_stats:
+                        # stemmed later, in batches
+                        batch = self._idbatch[_type]
+                        batch.append(_id)
+                        if len(batch) >= self._ID_BATCH:
+                            self.flush_ids(_type)
         return
 
     def stem_id(self, s):
         pre = str(s).translate(self._tr_d_0)
         return self._tr_00_0.sub("0", pre)
 
+    def stem_ids(self, ids):
+        # stem the joined ids with a single translate and substitution, instead of doing it for every id
+        ids = list(map(str, ids))
+        joined = self._ID_SEP.join(ids)
+        if joined.count(self._ID_SEP) != len(ids) - 1:
+            return list(map(self.stem_id, ids))
+        return self._tr_00_0.sub("0", joined.translate(self._tr_d_0)).split(self._ID_SEP)
+
+    def flush_ids(self, _type=None):
+        # count the stems of the collected ids
+        types = _type is None and list(self._idbatch.keys()) or [_type]
+        for _type in types:
+            batch = self._idbatch.pop(_type, None)
+            if not batch:
+                continue
+            idstat = self._idstat[_type]
+            idstat.update(self.stem_ids(batch))
+            idstat["_ALL"] += len(batch)
+
     def summary(self, rule_name, out_file=None):
         if rule_name not in self._data:
             return None
@@ -79,16 +154,25 @@ class StatsKeeper(BaseKeeper):
             return True
         return "\n".join(out)
 
-    def dump(self, out_file, id_stats=True):
+    def dump(self, out_file, id_stats=True, id_stats_top=None):
         for _rule in self._data:
             self.summary(_rule, out_file)
         if not id_stats:
             return
+        self.flush_ids()
         for _type, _id_cnt in sorted(self._idstat.items(), key=lambda k: k[0]):
-            for _id, _cnt in sorted(_id_cnt.items(), key=lambda k: -k[1]):
-                if _id == "_ALL":
-                    continue
-                print("## stats\tID\t%s\t%s\t%s\t%s" % (_type, _id_cnt["_ALL"], _id, _cnt), file=out_file)
+            total = _id_cnt["_ALL"]
+            # most common stems first (in the order of appearance for the same counts)
+            stems = ((_id, _cnt) for _id, _cnt in _id_cnt.items() if _id != "_ALL")
+            if id_stats_top:
+                stems = heapq.nlargest(id_stats_top, stems, key=lambda k: k[1])
+            else:
+                stems = sorted(stems, key=lambda k: -k[1])
+            for _id, _cnt in stems:
+                print("## stats\tID\t%s\t%s\t%s\t%s" % (_type, total, _id, _cnt), file=out_file)
+
+    def type_id_from_ctx(self, context):
+        return context.get("_TYPE") or ".", context.get("_ID") or "."
 
     def type_id_coords_from_ctx(self, context):
         if not context:
@@ -15,11 +15,11 @@
 
 
 import gzip
+import os
 import re
 import sys
 
 from collections import defaultdict
-from Bio import SeqIO
 
 
 class IdTrimmer:
@@ -87,22 +87,186 @@ class ExtMapper:
         return self.map(*args, **kwargs)
 
 
+class FastaIndex:
+    # sequence lengths of a fasta file, cached next to it
+    #   samtools compatible .fai index (name, length, offset, linebases, linewidth) for the plain fasta files
+    #   and the bgzipped ones with a .gzi index, private .seqlen cache (name, length) for the rest
+    #   (samtools can't use a .fai for the plain gzip files or the files with irregular line lengths)
+    #   built with a single scan of the raw bytes, nothing is decoded
+    #   offsets are in the uncompressed coordinates for the gzipped files (as for bgzip and samtools)
+    _BLOCK_SIZE = 1 << 22
+    # line lengths seen so far in a record: all equal, all equal but the (short) last one, irregular
+    _LINES_REGULAR, _LINES_SHORT_LAST, _LINES_IRREGULAR = range(3)
+    # irregular line lengths are reported for the first file only
+    _irregular_reported = False
+
+    def __init__(self, fasta_file, cache=True):
+        self.fasta_file = fasta_file
+        self.fai_file = fasta_file + ".fai"
+        self.seqlen_file = fasta_file + ".seqlen"
+        self._rows = None
+        self._cache_file = self.fresh_cache()
+        if self._cache_file:
+            return
+        self._rows, regular = self.scan()
+        if not cache:
+            return
+        if not regular:
+            self.report_irregular(fasta_file)
+        if regular and self.fai_usable():
+            self.store(self.fai_file, self._rows)
+        else:
+            self.store(self.seqlen_file, [row[:2] for row in self._rows])
+
+    @classmethod
+    def report_irregular(cls, fasta_file):
+        if cls._irregular_reported:
+            return
+        cls._irregular_reported = True
+        print(
+            "irregular line lengths in %s, storing sequence lengths only (not reported for other files)"
+            % fasta_file,
+            file=sys.stderr,
+        )
+
+    def fai_usable(self):
+        # gzipped fasta needs to be bgzipped and have a .gzi index to be used with a .fai
+        return not self.fasta_file.endswith(".gz") or os.path.exists(self.fasta_file + ".gzi")
+
+    def fresh_cache(self):
+        # the first of the .fai or .seqlen files not older than the fasta, None if there's none
+        for cache_file in (self.fai_file, self.seqlen_file):
+            try:
+                if os.path.getmtime(cache_file) >= os.path.getmtime(self.fasta_file):
+                    return cache_file
+            except OSError:
+                pass
+        return None
+
+    def lengths(self):
+        # name -> length, in the fasta order
+        if self._rows is not None:
+            return {row[0]: row[1] for row in self._rows}
+        lengths = dict()
+        with open(self._cache_file) as cache:
+            for line in cache:
+                name, length, *_ = line.rstrip("\n").split("\t")
+                lengths[name] = int(length)
+        return lengths
+
+    def store(self, cache_file, rows):
+        # write to a temporary file first, not to leave a partial index
+        tmp_file = "%s.%s.tmp" % (cache_file, os.getpid())
+        try:
+            with open(tmp_file, "wt") as cache:
+                for row in rows:
+                    print("\t".join(map(str, row)), file=cache)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print("can't store index %s: %s" % (cache_file, str(e)), file=sys.stderr)
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def scan(self):
+        rows = []
+        regular = True
+        # current record: [name, length, offset, linebases, linewidth, seq bytes, lines state]
+        rec = None
+        _open = self.fasta_file.endswith(".gz") and gzip.open or open
+        with _open(self.fasta_file, "rb") as fasta:
+            pos, tail = 0, b""
+            while True:
+                block = fasta.read(self._BLOCK_SIZE)
+                buf = tail + block
+                if not block and tail:
+                    # the last line lacks "\n", add it to have only complete lines
+                    buf += b"\n"
+                cut = buf.rfind(b"\n") + 1
+                chunk, tail = buf[:cut], buf[cut:]
+                i = 0
+                while i < cut:
+                    if chunk[i] == 0x3E:  # ">"
+                        end = chunk.find(b"\n", i)
+                        if end < 0:
+                            end = cut
+                        regular = self.close_record(rec, rows) and regular
+                        name = chunk[i + 1 : end].split(None, 1)
+                        name = name and name[0].decode() or ""
+                        rec = [name, 0, pos + end + 1, 0, 0, 0, self._LINES_REGULAR]
+                        i = end + 1
+                        continue
+                    nxt = chunk.find(b"\n>", i)
+                    seg_end = nxt < 0 and cut or nxt + 1
+                    if rec is not None:
+                        self.add_sequence(rec, chunk, i, seg_end)
+                    i = seg_end
+                pos += cut
+                if not block:
+                    break
+        regular = self.close_record(rec, rows) and regular
+        return rows, regular
+
+    def add_sequence(self, rec, chunk, start, end):
+        # the same characters are ignored as by SeqIO: line ends and spaces
+        newlines = chunk.count(b"\n", start, end)
+        spaces = chunk.count(b" ", start, end)
+        ignored = newlines + spaces + chunk.count(b"\r", start, end)
+        rec[1] += end - start - ignored
+        if not rec[5]:
+            first = chunk.find(b"\n", start, end) + 1 or end
+            rec[4] = first - start
+            rec[3] = len(chunk[start:first].rstrip(b"\r\n"))
+        rec[5] += end - start
+        if spaces:
+            # skipped in the lengths, but counted in the line lengths by samtools
+            rec[6] = self._LINES_IRREGULAR
+        else:
+            rec[6] = self.lines_state(rec[6], rec[4], chunk, start, end, newlines)
+
+    def lines_state(self, state, linewidth, chunk, start, end, newlines):
+        # segments consist of complete lines
+        #   all of them but the last one in the record should be linewidth long, i.e.
+        #   every linewidth-th byte is "\n" and there are no other line ends, but in the short tail
+        #   the short tail (the last line) shouldn't be blank
+        if start == end:
+            return state
+        if state != self._LINES_REGULAR:
+            return self._LINES_IRREGULAR
+        full = (end - start) // linewidth
+        tail_start = start + full * linewidth
+        stride = bytes(memoryview(chunk)[start + linewidth - 1 : tail_start : linewidth])
+        tail_newlines = chunk.count(b"\n", tail_start, end)
+        if stride.count(b"\n") != full or tail_newlines > 1 or newlines != full + tail_newlines:
+            return self._LINES_IRREGULAR
+        if tail_start < end and chunk[tail_start] in b"\r\n":
+            return self._LINES_IRREGULAR
+        return tail_start < end and self._LINES_SHORT_LAST or self._LINES_REGULAR
+
+    def close_record(self, rec, rows):
+        if rec is None:
+            return True
+        name, length, offset, linebases, linewidth, seq_bytes, state = rec
+        rows.append((name, length, offset, linebases, linewidth))
+        if not length:
+            return True
+        return linebases > 0 and state != self._LINES_IRREGULAR
+
+
 class SeqLenDict:
     def __init__(self, fna_file=None):
         self._len = None
+        self._index = None
         self.load_from_file(fna_file)
 
     def load_from_file(self, fasta_file):
         if not fasta_file:
             return
-        _open = fasta_file.endswith(".gz") and gzip.open or open
-        with _open(fasta_file, "rt") as fasta:
-            fasta_parser = SeqIO.parse(fasta, "fasta")
-            self._len = dict()
-            for rec in fasta_parser:
-                self._len[rec.name] = len(rec)
+        # make sure the index is there, lengths are loaded on the first use
+        self._index = FastaIndex(fasta_file)
 
     def get_len(self, srid):
+        if self._len is None and self._index is not None:
+            self._len = self._index.lengths()
         if self._len and srid in self._len:
             return self._len[srid]
         return None
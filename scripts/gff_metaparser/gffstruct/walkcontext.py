@@ -15,10 +15,74 @@
 
 
 import copy
-from collections import defaultdict
+from itertools import chain
+from sys import intern
+
+
+class IdStats:
+    # used IDs counters: id -> row of counts, with a column for each seen (depth, type) pair
+    #   (depth 0 for all the depths), i.e. a flat table instead of nested dicts
+    __slots__ = ("_rows", "_columns", "_store_columns")
+
+    def __init__(self):
+        self._rows = dict()
+        self._columns = {(0, "_ALL"): 0}
+        self._store_columns = dict()
+
+    def __contains__(self, _id):
+        return _id in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, _id, depth, _type):
+        row = self._rows.get(_id)
+        column = self._columns.get((depth, _type))
+        if row is None or column is None or column >= len(row):
+            return 0
+        return row[column]
+
+    def store_columns(self, _type, depth):
+        # columns to increment on store, added on the first use
+        columns = self._columns
+        store_columns = []
+        for key in ((0, "_ALL"), (0, _type.lower()), (depth, "_ALL"), (depth, _type or "_ALL")):
+            if key not in columns:
+                columns[key] = len(columns)
+            store_columns.append(columns[key])
+        self._store_columns[(_type, depth)] = (store_columns, max(store_columns) + 1)
+        return self._store_columns[(_type, depth)]
+
+    def store(self, _id, _type, depth=0):
+        store_columns, width = self._store_columns.get((_type, depth)) or self.store_columns(_type, depth)
+        row = self._rows.get(_id)
+        if row is None:
+            if type(_id) == str:
+                _id = intern(_id)
+            row = self._rows[_id] = [0] * width
+        elif len(row) < width:
+            row.extend([0] * (width - len(row)))
+        for column in store_columns:
+            row[column] += 1
+
+    def clear(self):
+        # columns are kept, they are the same for every top-level feature
+        self._rows.clear()
 
 
 class WalkContext:
+    __slots__ = (
+        "data",
+        "_tag",
+        "global_context",
+        "ctg_len",
+        "processed_rules",
+        "prev",
+        "_top",
+        "_useful_leaves",
+        "used_id_stats",
+    )
+
     def __init__(self, tag="", global_context=None, ctg_len_inferer=None):
         self.data = dict()
         self._tag = tag
@@ -28,13 +92,22 @@ class WalkContext:
         self.prev = []
         self._top = None
         self._useful_leaves = []
-        self.used_id_stats = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))  # id depth count
+        self.used_id_stats = IdStats()
 
     def snap(self):
         # shallow data copy
-        self.prev.append(copy.copy(self.data))
+        self.prev.append(self.data.copy())
         return self.prev[-1]
 
+    def release(self):
+        # drop snapshots and leaves of the finished top-level feature
+        #   (with all the parent contexts they refer to)
+        self.data = dict()
+        self.prev = []
+        self._top = None
+        self._useful_leaves = []
+        self.used_id_stats.clear()
+
     def top(self, *feature):
         if len(feature) == 0:
             return self._top
@@ -48,24 +121,22 @@ class WalkContext:
 
     def update(self, *key_val, force_clean=False, **kwargs):
         # can have either dict as key or string with non-empty val
+        items = ()
         if len(key_val) == 1 and isinstance(key_val[0], dict):
-            for k, v in key_val[0].items():
-                self.update(k, v, force_clean=force_clean)
+            items = key_val[0].items()
         elif len(key_val) == 2:
-            key, val = key_val
+            items = (key_val,)
+        # and updates from **kwargs, no recursion: it's called several times for every feature and qualifier
+        data = self.data
+        for key, val in chain(items, kwargs.items()):
             if val is not None:
-                self.data[key] = val
-            elif force_clean and key in self.data:
-                del self.data[key]
-        # update from **kwargs
-        for k, v in kwargs.items():
-            self.update(k, v, force_clean=force_clean)
+                data[key] = val
+            elif force_clean:
+                data.pop(key, None)
 
     def get(self, key, default=None):
         # global ???
-        if key not in self.data:
-            return default
-        return self.data[key]
+        return self.data.get(key, default)
 
     def __getitem__(self, key):
         return self.get(key)
@@ -114,13 +185,7 @@ class WalkContext:
         return
 
     def store_id_stats(self, _id, _type):
-        self.used_id_stats[_id][0]["_ALL"] += 1
-        self.used_id_stats[_id][0][_type.lower()] += 1
-        # depth
-        depth = self.data.get("_DEPTH", 0)
-        self.used_id_stats[_id][depth]["_ALL"] += 1
-        #
-        self.used_id_stats[_id][depth][_type or "_ALL"] += 1
+        self.used_id_stats.store(_id, _type, self.data.get("_DEPTH", 0))
 
     def fix_id_sfx(self, raw_id, _type):
         if not raw_id:
@@ -136,19 +201,19 @@ class WalkContext:
         if depth == 2 and is_tr_type:
             self.store_id_stats(raw_id, _type)
             self.store_id_stats(raw_id, "_TRANSCRIPT_LEVEL")
-            _id = raw_id + "_t" + str(self.used_id_stats[raw_id][depth]["_TRANSCRIPT_LEVEL"])
+            _id = raw_id + "_t" + str(self.used_id_stats.get(raw_id, depth, "_TRANSCRIPT_LEVEL"))
             self.store_id_stats(_id, _type)
             return _id
         # cds -- multifeature
         if _type_lc == "cds":
             self.store_id_stats(raw_id, _type)
-            allc = self.used_id_stats[raw_id][0]["_ALL"]
-            typec = self.used_id_stats[raw_id][0][_type_lc]
+            allc = self.used_id_stats.get(raw_id, 0, "_ALL")
+            typec = self.used_id_stats.get(raw_id, 0, _type_lc)
             if typec == allc:
                 self.store_id_stats(raw_id, _type)
                 return raw_id
         # usual case
         self.store_id_stats(raw_id, _type)
-        _id = raw_id + "_" + str(self.used_id_stats[raw_id][0]["_ALL"])
+        _id = raw_id + "_" + str(self.used_id_stats.get(raw_id, 0, "_ALL"))
         self.store_id_stats(_id, _type)
         return _id
@@ -0,0 +1,42 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest
+
+from gffstruct.fannkeeper import FannKeeper
+
+
+@pytest.mark.parametrize(
+    "last, expected",
+    [
+        ({"name": "A"}, [{"name": "B"}, {"name": "A"}]),
+        ({"name": "B"}, [{"name": "B"}]),
+    ],
+)
+def test_add_after_force_add(last, expected):
+    # force-adding replaces the list items, the following adds see the new ones only
+    keeper = FannKeeper()
+    keeper.add("gene", "g1", "@xrefs", {"name": "A"})
+    keeper.add("gene", "g1", "@xrefs", {"name": "B"}, force=True)
+    keeper.add("gene", "g1", "@xrefs", last)
+    assert keeper.get("gene", "g1", "xrefs") == expected
+
+
+def test_add_uniq():
+    keeper = FannKeeper()
+    for name in ("A", "B", "A"):
+        keeper.add("gene", "g1", "@xrefs", {"name": name, "info": [1, 2]})
+    assert keeper.get("gene", "g1", "xrefs") == [{"name": "A", "info": [1, 2]}, {"name": "B", "info": [1, 2]}]
@@ -0,0 +1,119 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import gzip
+import os
+
+import pytest
+
+from gffstruct.utils import FastaIndex
+
+
+REGULAR_FASTA = ">ctg1 first\nACGTACGT\nACGTACGT\nACG\n>ctg2\nAAAAAAAA\nCC\n>empty\n"
+REGULAR_LENGTHS = {"ctg1": 19, "ctg2": 10, "empty": 0}
+
+IRREGULAR_FASTA = ">ctg1\nACGTACGT\nACG\nACGTACGT\n>ctg2\nAAAAAAAA\nCC\n"
+IRREGULAR_LENGTHS = {"ctg1": 19, "ctg2": 10}
+
+
+@pytest.fixture(autouse=True)
+def fixture_reset_reported(monkeypatch):
+    monkeypatch.setattr(FastaIndex, "_irregular_reported", False)
+
+
+def write_fasta(path, content):
+    _open = str(path).endswith(".gz") and gzip.open or open
+    with _open(str(path), "wt") as fasta:
+        fasta.write(content)
+    return str(path)
+
+
+def test_plain_fasta_fai(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fa", REGULAR_FASTA)
+    assert FastaIndex(fasta).lengths() == REGULAR_LENGTHS
+    with open(fasta + ".fai") as fai:
+        assert fai.readline() == "ctg1\t19\t12\t8\t9\n"
+    assert not os.path.exists(fasta + ".seqlen")
+
+    # lengths are read from the stored index
+    index = FastaIndex(fasta)
+    assert index._rows is None
+    assert index.lengths() == REGULAR_LENGTHS
+
+
+def test_gzipped_fasta_no_fai(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fa.gz", REGULAR_FASTA)
+    assert FastaIndex(fasta).lengths() == REGULAR_LENGTHS
+    assert not os.path.exists(fasta + ".fai")
+    with open(fasta + ".seqlen") as seqlen:
+        assert seqlen.read() == "ctg1\t19\nctg2\t10\nempty\t0\n"
+
+    index = FastaIndex(fasta)
+    assert index._rows is None
+    assert index.lengths() == REGULAR_LENGTHS
+
+
+def test_bgzipped_fasta_with_gzi(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fa.gz", REGULAR_FASTA)
+    open(fasta + ".gzi", "wb").close()
+    assert FastaIndex(fasta).lengths() == REGULAR_LENGTHS
+    assert os.path.exists(fasta + ".fai")
+    assert not os.path.exists(fasta + ".seqlen")
+
+
+def test_irregular_reported_once(tmp_path, capsys):
+    fastas = [write_fasta(tmp_path / ("genome%s.fa" % i), IRREGULAR_FASTA) for i in range(2)]
+    for fasta in fastas:
+        assert FastaIndex(fasta).lengths() == IRREGULAR_LENGTHS
+        assert not os.path.exists(fasta + ".fai")
+        assert os.path.exists(fasta + ".seqlen")
+    assert capsys.readouterr().err.count("irregular line lengths") == 1
+
+
+def test_stale_cache_rebuilt(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fa", REGULAR_FASTA)
+    FastaIndex(fasta)
+    os.utime(fasta + ".fai", (0, 0))
+    write_fasta(fasta, ">ctg3\nACGT\n")
+    assert FastaIndex(fasta).lengths() == {"ctg3": 4}
+
+
+def test_no_cache(tmp_path):
+    fasta = write_fasta(tmp_path / "genome.fa", REGULAR_FASTA)
+    assert FastaIndex(fasta, cache=False).lengths() == REGULAR_LENGTHS
+    assert not os.path.exists(fasta + ".fai")
+    assert not os.path.exists(fasta + ".seqlen")
+
+
+@pytest.mark.parametrize(
+    "content, regular",
+    [
+        (">ctg1\nACGT\nAC", True),
+        (">ctg1\r\nACGT\r\nAC\r\n", True),
+        (">ctg1\nACGT\nAC\nA\n", False),
+        (">ctg1\nACGT\nACGTA\n", False),
+        (">ctg1\nACGT\n\nAC\n", False),
+        (">ctg1\n\nACGT\n", False),
+        (">ctg1\nACGT \nACGT \nAC\n", False),
+        (">ctg1\nACGT\nAC GT\n", False),
+    ],
+)
+def test_line_lengths(tmp_path, content, regular):
+    # only the last line of a record can be shorter than the others, no spaces in sequence lines
+    fasta = write_fasta(tmp_path / "genome.fa", content)
+    index = FastaIndex(fasta)
+    assert os.path.exists(fasta + ".fai") == regular
+    assert index.lengths() == {"ctg1": len("".join(content.split("\n", 1)[1].split()))}
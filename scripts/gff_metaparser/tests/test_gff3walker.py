@@ -0,0 +1,111 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+from gffstruct.gff3walker import GFF3Walker
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(os.path.dirname(SCRIPTS_DIR))
+CONF_DIR = os.path.join(REPO_DIR, "config", "gff_metaparser")
+IDS_ACROSS_CONTIGS_GFF = os.path.join(REPO_DIR, "data", "test", "ids_across_contigs_test.gff3")
+
+needs_fork = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="parallel walk needs fork"
+)
+
+
+def shard_contigs(shards):
+    res = []
+    for shard in shards:
+        with open(shard) as shard_file:
+            contigs = [line.split("\t", 1)[0] for line in shard_file if line.strip() and line[0] != "#"]
+        res.append(sorted(set(contigs)))
+    return res
+
+
+def test_split_keeps_linked_contigs_together(tmp_path):
+    # chrX and chrY share the PAR1 ids, scf1 and scf2 a CDS id, scf3 has a transcript of a scf1 gene
+    with open(IDS_ACROSS_CONTIGS_GFF) as gff:
+        walker = GFF3Walker(object(), gff)
+        shards = walker.split_by_contigs(str(tmp_path), 12)
+    assert shard_contigs(shards) == [["chr1"], ["chr2"], ["chrX", "chrY"], ["scf1", "scf2", "scf3"]]
+
+
+def test_split_all_linked(tmp_path):
+    gff_path = tmp_path / "linked.gff3"
+    gff_path.write_text(
+        "##gff-version 3\n"
+        "ctg1\tsrc\tgene\t1\t100\t.\t+\t.\tID=g1\n"
+        "ctg2\tsrc\tmRNA\t1\t100\t.\t+\t.\tID=t2;Parent=g1\n"
+        "ctg3\tsrc\texon\t1\t100\t.\t+\t.\tID=e3;Parent=t2\n"
+    )
+    with open(gff_path) as gff:
+        walker = GFF3Walker(object(), gff)
+        assert walker.split_by_contigs(str(tmp_path), 3) is None
+        # input is rewound for the sequential walk
+        assert gff.readline() == "##gff-version 3\n"
+
+
+def run_script(script, args, out_dir, tag):
+    out_gff = os.path.join(out_dir, "%s.gff3" % tag)
+    with open(out_gff, "w") as out_file:
+        subprocess.run(
+            [sys.executable, script] + args,
+            cwd=SCRIPTS_DIR,
+            stdout=out_file,
+            stderr=subprocess.DEVNULL,
+            env=dict(os.environ, PYTHONHASHSEED="0"),
+            check=True,
+        )
+    return out_gff
+
+
+def read(path):
+    with open(path, "rb") as in_file:
+        return in_file.read()
+
+
+@needs_fork
+def test_meta_parse_workers_parity(tmp_path):
+    outputs = dict()
+    for tag, workers in (("seq", []), ("par", ["--workers", "3"])):
+        fann = str(tmp_path / ("%s.fann.json" % tag))
+        seq_region = str(tmp_path / ("%s.sr.json" % tag))
+        args = ["--conf", os.path.join(CONF_DIR, "metaparser.conf")]
+        args += ["--pfx_trims", "ANY!:.+\\|,ANY:gene-,ANY:rna-,cds:cds-,exon:exon-"]
+        args += ["--fann_out", fann, "--seq_region_out", seq_region] + workers + [IDS_ACROSS_CONTIGS_GFF]
+        gff = run_script("gff3_meta_parse.py", args, str(tmp_path), tag)
+        outputs[tag] = [read(gff), read(fann), read(seq_region)]
+    assert outputs["par"] == outputs["seq"]
+
+
+@needs_fork
+def test_gff_stats_workers_parity(tmp_path):
+    outputs = dict()
+    for tag, workers in (("seq", []), ("par", ["--workers", "3"])):
+        stats = str(tmp_path / ("%s.stats" % tag))
+        args = ["--conf", os.path.join(CONF_DIR, "valid_structures.conf"), "--stats_out", stats]
+        args += workers + [IDS_ACROSS_CONTIGS_GFF]
+        gff = run_script("gff_stats.py", args, str(tmp_path), tag)
+        outputs[tag] = [read(gff), read(stats)]
+    assert outputs["par"] == outputs["seq"]
@@ -0,0 +1,107 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import copy
+import glob
+import io
+import os
+import sys
+
+import pytest
+
+from BCBio import GFF
+from Bio.Seq import UnknownSeq
+from Bio.SeqFeature import SeqFeature
+from Bio.SeqRecord import SeqRecord
+
+import gff3_meta_parse
+import gff_stats
+
+from gffstruct import seqfeatcomposer
+from gffstruct.gff3writer import GFF3Writer
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(os.path.dirname(SCRIPTS_DIR))
+CONF_DIR = os.path.join(REPO_DIR, "config", "gff_metaparser")
+TEST_GFFS = sorted(glob.glob(os.path.join(REPO_DIR, "data", "test", "*.gff3")))
+
+
+def to_seq_feature(feature):
+    # the same SeqFeature tree SeqFeatComposer used to build for BCBio.GFF.write
+    seq_feature = SeqFeature(
+        feature.location,
+        strand=feature.strand,
+        type=feature.type,
+        qualifiers=copy.deepcopy(feature.qualifiers),
+    )
+    seq_feature.source = feature.source
+    seq_feature.sub_features = [to_seq_feature(sub_feature) for sub_feature in feature.sub_features]
+    return seq_feature
+
+
+def bcbio_write(features, contig_id, contig_len):
+    out = io.StringIO()
+    out_rec = SeqRecord(UnknownSeq(length=contig_len), id=contig_id)
+    out_rec.features = [to_seq_feature(feature) for feature in features]
+    GFF.write([out_rec], out)
+    return out.getvalue()
+
+
+class ParityWriter(GFF3Writer):
+    # records GFF3Writer and BCBio.GFF.write outputs for every written contig
+    contigs = []
+
+    def write(self, features, contig_id, contig_len=0):
+        expected = bcbio_write(features, contig_id, contig_len)
+        out = io.StringIO()
+        GFF3Writer(out).write(features, contig_id, contig_len)
+        self.contigs.append((contig_id, expected, out.getvalue()))
+        super().write(features, contig_id, contig_len)
+
+
+@pytest.fixture(name="parity_writer")
+def fixture_parity_writer(monkeypatch):
+    ParityWriter.contigs = []
+    monkeypatch.setattr(seqfeatcomposer, "GFF3Writer", ParityWriter)
+    return ParityWriter
+
+
+def assert_parity(contigs):
+    assert contigs
+    for contig_id, expected, written in contigs:
+        assert written == expected, contig_id
+
+
+@pytest.mark.parametrize("gff", TEST_GFFS, ids=os.path.basename)
+def test_meta_parse_writer_parity(gff, tmp_path, monkeypatch, parity_writer):
+    argv = ["gff3_meta_parse.py", "--conf", os.path.join(CONF_DIR, "metaparser.conf")]
+    argv += ["--pfx_trims", "ANY!:.+\\|,ANY:gene-,ANY:rna-,cds:cds-,exon:exon-"]
+    for opt in ("gff_out", "fann_out", "seq_region_out"):
+        argv += ["--%s" % opt, str(tmp_path / opt)]
+    monkeypatch.setattr(sys, "argv", argv + [gff])
+    gff3_meta_parse.main()
+    assert_parity(parity_writer.contigs)
+
+
+@pytest.mark.parametrize("gff", TEST_GFFS, ids=os.path.basename)
+def test_gff_stats_writer_parity(gff, tmp_path, monkeypatch, parity_writer):
+    argv = ["gff_stats.py", "--conf", os.path.join(CONF_DIR, "valid_structures.conf")]
+    for opt in ("gff_out", "stats_out"):
+        argv += ["--%s" % opt, str(tmp_path / opt)]
+    monkeypatch.setattr(sys, "argv", argv + [gff])
+    gff_stats.main()
+    assert_parity(parity_writer.contigs)
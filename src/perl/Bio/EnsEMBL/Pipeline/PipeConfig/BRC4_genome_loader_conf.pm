@@ -150,6 +150,8 @@ sub default_options {
 
     # add_sequence mode (instead of creating db from scratch)
     add_sequence => 0,
+    # only load sequences (and their attributes and synonyms) not present in the core db (add_sequence mode on)
+    add_sequence_incremental => 0,
 
     # run ProdDBsync parts before adding ad-hoc sequences (add_sequence  mode on)
     prod_db_sync_before_adding => 1,
@@ -450,6 +452,7 @@ sub pipeline_analyses {
       -parameters        => {
         work_dir => $self->o('pipeline_dir') . '/#db_name#/add_sequence',
         load_additional_sequences => $self->o('add_sequence'),
+        incremental_additional_load => $self->o('add_sequence_incremental'),
         # N.B. chunking will work correctly only if it was used for initial loading
         sequence_data_chunck => $self->o('sequence_data_chunck'),
         chunk_cs_name        => $self->o('chunk_cs_name'),
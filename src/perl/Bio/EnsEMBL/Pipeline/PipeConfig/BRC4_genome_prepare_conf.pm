@@ -84,6 +84,13 @@ sub default_options {
     # If no gene_id, generate an id for everything else
     make_missing_stable_id => 0,
 
+    # Shared cache for the taxonomy lookups (accession taxonomy, mitochondrial codon tables)
+    taxonomy_cache => catfile($self->o('pipeline_dir'), "taxonomy_cache.sqlite"),
+    # Lifetime of the cache entries in seconds (30 days)
+    taxonomy_cache_ttl => 2592000,
+    # Offline mode: use this NCBI taxdump directory for the codon tables, and only cached accessions
+    taxdump_dir => undef,
+
     ############################################
     # Config unlikely to be changed by the user
 
@@ -112,6 +119,9 @@ sub pipeline_wide_parameters {
     'schemas'      => $self->o('schemas'),
     pipeline_dir   => $self->o('pipeline_dir'),
     exclude_seq_regions   => $self->o('exclude_seq_regions'),
+    taxonomy_cache => $self->o('taxonomy_cache'),
+    taxonomy_cache_ttl => $self->o('taxonomy_cache_ttl'),
+    taxdump_dir => $self->o('taxdump_dir'),
 
     download_dir   => catdir($self->o('pipeline_dir'), "download"),
     root_work_dir  => catdir($self->o('pipeline_dir'), "process_files"),
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""In-memory columnar representation of AGP files, used when loading assembly data."""
+
+import gzip
+from array import array
+from os import makedirs
+from os.path import dirname
+from sys import intern
+from typing import Dict, Iterable, List, Optional, Set
+
+# AGP gap component types, not used by the loaders
+GAP_TYPES = frozenset(["N", "U"])
+# orientation symbols allowed by the AGP specification, stored as indices in `AGPTable.strand`
+ORIENTATIONS = ("+", "-", "?", "0", "na")
+_ORIENTATION_INDEX = {symbol: index for index, symbol in enumerate(ORIENTATIONS)}
+
+
+class AGPTable:
+    """Component (non-gap) lines of a single AGP file stored as columns.
+
+    Coordinates are kept in compact integer arrays, ids in lists of interned strings.
+    Gap lines ("N" and "U" types) and comments are dropped on parsing.
+
+    Attributes:
+        pair: assembled and component coord_system names, "-" separated (i.e. "scaffold-contig").
+        asm_id: assembled object ids.
+        asm_start: assembled object starts.
+        asm_end: assembled object ends.
+        part: part numbers.
+        cmp_type: component types (i.e. "W").
+        cmp_id: component ids.
+        cmp_start: component starts.
+        cmp_end: component ends.
+        strand: component orientations, as indices in `ORIENTATIONS`.
+    """
+
+    def __init__(self, pair: str = "") -> None:
+        self.pair = pair
+        self.asm_id: List[str] = []
+        self.asm_start = array("q")
+        self.asm_end = array("q")
+        self.part = array("q")
+        self.cmp_type: List[str] = []
+        self.cmp_id: List[str] = []
+        self.cmp_start = array("q")
+        self.cmp_end = array("q")
+        self.strand = array("b")
+
+    def __len__(self) -> int:
+        return len(self.cmp_id)
+
+    @classmethod
+    def from_file(cls, agp_path: str, pair: str = "") -> "AGPTable":
+        """Parse an AGP file (possibly gzipped) into a new table.
+
+        Args:
+            agp_path: Path to the AGP file.
+            pair: Assembled and component coord_system names, "-" separated.
+
+        Raises:
+            ValueError: If a line has an unexpected number of fields or orientation.
+        """
+        table = cls(pair)
+        _open = agp_path.endswith(".gz") and gzip.open or open
+        with _open(agp_path, "rt") as agp_file:
+            for line in agp_file:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 9:
+                    raise ValueError(f"Unexpected number of fields in AGP file {agp_path}: {line}")
+                if fields[4] in GAP_TYPES:
+                    continue
+                table.append(*fields)
+        return table
+
+    def append(
+        self,
+        asm_id: str,
+        asm_start: str,
+        asm_end: str,
+        part: str,
+        cmp_type: str,
+        cmp_id: str,
+        cmp_start: str,
+        cmp_end: str,
+        strand: str,
+    ) -> None:
+        """Add a single component line (as raw AGP fields) to the table."""
+        orientation = _ORIENTATION_INDEX.get(strand.strip())
+        if orientation is None:
+            raise ValueError(f"Unknown AGP orientation '{strand}' for component {cmp_id}")
+        self.asm_id.append(intern(asm_id))
+        self.asm_start.append(int(asm_start))
+        self.asm_end.append(int(asm_end))
+        self.part.append(int(part))
+        self.cmp_type.append(intern(cmp_type))
+        self.cmp_id.append(intern(cmp_id))
+        self.cmp_start.append(int(cmp_start))
+        self.cmp_end.append(int(cmp_end))
+        self.strand.append(orientation)
+
+    def take(self, indices: Iterable[int]) -> "AGPTable":
+        """Return a new table with the rows at the given indices (in the given order)."""
+        indices = list(indices)
+        table = AGPTable(self.pair)
+        table.asm_id = [self.asm_id[i] for i in indices]
+        table.asm_start = array("q", (self.asm_start[i] for i in indices))
+        table.asm_end = array("q", (self.asm_end[i] for i in indices))
+        table.part = array("q", (self.part[i] for i in indices))
+        table.cmp_type = [self.cmp_type[i] for i in indices]
+        table.cmp_id = [self.cmp_id[i] for i in indices]
+        table.cmp_start = array("q", (self.cmp_start[i] for i in indices))
+        table.cmp_end = array("q", (self.cmp_end[i] for i in indices))
+        table.strand = array("b", (self.strand[i] for i in indices))
+        return table
+
+    def asm_ids(self) -> Set[str]:
+        """Set of the assembled object ids."""
+        return set(self.asm_id)
+
+    def prune_components(self, used: Set[str]) -> "AGPTable":
+        """Drop the components seen in `used` (and component duplicates), update `used` with the new ones.
+
+        Only the first occurrence of every new component is kept, the order of the rows is preserved.
+        """
+        first_seen: Dict[str, int] = {}
+        for index, cmp_id in enumerate(self.cmp_id):
+            first_seen.setdefault(cmp_id, index)
+        new_components = first_seen.keys() - used
+        used.update(new_components)
+        return self.take(sorted(first_seen[cmp_id] for cmp_id in new_components))
+
+    def without_regions(self, loaded_regions: Set[str]) -> "AGPTable":
+        """Return a table with the rows of the assembled objects not present in `loaded_regions`."""
+        asm_ids = self.asm_ids()
+        new_regions = asm_ids - loaded_regions
+        if len(new_regions) == len(asm_ids):
+            return self
+        return self.take(i for i, asm_id in enumerate(self.asm_id) if asm_id in new_regions)
+
+    def with_ids(
+        self, asm_names: Optional[Dict[str, str]] = None, cmp_names: Optional[Dict[str, str]] = None
+    ) -> "AGPTable":
+        """Return a table with the assembled object and component ids renamed accordingly with the maps."""
+        if not asm_names and not cmp_names:
+            return self
+        table = self.take(range(len(self)))
+        if asm_names:
+            table.asm_id = [intern(asm_names.get(asm_id, asm_id)) for asm_id in self.asm_id]
+        if cmp_names:
+            table.cmp_id = [intern(cmp_names.get(cmp_id, cmp_id)) for cmp_id in self.cmp_id]
+        return table
+
+    def lines(self) -> Iterable[str]:
+        """Generate AGP lines (with no line endings) for all the rows."""
+        for i, cmp_id in enumerate(self.cmp_id):
+            yield "\t".join(
+                [
+                    self.asm_id[i],
+                    str(self.asm_start[i]),
+                    str(self.asm_end[i]),
+                    str(self.part[i]),
+                    self.cmp_type[i],
+                    cmp_id,
+                    str(self.cmp_start[i]),
+                    str(self.cmp_end[i]),
+                    ORIENTATIONS[self.strand[i]],
+                ]
+            )
+
+    def write(self, agp_path: str) -> str:
+        """Store table as an AGP file (creating the parent directory if needed) and return its path."""
+        parent = dirname(agp_path)
+        if parent:
+            makedirs(parent, exist_ok=True)
+        with open(agp_path, "w") as agp_out:
+            for line in self.lines():
+                agp_out.write(line + "\n")
+        return agp_path
+
+
+def load_agps(agps: Dict[str, str], order: Optional[List[str]] = None) -> Dict[str, AGPTable]:
+    """Parse every AGP file once.
+
+    Args:
+        agps: Map of the "asm-cmp" coord_system pairs to the AGP file paths.
+        order: Order to load the files in (all the `agps` keys by default).
+
+    Returns:
+        A map of the "asm-cmp" pairs to the parsed tables, in the given order.
+    """
+    if order is None:
+        order = list(agps.keys())
+    return {pair: AGPTable.from_file(agps[pair], pair) for pair in order}
+
+
+def prune_agp_tables(tables: Dict[str, AGPTable], pruning: bool = True) -> Dict[str, AGPTable]:
+    """Remove components already used by the previous tables (in the order given by the `tables` dict).
+
+    Empty tables are removed from the result.
+    i.e.: 'contigN to chromosomeZ' is removed if 'contigN to scaffoldM' was seen before.
+
+    Args:
+        tables: Map of the "asm-cmp" pairs to the parsed tables, in the pruning order.
+        pruning: Only drop empty tables if false.
+
+    Returns:
+        A map of the "asm-cmp" pairs to the pruned tables.
+    """
+    pruned = dict()
+    used: Set[str] = set()
+    for pair, table in tables.items():
+        if pruning:
+            table = table.prune_components(used)
+        if len(table) > 0:
+            pruned[pair] = table
+    return pruned
@@ -15,15 +15,14 @@
 # limitations under the License.
 
 
-import csv
 import gzip
 from pathlib import Path
-import re
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List
 
 from Bio import SeqIO
 import eHive
 
+from ensembl.brc4.runnable.assembly_report import AssemblyReport
 from ensembl.brc4.runnable.utils import print_json
 
 
@@ -126,35 +125,6 @@ class amend_genome_metadata(eHive.BaseRunnable):
 
         return seq_regions
 
-    def report_to_csv(self, report_path: str) -> Tuple[str, dict]:
-        """Returns an assembly report as a CSV string, and the head metadata as a dict.
-
-        Args:
-            report_path: Path to a `seq_region` file from INSDC/RefSeq.
-
-        """
-
-        _open = report_path.endswith(".gz") and gzip.open or open
-        with _open(report_path, "rt") as report:
-            data = ""
-            metadata = {}
-            last_head = ""
-            for line in report:
-                # Ignore header
-                if line.startswith("#"):
-                    # Get metadata values if possible
-                    match = re.search("# (.+?): (.+?)$", line)
-                    if match:
-                        metadata[match.group(1)] = match.group(2)
-                    last_head = line
-                    continue
-                else:
-                    if last_head:
-                        data += last_head[2:].strip() + "\n"
-                        last_head = ""
-                    data += line
-            return data, metadata
-
     def get_report_regions(self, report_path: str) -> List[str]:
         """Returns a list of `seq_region` names from the report file.
 
@@ -163,23 +133,18 @@ class amend_genome_metadata(eHive.BaseRunnable):
 
         """
 
-        # Get the report in a CSV format, easier to manipulate
-        report_csv, _ = self.report_to_csv(report_path)
-
-        # Feed the csv string to the CSV reader
-        reader = csv.DictReader(report_csv.splitlines(), delimiter="\t", quoting=csv.QUOTE_NONE)
-
         # Create the seq_regions
         seq_regions = []
-        for row in reader:
-            refseq_name = row["RefSeq-Accn"]
-            genbank_name = row["GenBank-Accn"]
-            name = ""
-            if genbank_name and genbank_name != "na":
-                name = genbank_name
-            elif refseq_name and refseq_name != "na":
-                name = refseq_name
-            if name:
-                seq_regions.append(name)
+        with AssemblyReport(report_path) as report:
+            for row in report:
+                refseq_name = row["RefSeq-Accn"]
+                genbank_name = row["GenBank-Accn"]
+                name = ""
+                if genbank_name and genbank_name != "na":
+                    name = genbank_name
+                elif refseq_name and refseq_name != "na":
+                    name = refseq_name
+                if name:
+                    seq_regions.append(name)
 
         return seq_regions
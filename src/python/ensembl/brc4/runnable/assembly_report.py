@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Streaming reader for the INSDC/RefSeq assembly (sequence) reports."""
+
+import gzip
+from itertools import chain
+import re
+from typing import Dict, Iterator, List, Optional, TextIO
+
+
+# A data row of the report: column name -> value (as in the report, "na" for missing values)
+ReportRow = Dict[str, str]
+
+_METADATA_RE = re.compile(r"# (.+?): (.+?)$")
+
+
+class AssemblyReport:
+    """Read an assembly report (possibly gzipped) row by row.
+
+    The header is read when the report is opened: the "# key: value" comment lines are stored as metadata,
+    and the last comment line before the data is used as the columns names.
+    The data rows are then yielded as dicts, directly from the (gzip) stream.
+    Values are not converted: numeric columns (i.e. "Sequence-Length") are kept as strings
+    and missing values as "na", as expected by the readers (the same as with the former csv parsing).
+
+    Usage:
+        with AssemblyReport(report_path) as report:
+            level = report.metadata.get("Assembly level", "contig")
+            for row in report:
+                ...
+
+    Attributes:
+        report_path: Path to the report.
+        metadata: Head metadata of the report.
+        columns: Names of the columns.
+    """
+
+    def __init__(self, report_path: str) -> None:
+        self.report_path = report_path
+        self.metadata: Dict[str, str] = {}
+        self.columns: List[str] = []
+        self._report: Optional[TextIO] = None
+        self._first_line: Optional[str] = None
+
+    def __enter__(self) -> "AssemblyReport":
+        _open = self.report_path.endswith(".gz") and gzip.open or open
+        self._report = _open(self.report_path, "rt")
+        self._read_header()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._report is not None:
+            self._report.close()
+            self._report = None
+
+    def _read_header(self) -> None:
+        """Read the comment lines up to the first data line (kept for the rows iteration)."""
+        last_head = ""
+        for line in self._report:
+            if not line.startswith("#"):
+                self._first_line = line
+                break
+            # Get metadata values if possible
+            match = _METADATA_RE.search(line.rstrip("\r\n"))
+            if match:
+                self.metadata[match.group(1)] = match.group(2)
+            last_head = line
+        if last_head:
+            self.columns = last_head[2:].strip().split("\t")
+
+    def __iter__(self) -> Iterator[ReportRow]:
+        if self._report is None:
+            raise ValueError(f"Assembly report {self.report_path} is not open")
+        columns = self.columns
+        lines: Iterator[str] = self._report
+        if self._first_line is not None:
+            lines = chain([self._first_line], lines)
+            self._first_line = None
+        for line in lines:
+            # Ignore empty lines and any comment after the header
+            if line.startswith("#") or not line.strip():
+                continue
+            yield dict(zip(columns, line.rstrip("\r\n").split("\t")))
@@ -15,10 +15,163 @@
 # limitations under the License.
 
 import argparse
+from bisect import bisect_left
+from dataclasses import dataclass
 import re
-from typing import List
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
 
 import mysql.connector
+from mysql.connector import pooling
+
+
+# Called after each timed query with the query, its duration (in seconds) and the number of rows
+QueryHook = Callable[[str, float, int], None]
+
+# Largest connection pool mysql.connector allows
+MAX_POOL_SIZE = pooling.CNX_POOL_MAXSIZE
+
+# {prefix}_core_{build}_{ensembl version}_{assembly version}
+CORE_NAME_RE = re.compile(r"^(.+)_core_(\d+)_(\d+)_(\d+)$")
+
+
+@dataclass(frozen=True)
+class CoreName:
+    """Parts of a core database name: {prefix}_core_{build}_{version}_{assembly}."""
+
+    name: str
+    prefix: str
+    build: str
+    version: str
+    assembly: str
+
+    @classmethod
+    def parse(cls, name: str) -> Optional["CoreName"]:
+        """Return the parsed name, or None if the name doesn't follow the pattern."""
+        match = CORE_NAME_RE.match(name)
+        if not match:
+            return None
+        return cls(name, *match.groups())
+
+
+class CoreCatalogue:
+    """Cached list of the core databases of a server, indexed for filtering.
+
+    The listing is refreshed when older than `ttl` seconds. Every name is parsed once into a CoreName,
+    and the names are indexed by build and Ensembl version (and sorted for the prefix lookups).
+    Some metadata of every core can be cached as well, see `get_metadata`.
+
+    Attributes:
+        server: Core server to list the databases from.
+        ttl: Time to live of the listing, in seconds (0 = always refresh).
+        meta_keys: Meta keys to cache for every core.
+    """
+
+    def __init__(
+        self,
+        server: "CoreServer",
+        ttl: float = 300,
+        meta_keys: Sequence[str] = ("species.production_name", "assembly.accession"),
+    ) -> None:
+        self.server = server
+        self.ttl = ttl
+        self.meta_keys = tuple(meta_keys)
+        self._loaded_at: Optional[float] = None
+        self._dbs: List[str] = []
+        self._parsed: Dict[str, Optional[CoreName]] = {}
+        self._sorted: List[str] = []
+        self._by_build: Dict[str, set] = {}
+        self._by_version: Dict[str, set] = {}
+        self._metadata: Dict[str, Dict[str, str]] = {}
+
+    def refresh(self) -> None:
+        """Reload the listing from the server and rebuild the indices."""
+        dbs = self.server.get_all_cores()
+        self._dbs = dbs
+        self._parsed = {db: CoreName.parse(db) for db in dbs}
+        self._sorted = sorted(dbs)
+        self._by_build = {}
+        self._by_version = {}
+        for db, parsed in self._parsed.items():
+            if parsed is None:
+                continue
+            self._by_build.setdefault(parsed.build, set()).add(db)
+            self._by_version.setdefault(parsed.version, set()).add(db)
+        # Only keep the metadata of the databases still present
+        self._metadata = {db: meta for db, meta in self._metadata.items() if db in self._parsed}
+        self._loaded_at = time.monotonic()
+
+    def _check_fresh(self) -> None:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.refresh()
+
+    def get_cores(self, prefix: str = "", build: str = "", version: str = "") -> List[str]:
+        """List the cached core databases, filtered if requested (see `CoreServer.get_cores`)."""
+        self._check_fresh()
+
+        selected = None
+        if prefix:
+            start = f"{prefix}_"
+            first = bisect_left(self._sorted, start)
+            selected = set()
+            for db in self._sorted[first:]:
+                if not db.startswith(start):
+                    break
+                selected.add(db)
+        if build:
+            with_build = self._by_build.get(str(build), set())
+            selected = with_build if selected is None else selected & with_build
+        if version:
+            with_version = self._by_version.get(str(version), set())
+            selected = with_version if selected is None else selected & with_version
+
+        if selected is None:
+            return list(self._dbs)
+        # Keep the server listing order
+        return [db for db in self._dbs if db in selected]
+
+    def get_parsed(self, db: str) -> Optional[CoreName]:
+        """Return the parsed name of a listed core database (None if it doesn't follow the pattern)."""
+        self._check_fresh()
+        return self._parsed.get(db)
+
+    def get_metadata(
+        self, dbs: Optional[List[str]] = None, batch_size: int = 100
+    ) -> Dict[str, Dict[str, str]]:
+        """Return the cached `meta_keys` values of the given core databases (all the listed ones by default).
+
+        Missing metadata are fetched in batches, with one query (a union over the meta tables) per batch.
+
+        Args:
+            dbs: Core databases to get the metadata for.
+            batch_size: Number of databases per query.
+
+        Returns:
+            A dict of {meta_key: meta_value} for every database.
+        """
+        self._check_fresh()
+        if dbs is None:
+            dbs = self._dbs
+        missing = [db for db in dbs if db not in self._metadata]
+        keys_str = ", ".join(["%s"] * len(self.meta_keys))
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            for db in batch:
+                self._metadata[db] = {}
+            query = " UNION ALL ".join(
+                [
+                    f"SELECT %s, meta_key, meta_value FROM `{db}`.meta WHERE meta_key IN ({keys_str})"
+                    for db in batch
+                ]
+            )
+            values = []
+            for db in batch:
+                values += [db, *self.meta_keys]
+            for db, key, value in self.server.iter_rows(query, values):
+                self._metadata[db][key] = value
+        return {db: self._metadata.get(db, {}) for db in dbs}
 
 
 class CoreServer:
@@ -31,50 +184,193 @@ class CoreServer:
         port
         user
         password (optional)
+        pool_size (optional): use a pool of connections, one per thread (0 = a single connection),
+            up to `MAX_POOL_SIZE`.
+        ping_interval (optional): check the connection (and reconnect if needed) before handing out a cursor,
+            if it has not been used for more than this many seconds (None = never check).
+        reconnect_attempts (optional): number of reconnection attempts.
+        reconnect_delay (optional): delay between reconnection attempts, in seconds.
+        catalogue_ttl (optional): time to live of the cached list of core databases, in seconds.
 
     To connect to a specific database:
     1) Create the core server object
     2) Set the database with core_server.set_database("dbname")
     3) Retrieve a cursor with core_server.get_cursor()
+
+    In the pooled mode, every thread gets its own connection from the pool (and its own current database),
+    so a single core server object can be shared between threads.
+
+    Queries can be timed by running them with `execute` or `iter_rows`; every function added with
+    `add_query_hook` is then called with the query, its duration and the number of rows.
     """
 
-    def __init__(self, host: str, port: str, user: str, password: str = "") -> None:
+    def __init__(
+        self,
+        host: str,
+        port: str,
+        user: str,
+        password: str = "",
+        pool_size: int = 0,
+        ping_interval: Optional[float] = 60,
+        reconnect_attempts: int = 3,
+        reconnect_delay: float = 5,
+        catalogue_ttl: float = 300,
+    ) -> None:
+        if not 0 <= pool_size <= MAX_POOL_SIZE:
+            raise ValueError(f"Connection pool size should be between 0 and {MAX_POOL_SIZE}, not {pool_size}")
         self.host = host
         self.port = port
         self.user = user
         self.password = password
+        self.pool_size = pool_size
+        self.ping_interval = ping_interval
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
         self._connector = None
+        self._pool = None
+        self._query_hooks: List[QueryHook] = []
+        self.catalogue = CoreCatalogue(self, ttl=catalogue_ttl)
+        # Connection state (connector, database, last use): per thread in the pooled mode
+        self._local = threading.local()
 
         # Start a connection directly
         self.connect()
 
     def connect(self) -> None:
-        """Create a connection to the database."""
-        self._connector = mysql.connector.connect(
-            user=self.user, passwd=self.password, host=self.host, port=self.port
-        )
+        """Create a connection to the database (or a pool of connections)."""
+        if self.pool_size:
+            self._pool = pooling.MySQLConnectionPool(
+                pool_name=f"core_server_{id(self)}",
+                pool_size=self.pool_size,
+                user=self.user,
+                passwd=self.password,
+                host=self.host,
+                port=self.port,
+            )
+        else:
+            self._connector = mysql.connector.connect(
+                user=self.user, passwd=self.password, host=self.host, port=self.port
+            )
+            self._shared_state = {
+                "connector": self._connector,
+                "database": None,
+                "last_used": time.monotonic(),
+            }
+
+    def _state(self) -> dict:
+        """Return the connection state of the current thread (shared if not pooled)."""
+        if self._pool is None:
+            return self._shared_state
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = {
+                "connector": self._pool.get_connection(),
+                "database": None,
+                "last_used": time.monotonic(),
+            }
+            self._local.state = state
+        return state
+
+    def _get_connector(self):
+        """Return a live connector, reconnect if it has been idle for too long and the connection was lost."""
+        state = self._state()
+        connector = state["connector"]
+        now = time.monotonic()
+        if self.ping_interval is not None and now - state["last_used"] > self.ping_interval:
+            if not connector.is_connected():
+                print("Connection lost, reconnecting", file=sys.stderr)
+                connector.reconnect(attempts=self.reconnect_attempts, delay=self.reconnect_delay)
+                if state["database"]:
+                    connector.database = state["database"]
+        state["last_used"] = now
+        return connector
 
     def set_database(self, db_name: str) -> None:
-        self._connector.database = db_name
+        self._get_connector().database = db_name
+        self._state()["database"] = db_name
+
+    def get_cursor(self, buffered: Optional[bool] = None, dictionary: Optional[bool] = None):
+        """Return a cursor for the current database.
+
+        Args:
+            buffered: Fetch whole result sets at once (True) or row by row from the server (False).
+                The connection default is used if None.
+            dictionary: Return rows as dicts instead of tuples.
+        """
+        return self._get_connector().cursor(buffered=buffered, dictionary=dictionary)
+
+    def close(self) -> None:
+        """Close the connection of the current thread (return it to the pool in the pooled mode)."""
+        state = self._state()
+        state["connector"].close()
+        if self._pool is not None:
+            del self._local.state
+
+    def add_query_hook(self, hook: QueryHook) -> None:
+        """Register a function to call after each timed query with (query, duration in seconds, rows)."""
+        self._query_hooks.append(hook)
+
+    def _run_query_hooks(self, query: str, duration: float, rows: int) -> None:
+        for hook in self._query_hooks:
+            hook(query, duration, rows)
+
+    def execute(self, query: str, values: Optional[Sequence[Any]] = None, **cursor_args):
+        """Run a query and time it, return the cursor.
+
+        The number of rows reported to the hooks is the cursor row count, so only the buffered cursors
+        report the number of rows of a result set (use `iter_rows` for the unbuffered ones).
+
+        Args:
+            query: SQL query.
+            values: Values for the query parameters.
+            cursor_args: See `get_cursor`.
+        """
+        cursor = self.get_cursor(**cursor_args)
+        start = time.perf_counter()
+        cursor.execute(query, values)
+        self._run_query_hooks(query, time.perf_counter() - start, cursor.rowcount)
+        return cursor
 
-    def get_cursor(self):
-        return self._connector.cursor()
+    def iter_rows(self, query: str, values: Optional[Sequence[Any]] = None, **cursor_args) -> Iterator:
+        """Run a query and yield its rows, time it (including fetching) when all the rows are read.
+
+        Args:
+            query: SQL query.
+            values: Values for the query parameters.
+            cursor_args: See `get_cursor`, unbuffered by default.
+        """
+        cursor_args.setdefault("buffered", False)
+        cursor = self.get_cursor(**cursor_args)
+        start = time.perf_counter()
+        cursor.execute(query, values)
+        rows = 0
+        for row in cursor:
+            rows += 1
+            yield row
+        self._run_query_hooks(query, time.perf_counter() - start, rows)
+
+    @staticmethod
+    def print_query_timing(query: str, duration: float, rows: int) -> None:
+        """Query hook printing the duration and number of rows of a query to stderr."""
+        query_str = " ".join(query.split())
+        print(f"[{duration:.3f}s, {rows} rows] {query_str}", file=sys.stderr)
 
     def get_all_cores(self) -> List[str]:
         """Query the server and retrieve all databases that look like Ensembl cores."""
 
         query = "SHOW DATABASES LIKE '%_core_%'"
 
-        cursor = self.get_cursor()
-        cursor.execute(query)
-
         dbs = []
-        for db in cursor:
+        for db in self.iter_rows(query):
             dbs.append(db[0])
         return dbs
 
     def get_cores(self, prefix: str = "", build: str = "", version: str = "") -> List[str]:
         """Provide a list of core databases, filtered if requested.
+
+        The list comes from the cached catalogue (see `CoreCatalogue`),
+        refreshed every `catalogue_ttl` seconds.
+
         Args:
             prefix: filter by prefix (automatically followed by _)
             build: filter by build
@@ -83,18 +379,7 @@ class CoreServer:
         Returns:
             A list of database names
         """
-        dbs = []
-
-        dbs = self.get_all_cores()
-
-        if prefix:
-            dbs = [db for db in dbs if db.startswith(f"{prefix}_")]
-        if build:
-            dbs = [db for db in dbs if re.search(f"_core_{build}_\d+_\d+$", db)]
-        if version:
-            dbs = [db for db in dbs if re.search(f"_core_\d+_{version}_\d+$", db)]
-
-        return dbs
+        return self.catalogue.get_cores(prefix=prefix, build=build, version=version)
 
 
 if __name__ == "__main__":
@@ -110,9 +395,20 @@ if __name__ == "__main__":
     parser.add_argument("--prefix", type=str, help="Prefix for the databases")
     parser.add_argument("--build", type=str, help="Build of the databases")
     parser.add_argument("--version", type=str, help="Ensembl version of the databases")
+    parser.add_argument(
+        "--metadata",
+        action="store_true",
+        help="Also print the species production name and assembly accession",
+    )
     args = parser.parse_args()
 
     # Start
     factory = CoreServer(host=args.host, port=args.port, user=args.user, password=args.password)
     dbs = factory.get_cores(prefix=args.prefix, build=args.build, version=args.version)
-    print("\n".join(dbs))
+    if args.metadata:
+        metadata = factory.catalogue.get_metadata(dbs)
+        for db in dbs:
+            meta = metadata[db]
+            print("\t".join([db] + [meta.get(key, "") for key in factory.catalogue.meta_keys]))
+    else:
+        print("\n".join(dbs))
@@ -16,11 +16,12 @@
 
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, List, Dict, Optional, Set, Tuple
+from typing import Any, List, Dict, Iterable, Iterator, Optional, Set, Tuple
 
-from ensembl.brc4.runnable.core_server import CoreServer
+from ensembl.brc4.runnable.core_server import MAX_POOL_SIZE, CoreServer
 
 
 BRC4_START_DATE = datetime(2020, 5, 1)
@@ -268,38 +269,59 @@ class DumpStableIDs:
             A list of all events.
 
         """
+        return list(self.iter_history())
 
+    def iter_history(self) -> Iterator[StableIdEvent]:
+        """Retrieve events from a database one mapping session at a time.
+
+        The pairs of a session are streamed from the server (unbuffered cursor), and only the pairs of
+        the current session are kept in memory.
+
+        Yields:
+            Events of every mapping session, as soon as the session is processed.
+
+        """
         sessions = self.get_mapping_sessions()
 
-        events = []
         for session in sessions:
             print(f"Mapping session {session['release']}")
-            pairs = self.get_pairs(session["id"])
-            session_events = self.make_events(pairs)
-            for event in session_events:
+            pairs = self.get_pairs(session["id"], buffered=False)
+            # Then analyse the pairs to make events
+            for event in self.make_events(pairs):
                 event.set_release(session["release"])
                 event.set_date(session["date"])
-            events += session_events
+                yield event
 
-        # Then analyse the pairs to make events
-        return events
-
-    def print_events(self, events: List[StableIdEvent], output_file: Path) -> None:
+    def print_events(self, events: Iterable[StableIdEvent], output_file: Path) -> Dict[str, int]:
         """Print events in a format for BRC.
 
+        Events are written as soon as they are provided, so a generator (see `iter_history`) can be used.
+        No file is created if there are no events.
+
         Args:
-            events: list of events for a given genome.
+            events: events for a given genome.
             output_file: where the events will be printed.
 
+        Returns:
+            The number of printed events for each event name.
+
         """
-        if not events:
-            print("No events to print")
-            return
-        with output_file.open("w") as out_fh:
+        stats: Dict[str, int] = {}
+        out_fh = None
+        try:
             for event in events:
-                event_lines = event.brc_format_2()
-                for line in event_lines:
+                if out_fh is None:
+                    out_fh = output_file.open("w")
+                for line in event.brc_format_2():
                     out_fh.write(line + "\n")
+                name = event.get_name()
+                stats[name] = stats.get(name, 0) + 1
+        finally:
+            if out_fh is not None:
+                out_fh.close()
+        if out_fh is None:
+            print("No events to print")
+        return stats
 
     def get_mapping_sessions(self) -> List[Dict]:
         """Retrieve the mapping sessions from the connected database.
@@ -311,21 +333,20 @@ class DumpStableIDs:
         query = """SELECT mapping_session_id, new_release, created
         FROM mapping_session
         """
-        cursor = self.server.get_cursor()
-        cursor.execute(query)
 
         sessions = []
-        for db in cursor:
+        for db in self.server.iter_rows(query):
             date = db[2]
             session = {"id": db[0], "release": db[1], "date": date}
             sessions.append(session)
         return sessions
 
-    def get_pairs(self, session_id: int) -> List[Dict]:
+    def get_pairs(self, session_id: int, buffered: Optional[bool] = None) -> List[Dict]:
         """Retrieve all pair of ids for a given session.
 
         Args:
             session_id: id of a session from the connected database.
+            buffered: Whether to fetch the whole result set at once, or stream it from the server (False).
 
         Returns:
             A list of all pairs of ids, as dicts: {'old_id': str, 'new_id': str}.
@@ -339,11 +360,9 @@ class DumpStableIDs:
         GROUP BY old_stable_id, new_stable_id, mapping_session_id
         """
         values = (session_id,)
-        cursor = self.server.get_cursor()
-        cursor.execute(query, values)
 
         pairs = []
-        for db in cursor:
+        for db in self.server.iter_rows(query, values, buffered=buffered):
             pair = {"old_id": db[0], "new_id": db[1]}
             pairs.append(pair)
         print(f"{len(pairs)} stable id events")
@@ -352,6 +371,12 @@ class DumpStableIDs:
     def make_events(self, pairs: List) -> List:
         """Given a list of pairs, create events.
 
+        Events are the connected components of the graph of old and new ids linked by the pairs. They are
+        found with a single union-find pass over the pairs, then every pair is assigned to its component.
+
+        Events are ordered by the first appearance of their old ids in the pairs, then the new genes events
+        by the first appearance of their new id.
+
         Args:
             pairs: list of dicts {'old_id': str, 'new_id': str}.
 
@@ -360,48 +385,65 @@ class DumpStableIDs:
 
         """
 
-        from_list = {}
-        to_list = {}
+        # Nodes of the graph: old and new ids are kept apart (an id could be both)
+        old_nodes: Dict[str, int] = {}
+        new_nodes: Dict[str, int] = {}
+        parent: List[int] = []
+
+        def find(node: int) -> int:
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        def get_node(nodes: Dict[str, int], stable_id: str) -> int:
+            node = nodes.get(stable_id)
+            if node is None:
+                node = len(parent)
+                nodes[stable_id] = node
+                parent.append(node)
+            return node
+
+        pair_nodes: List[int] = []
         for pair in pairs:
-            old_id = pair["old_id"]
-            new_id = pair["new_id"]
-            if old_id == None:
-                old_id = ""
-            if new_id == None:
-                new_id = ""
-
-            if old_id in from_list:
-                from_list[old_id].add(new_id)
-            else:
-                from_list[old_id] = set([new_id])
-
-            if new_id in to_list:
-                to_list[new_id].add(old_id)
-            else:
-                to_list[new_id] = set([old_id])
-
-        # Remove empty elements
-        for from_id in from_list:
-            from_list[from_id] = StableIdEvent.clean_set(from_list[from_id])
-        for to_id in to_list:
-            to_list[to_id] = StableIdEvent.clean_set(to_list[to_id])
-
-        events: List[StableIdEvent] = []
-        for old_id in from_list:
-            if not old_id or old_id not in from_list:
+            old_id = pair["old_id"] or ""
+            new_id = pair["new_id"] or ""
+            old_node = get_node(old_nodes, old_id) if old_id else None
+            new_node = get_node(new_nodes, new_id) if new_id else None
+            if old_node is not None and new_node is not None:
+                old_root = find(old_node)
+                new_root = find(new_node)
+                if old_root != new_root:
+                    # Link to the earliest seen node
+                    parent[max(old_root, new_root)] = min(old_root, new_root)
+            pair_nodes.append(old_node if old_node is not None else new_node)
+
+        # Group the ids by component, in order of first appearance (old ids first)
+        components: Dict[int, Tuple[Set[str], Set[str]]] = {}
+        for old_id, node in old_nodes.items():
+            components.setdefault(find(node), (set(), set()))[0].add(old_id)
+        for new_id, node in new_nodes.items():
+            components.setdefault(find(node), (set(), set()))[1].add(new_id)
+
+        events_by_root: Dict[int, StableIdEvent] = {}
+        for root, (from_set, to_set) in components.items():
+            event = StableIdEvent(from_set, to_set)
+            # The ids sets are complete, name the event once
+            event.get_name()
+            events_by_root[root] = event
+
+        # Assign every pair to its event in one sweep
+        for pair, node in zip(pairs, pair_nodes):
+            if node is None:
                 continue
-            event = StableIdEvent([old_id], from_list[old_id])
-            (event, from_list, to_list) = self.extend_event(event, from_list, to_list)
-            event.add_pairs(pairs)
-            events.append(event)
-
-        # Remaining events should only be new genes
-        for new_id in to_list:
-            if not new_id:
+            event = events_by_root[find(node)]
+            # Core db contains an empty line to signify that an old id has been removed
+            # in merge/split/mixed
+            if not pair["new_id"] and event.name != "deletion":
                 continue
-            event = StableIdEvent(to_list[new_id], [new_id])
-            event.add_pairs(pairs)
-            events.append(event)
+            event.add_pair(pair)
+
+        events: List[StableIdEvent] = list(events_by_root.values())
 
         stats = {}
         for event in events:
@@ -417,52 +459,58 @@ class DumpStableIDs:
 
         return events
 
-    def extend_event(
-        self, event: StableIdEvent, from_list: Dict[str, List[str]], to_list: Dict[str, List[str]]
-    ) -> Tuple[StableIdEvent, List, List]:
-        """Given an event, aggregate ids in the 'from' and 'to' sets, to connect the whole group.
 
-        Args:
-            event: the event to extend.
-            from_list: A dict a the from ids, and their corresponding to ids.
-            to_list: A dict of the to ids, and their corresponding from ids.
+class BulkDumpStableIDs:
+    """Dump the stable ids histories of several core databases from the same server concurrently.
+
+    Attributes:
+        server: A core server in the pooled mode, so every worker thread uses its own connection.
+        workers: Number of databases to dump concurrently (should not exceed the server pool size).
+
+    """
+
+    def __init__(self, server: CoreServer, workers: int = 4) -> None:
+        self.server = server
+        self.workers = workers
+
+    def dump_core(self, dbname: str, output_dir: Path) -> Dict[str, int]:
+        """Dump the stable ids history of one database to `output_dir`/`dbname`.tsv.
 
         Returns:
-            A tuple of the extended event, and the from_list and to_list from which the ids that
-            have been added to the event have been removed.
+            The number of events for each event name.
 
         """
+        self.server.set_database(dbname)
+        try:
+            dumper = DumpStableIDs(self.server)
+            return dumper.print_events(dumper.iter_history(), output_dir / f"{dbname}.tsv")
+        finally:
+            # Give the connection back to the pool
+            self.server.close()
 
-        extended = True
+    def dump_cores(self, dbs: List[str], output_dir: Path) -> Dict[str, Dict[str, int]]:
+        """Dump the stable ids histories of all the databases, one file per database.
 
-        while extended:
-            extended = False
-
-            # Extend the group in the to ids
-            for to_id in event.to_set:
-                if to_id in to_list:
-                    to_from_ids: List[str] = to_list[to_id]
-                    # Add to the from list?
-                    for to_from_id in to_from_ids:
-                        if not to_from_id in event.from_set:
-                            event.add_from(to_from_id)
-                            extended = True
+        Args:
+            dbs: List of database names (see `CoreServer.get_cores`).
+            output_dir: Directory where the files will be created.
 
-            # Extend the group in the from ids
-            for from_id in event.from_set:
-                if from_id in from_list:
-                    from_to_ids = from_list[from_id]
-                    # Add to the to list?
-                    for from_to_id in from_to_ids:
-                        if not from_to_id in event.to_set:
-                            event.add_to(from_to_id)
-                            extended = True
+        Returns:
+            A dict of event names counts for every database.
 
-        # Clean up
-        from_list = {from_id: from_list[from_id] for from_id in from_list if from_id not in event.from_set}
-        to_list = {to_id: to_list[to_id] for to_id in to_list if to_id not in event.to_set}
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(lambda dbname: self.dump_core(dbname, output_dir), dbs)
+            return dict(zip(dbs, results))
 
-        return (event, from_list, to_list)
+    @staticmethod
+    def print_summary(summary: Dict[str, Dict[str, int]], output_file: Path) -> None:
+        """Print the event names counts for every database in a TSV file: db name, event name, count."""
+        with output_file.open("w") as out_fh:
+            for dbname, stats in summary.items():
+                for name, count in sorted(stats.items()):
+                    out_fh.write(f"{dbname}\t{name}\t{count}\n")
 
 
 if __name__ == "__main__":
@@ -472,14 +520,45 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=str, required=True, help="Server port")
     parser.add_argument("--user", type=str, required=True, help="Server user")
     parser.add_argument("--password", type=str, help="Server password")
-    parser.add_argument("--dbname", type=str, required=True, help="Database name")
-    parser.add_argument("--output_file", type=str, required=True, help="Output file")
+    parser.add_argument("--dbname", type=str, help="Database name")
+    parser.add_argument("--output_file", type=str, help="Output file")
+
+    # Bulk mode: dump all the core databases selected by prefix/build/version
+    parser.add_argument("--prefix", type=str, help="Bulk mode: prefix for the databases")
+    parser.add_argument("--build", type=str, help="Bulk mode: build of the databases")
+    parser.add_argument("--version", type=str, help="Bulk mode: Ensembl version of the databases")
+    parser.add_argument("--output_dir", type=str, help="Bulk mode: output directory, one file per database")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help=f"Bulk mode: number of databases dumped at once (at most {MAX_POOL_SIZE - 1})",
+    )
+    parser.add_argument("--timing", action="store_true", help="Print queries duration and number of rows")
 
     args = parser.parse_args()
 
     # Start
-    factory = CoreServer(host=args.host, port=args.port, user=args.user, password=args.password)
-    factory.set_database(args.dbname)
-    dumper = DumpStableIDs(factory)
-    events = dumper.get_history()
-    dumper.print_events(events, Path(args.output_file))
+    # One pooled connection per worker in the bulk mode, plus one for the main thread
+    if not args.dbname and not 1 <= args.workers < MAX_POOL_SIZE:
+        parser.error(f"--workers should be between 1 and {MAX_POOL_SIZE - 1} (connection pool size limit)")
+    pool_size = 0 if args.dbname else args.workers + 1
+    factory = CoreServer(
+        host=args.host, port=args.port, user=args.user, password=args.password, pool_size=pool_size
+    )
+    if args.timing:
+        factory.add_query_hook(CoreServer.print_query_timing)
+    if args.dbname:
+        if not args.output_file:
+            parser.error("--output_file is required with --dbname")
+        factory.set_database(args.dbname)
+        dumper = DumpStableIDs(factory)
+        dumper.print_events(dumper.iter_history(), Path(args.output_file))
+    else:
+        if not args.output_dir:
+            parser.error("Either --dbname and --output_file, or --output_dir are required")
+        dbs = factory.get_cores(prefix=args.prefix, build=args.build, version=args.version)
+        bulk_dumper = BulkDumpStableIDs(factory, workers=args.workers)
+        output_dir = Path(args.output_dir)
+        summary = bulk_dumper.dump_cores(dbs, output_dir)
+        bulk_dumper.print_summary(summary, output_dir / "summary.tsv")
@@ -29,7 +29,7 @@ from BCBio import GFF
 from Bio import SeqIO
 import eHive
 
-from ensembl.brc4.runnable.utils import get_json
+from ensembl.brc4.runnable.utils import get_json, iter_json_array
 
 
 class integrity(eHive.BaseRunnable):
@@ -87,7 +87,6 @@ class integrity(eHive.BaseRunnable):
             # Get content from the manifest file and store it into following variables
             dna = {}
             pep = {}
-            seq_regions = {}
             seq_lengths = {}
             gff = {}
             func_ann = {}
@@ -112,11 +111,10 @@ class integrity(eHive.BaseRunnable):
                 errors += pep_errors
             if "seq_region" in manifest:
                 print("Got a seq_regions")
-                seq_regions = get_json(Path(manifest["seq_region"]))
                 seqr_lengths = {}
                 seqr_seqlevel = {}
                 # Store the length as int
-                for seq in seq_regions:
+                for seq in iter_json_array(Path(manifest["seq_region"])):
                     seq_lengths[seq["name"]] = int(seq["length"])
                     if seq["coord_system_level"] == "contig":
                         seqr_seqlevel[seq["name"]] = int(seq["length"])
@@ -181,13 +179,13 @@ class integrity(eHive.BaseRunnable):
 
                 # Check the seq.json intregrity
                 # Compare the length and id retrieved from seq.json to the gff
-                if seq_regions:
+                if seq_lengths:
                     errors += self.check_seq_region_lengths(
                         seq_lengths, gff["seq_region"], "Seq_regions metadata vs gff"
                     )
 
             # Check fasta dna and seq_region integrity
-            if dna and seq_regions:
+            if dna and seq_lengths:
                 errors += self.check_seq_region_lengths(seq_lengths, dna, "seq_regions json vs dna")
 
             # Check agp and seq_region integrity
@@ -276,24 +274,21 @@ class integrity(eHive.BaseRunnable):
             dict with gene and translation ids.
         """
 
-        # Load the json file
-        with open(json_path) as json_file:
-            data = json.load(json_file)
-
-            # Get gene ids and translation ids
-            genes = {}
-            translations = {}
-            tes = {}
+        # Get gene ids and translation ids
+        genes = {}
+        translations = {}
+        tes = {}
 
-            for item in data:
-                if item["object_type"] == "gene":
-                    genes[item["id"]] = 1
-                elif item["object_type"] == "translation":
-                    translations[item["id"]] = 1
-                if item["object_type"] == "transposable_element":
-                    tes[item["id"]] = 1
+        # Load the json file one item at a time
+        for item in iter_json_array(Path(json_path)):
+            if item["object_type"] == "gene":
+                genes[item["id"]] = 1
+            elif item["object_type"] == "translation":
+                translations[item["id"]] = 1
+            if item["object_type"] == "transposable_element":
+                tes[item["id"]] = 1
 
-            return {"genes": genes, "translations": translations, "transposable_elements": tes}
+        return {"genes": genes, "translations": translations, "transposable_elements": tes}
 
     def get_gff3(self, gff3_path):
         # Load the gff file
@@ -16,7 +16,7 @@
 
 
 import eHive
-import gzip
+import hashlib
 import io
 import json
 import os
@@ -27,6 +27,8 @@ import sys
 from collections import defaultdict
 from os.path import dirname, join as pj
 
+from ensembl.brc4.runnable.agp import ORIENTATIONS, AGPTable, load_agps, prune_agp_tables
+
 
 class load_sequence_data(eHive.BaseRunnable):
     """
@@ -95,6 +97,11 @@ class load_sequence_data(eHive.BaseRunnable):
             },
             # loading additional sequences to the already exsisting core db
             "load_additional_sequences": 0,
+            # incremental "load_additional_sequences" mode: compare FASTA, AGPs and seq_region.json
+            #   with the seq_regions already present in the core db and only load
+            #   (and add attributes and synonyms for) the new or changed ones
+            #   changed sequences (different length or md5) are only reported, their sequence is not reloaded
+            "incremental_additional_load": 0,
             # size of the sequence data chunk, if 0 (default), no chunking is performed
             "sequence_data_chunck": 0,
             #   min size of the sequence chunk, no chunking is done if 'sequence_data_chunck' < 'sequence_data_chunck_min'
@@ -111,7 +118,8 @@ class load_sequence_data(eHive.BaseRunnable):
         work_dir = self.param_required("work_dir")
 
         # initial sequence loading, using ensembl-analysis scripts
-        self.initial_sequence_loading(work_dir)
+        #   returns set of new or changed seq_region names in the incremental mode, None otherwise
+        regions_to_update = self.initial_sequence_loading(work_dir)
 
         # load data from the corresponding core db tables
         external_db_map = self.load_map_from_core_db(
@@ -129,6 +137,15 @@ class load_sequence_data(eHive.BaseRunnable):
         is_primary_assembly = self.from_param("manifest_data", "agp", not_throw=True) is None
         seq_region_file = self.from_param("manifest_data", "seq_region", not_throw=True)
 
+        #   only process new or changed seq_regions in the incremental mode
+        if regions_to_update is not None:
+            seq_region_file = self.subset_seq_region_file(
+                seq_region_file,
+                regions_to_update,
+                self.pjc(work_dir, "incremental", "seq_region.json"),
+                unversion=unversion,
+            )
+
         #   add seq_region synonyms
         self.add_sr_synonyms(
             seq_region_file,
@@ -174,6 +191,9 @@ class load_sequence_data(eHive.BaseRunnable):
         initial preparation and loading of AGPs and fasta data.
 
         initial preparation and loading of AGPs and fasta data using ensembl-analysis perl scripts
+
+        Returns set of the new or changed seq_region names
+        in the incremental "load_additional_sequences" mode, None otherwise.
         """
         # preprocess FASTA with sequences
         #   rename IUPAC to N symbols using sed
@@ -192,13 +212,51 @@ class load_sequence_data(eHive.BaseRunnable):
         # remove gaps and lower_level mappings if the are coveres by higher level ones
         #   i.e.: remove 'contigN to chromosomeZ', if 'contigN to scaffoldM' and 'scaffoldM to chromosomeZ' are in place
         #   returns None if no agps provided
-        agps_pruned_dir = self.pjc(work_dir, "agps_pruned")
-        agps_pruned = self.prune_agps(agps, cs_order, agps_pruned_dir, self.param_bool("prune_agp"))
+        #   AGPs are parsed only once and kept in memory as AGPTable objects
+        agps_pruned = self.prune_agps(agps, cs_order, self.param_bool("prune_agp"))
 
         # order
         # rank cs_names, met in agps.keys ("-" separated, i.e. "scaffold-contig") based on cs_order
         cs_rank = self.used_cs_ranks(agps_pruned, cs_order, noagps_cs)
 
+        # incremental mode, compare sequences and AGPs with the ones already loaded
+        #   only new sequences are left in fasta_clean
+        #   only AGP lines for the new or changed assembled seq_regions are left in agps_pruned
+        #   ranks are still derived from the full set of AGPs
+        regions_to_update = None
+        regions_to_reload = None
+        incremental = self.param_bool("load_additional_sequences") and self.param_bool(
+            "incremental_additional_load"
+        )
+        if incremental:
+            unversion = self.param_bool("unversion_scaffolds")
+            incremental_dir = pj(work_dir, "incremental")
+            regions_in_db = self.load_seq_regions_info_from_core_db(incremental_dir)
+            seq_cs = max(cs_rank.items(), key=lambda p: p[1])[0]
+            fasta_clean, regions_to_update = self.fasta_delta(
+                fasta_clean,
+                seq_cs,
+                regions_in_db,
+                self.pjc(work_dir, "fasta", "seq_no_iupac.delta.fasta"),
+                self.pjc(incremental_dir, "changed_regions.tsv"),
+                unversion=unversion,
+            )
+            if agps_pruned:
+                agps_pruned, changed_assemblies = self.agps_delta(
+                    agps_pruned,
+                    regions_in_db,
+                    self.load_assembly_info_from_core_db(incremental_dir),
+                    self.pjc(incremental_dir, "changed_assemblies.tsv"),
+                    unversion=unversion,
+                )
+                for agp_table in agps_pruned.values():
+                    regions_to_update.update(agp_table.asm_ids())
+                regions_to_update.update(name for _, name, *_ in changed_assemblies)
+                #   assembled seq_regions with changed components are kept in db and get their AGPs reloaded
+                regions_to_reload = self.reset_changed_assemblies(
+                    changed_assemblies, self.pjc(incremental_dir, "reset_assemblies")
+                )
+
         # chunk sequence data if needed
         #   no chunking if chunk_size < 50k
         chunk_size = int(self.param("sequence_data_chunck"))
@@ -213,7 +271,16 @@ class load_sequence_data(eHive.BaseRunnable):
         )
 
         # empty agps_pruned ignored
-        self.load_seq_data(fasta_clean, agps_pruned, cs_rank, self.pjc(work_dir, "load"))
+        #   pruned AGPs are serialized to the "agps_pruned" dir only when passed to the loaders
+        agps_pruned_dir = pj(work_dir, "agps_pruned")
+        self.load_seq_data(
+            fasta_clean,
+            agps_pruned,
+            cs_rank,
+            self.pjc(work_dir, "load"),
+            agps_pruned_dir,
+            present_regions=regions_to_reload,
+        )
 
         # mark all the "contig"s or noagp_cs as being sourced from ENA
         if not self.param_bool("no_contig_ena_attrib"):
@@ -239,6 +306,255 @@ class load_sequence_data(eHive.BaseRunnable):
         if not self.param_bool("load_additional_sequences"):
             self.nullify_ctg_cs_version(cs_order, self.pjc(work_dir, "asm_mapping", "nullify_cs_versions"))
 
+        return regions_to_update
+
+    def fasta_delta(
+        self,
+        fasta: str,
+        seq_cs: str,
+        regions_in_db: dict,
+        delta_fasta: str,
+        changed_report: str,
+        unversion: bool = False,
+    ) -> (str, set):
+        """
+        Store sequences not present in the core db from `fasta` to the `delta_fasta` file.
+
+        `regions_in_db` is a { (coord_system, name) : (seq_region_id, length, md5|None) } dict
+        (see `load_seq_regions_info_from_core_db`), sequences are looked up as the `seq_cs` coord_system ones.
+        Sequences with the names already in db, but with a different length
+        or md5 (of the upper-cased sequence) are reported to the `changed_report` file.
+        Their sequences are not reloaded.
+
+        If unversion is true, unversioned names are also looked up in `regions_in_db`.
+
+        Returns (delta_fasta, set of new and changed seq_region names).
+        """
+        # get length and md5 for every sequence
+        fasta_info = self.get_fasta_info(fasta)
+
+        new_regions = set()
+        changed_regions = []  # [ (name, db_length, fasta_length, db_md5, fasta_md5)... ]
+        for name, (length, md5) in fasta_info.items():
+            db_key = self.region_key_in_db(regions_in_db, seq_cs, name, unversion)
+            if db_key is None:
+                new_regions.add(name)
+                continue
+            _, db_length, db_md5 = regions_in_db[db_key]
+            if db_length != length or (db_md5 is not None and db_md5 != md5):
+                changed_regions.append((name, db_length, length, db_md5, md5))
+
+        # report changed regions
+        with open(changed_report, "w") as report:
+            print("\t".join(["name", "db_length", "length", "db_md5", "md5"]), file=report)
+            for changed in changed_regions:
+                print("\t".join(map(str, changed)), file=report)
+        if changed_regions:
+            print(
+                f"{len(changed_regions)} sequences differ from the ones in db, not reloading them."
+                f" See {changed_report}",
+                file=sys.stderr,
+            )
+
+        # store only new sequences
+        with open(fasta) as src, open(delta_fasta, "w") as dst:
+            keep = False
+            for line in src:
+                if line.startswith(">"):
+                    keep = line[1:].split(maxsplit=1)[0] in new_regions
+                if keep:
+                    dst.write(line)
+
+        return delta_fasta, new_regions | {changed[0] for changed in changed_regions}
+
+    def agps_delta(
+        self,
+        agps: dict,
+        regions_in_db: dict,
+        assembly_in_db: dict,
+        changed_report: str,
+        unversion: bool = False,
+    ) -> (dict, list):
+        """
+        Leave only AGP lines for the assembled seq_regions that are new or have different components.
+
+        `agps` is a { "asm-cmp" : AGPTable } dict, `regions_in_db` is a
+        { (coord_system, name) : (seq_region_id, length, md5|None) } dict
+        (see `load_seq_regions_info_from_core_db`) and `assembly_in_db` is a
+        { (asm_seq_region_id, cmp_coord_system) : set of components } dict
+        (see `load_assembly_info_from_core_db`).
+        Assembled seq_regions already in db, but with a different set of components (or their coordinates)
+        are reported to the `changed_report` file and their lines are renamed to use the db names.
+        Components already in db are renamed to their db names as well.
+
+        If unversion is true, unversioned names are also looked up in `regions_in_db`
+        and components are compared with no versions.
+
+        Returns ({ "asm-cmp" : AGPTable } dict, list of the changed ones).
+        The changed ones are (pair, name, db_name, seq_region_id, new_length) tuples.
+        """
+        delta = dict()
+        changed = []  # [ (pair, name, db_name, seq_region_id, new_length)... ]
+        changed_stats = []  # [ (pair, name, db_components, components)... ]
+        for pair, agp_table in agps.items():
+            asm_cs, cmp_cs = pair.split("-", 1)
+            components = defaultdict(set)
+            lengths = defaultdict(int)
+            for i, asm_id in enumerate(agp_table.asm_id):
+                cmp_id = agp_table.cmp_id[i]
+                if unversion:
+                    cmp_id = re.sub(r"\.\d+$", "", cmp_id)
+                components[asm_id].add(
+                    (
+                        cmp_id,
+                        agp_table.asm_start[i],
+                        agp_table.asm_end[i],
+                        agp_table.cmp_start[i],
+                        agp_table.cmp_end[i],
+                        ORIENTATIONS[agp_table.strand[i]] == "-" and -1 or 1,
+                    )
+                )
+                lengths[asm_id] = max(lengths[asm_id], agp_table.asm_end[i])
+
+            keep = dict()  # { name : db_name } for new and changed regions
+            for asm_id, asm_components in components.items():
+                db_key = self.region_key_in_db(regions_in_db, asm_cs, asm_id, unversion)
+                if db_key is None:
+                    keep[asm_id] = asm_id
+                    continue
+                seq_region_id = regions_in_db[db_key][0]
+                db_components = assembly_in_db.get((seq_region_id, cmp_cs), set())
+                if unversion:
+                    db_components = {(re.sub(r"\.\d+$", "", c[0]),) + c[1:] for c in db_components}
+                if db_components == asm_components:
+                    continue
+                keep[asm_id] = db_key[1]
+                changed.append((pair, asm_id, db_key[1], seq_region_id, lengths[asm_id]))
+                changed_stats.append((pair, asm_id, len(db_components), len(asm_components)))
+
+            agp_delta = agp_table.without_regions(agp_table.asm_ids() - keep.keys())
+            # components already in db are referenced by their db (possibly unversioned) names
+            cmp_names = dict()
+            for cmp_id in set(agp_delta.cmp_id):
+                cmp_key = self.region_key_in_db(regions_in_db, cmp_cs, cmp_id, unversion)
+                if cmp_key is not None and cmp_key[1] != cmp_id:
+                    cmp_names[cmp_id] = cmp_key[1]
+            delta[pair] = agp_delta.with_ids({k: v for k, v in keep.items() if k != v}, cmp_names)
+
+        # report changed assemblies
+        with open(changed_report, "w") as report:
+            print("\t".join(["pair", "name", "db_components", "components"]), file=report)
+            for changed_assembly in changed_stats:
+                print("\t".join(map(str, changed_assembly)), file=report)
+        if changed:
+            print(
+                f"{len(changed)} assembled sequences have different components in db, reloading their AGPs."
+                f" See {changed_report}",
+                file=sys.stderr,
+            )
+
+        return delta, changed
+
+    def reset_changed_assemblies(self, changed: list, log_pfx: str) -> dict:
+        """
+        Prepare assembled seq_regions with changed components for their AGPs to be reloaded.
+
+        `changed` is a [ (pair, name, db_name, seq_region_id, new_length)... ] list (see `agps_delta`).
+        Lengths of the seq_regions are updated,
+        their old assembly rows for the "cmp" coord_system are removed.
+
+        Returns { coord_system : set of names } dict of the seq_regions not to be created by the loaders.
+        """
+        present = defaultdict(set)
+        if not changed:
+            return present
+
+        self.update_db(
+            {seq_region_id: length for *_, seq_region_id, length in changed},
+            "seq_region",
+            ["seq_region_id"],
+            ["length"],
+            self.pjc(log_pfx, "lengths"),
+        )
+
+        by_cmp_cs = defaultdict(list)
+        for pair, _, db_name, seq_region_id, _ in changed:
+            asm_cs, cmp_cs = pair.split("-", 1)
+            by_cmp_cs[cmp_cs].append(str(seq_region_id))
+            present[asm_cs].add(db_name)
+
+        delete_sql_file = self.pjc(log_pfx, "delete.sql")
+        with open(delete_sql_file, "w") as sql:
+            for cmp_cs, seq_region_ids in by_cmp_cs.items():
+                ids_str = ", ".join(seq_region_ids)
+                print(
+                    f"""DELETE a FROM assembly a
+                          JOIN seq_region sr_c ON a.cmp_seq_region_id = sr_c.seq_region_id
+                          JOIN coord_system cs_c ON sr_c.coord_system_id = cs_c.coord_system_id
+                        WHERE a.asm_seq_region_id IN ({ids_str}) AND cs_c.name = "{cmp_cs}";""",
+                    file=sql,
+                )
+        self.run_sql_req(delete_sql_file, self.pjc(log_pfx, "delete"), from_file=True)
+        return present
+
+    def region_key_in_db(self, regions_in_db: dict, cs: str, name: str, unversion: bool = False) -> tuple:
+        """
+        Return the (coord_system, name) key for the `name` seq_region from `cs` in `regions_in_db`, or None
+
+        If unversion is true, the unversioned name is looked up as well.
+        """
+        key = (cs, name)
+        if key not in regions_in_db and unversion:
+            key = (cs, re.sub(r"\.\d+$", "", name))
+        if key not in regions_in_db:
+            return None
+        return key
+
+    def get_fasta_info(self, fasta: str) -> dict:
+        """
+        Get { name : (length, md5) } dict for the sequences from (uncompressed) FASTA file
+
+        md5 is calculated for the upper-cased sequence, as it is stored in the core db.
+        """
+        info = dict()
+        name, length, md5 = None, 0, None
+        with open(fasta) as src:
+            for line in src:
+                if line.startswith(">"):
+                    if name is not None:
+                        info[name] = (length, md5.hexdigest())
+                    name, length, md5 = line[1:].split(maxsplit=1)[0], 0, hashlib.md5()
+                    continue
+                seq = line.strip().upper()
+                if name is not None and seq:
+                    length += len(seq)
+                    md5.update(seq.encode())
+        if name is not None:
+            info[name] = (length, md5.hexdigest())
+        return info
+
+    def subset_seq_region_file(
+        self, seq_region_file: str, names: set, subset_file: str, unversion: bool = False
+    ) -> str:
+        """
+        Store seq_regions with the names from `names` set from `seq_region_file` into the `subset_file`.
+
+        If unversion is true, unversioned names from `names` are used as well.
+        Returns the `subset_file` path, or None if `seq_region_file` is not defined.
+        """
+        if not seq_region_file:
+            return None
+
+        if unversion:
+            names = names | {re.sub(r"\.\d+$", "", name) for name in names}
+
+        with open(seq_region_file) as in_file:
+            seq_regions = list(json.load(in_file))
+        subset = [seq_region for seq_region in seq_regions if seq_region["name"] in names]
+        with open(subset_file, "w") as out_file:
+            json.dump(subset, out_file, indent=2)
+        return subset_file
+
     def add_sr_synonyms(
         self,
         seq_region_file: str,
@@ -252,7 +568,8 @@ class load_sequence_data(eHive.BaseRunnable):
         Add seq_region_synonym from the seq_region_file meta data file.
 
         Add seq_region_synonym from the schemas/seq_region_schema.json compatible meta data file.
-        Merge with the already exinsting ones in the db.
+        Merge with the already exinsting ones in the db
+        (synonyms already present in db are skipped by the merging SQL).
 
         If unversion is true:
           * the unversioned synonym would be used to get the seq_region_id from "seq_region_map" if possible
@@ -266,14 +583,6 @@ class load_sequence_data(eHive.BaseRunnable):
         if not seq_region_file:
             return
 
-        # get seq_region ids, names, syns from db
-        synonyms_trios_db = self.load_seq_region_synonyms_trios_from_core_db(
-            self.pjc(work_dir, "syns_from_core")
-        )
-
-        # form set of synonyms already present in db
-        synonyms_in_db = frozenset([trio[2] for trio in synonyms_trios_db if trio[2] != "NULL"])
-
         # subset of sources to use the allowed the unversion synonyms
         unversionable_sources = unversion and unversionable_sources_set or frozenset()
 
@@ -314,19 +623,14 @@ class load_sequence_data(eHive.BaseRunnable):
                     if source in unversionable_sources:
                         unversioned_name = re.sub(r"\.\d+$", "", synonym_name)
 
-                    # put trios if names are not already seen in db
-                    if synonym_name not in synonyms_in_db:
-                        external_db_id = self.id_from_map_or_die(source, external_db_map, "external_db_map")
-                        synonyms_from_json.append(
-                            (seq_region_id, self.quote_or_null(synonym_name), external_db_id)
-                        )
+                    # put trios, names already present in db are filtered out on merging
+                    external_db_id = self.id_from_map_or_die(source, external_db_map, "external_db_map")
+                    synonyms_from_json.append(
+                        (seq_region_id, self.quote_or_null(synonym_name), external_db_id)
+                    )
 
                     #   put additional unversioned synonyms if there's a sane one
-                    if (
-                        unversioned_name
-                        and unversioned_name != synonym_name
-                        and unversioned_name not in synonyms_in_db
-                    ):
+                    if unversioned_name and unversioned_name != synonym_name:
                         synonyms_from_json.append(
                             (
                                 seq_region_id,
@@ -335,13 +639,13 @@ class load_sequence_data(eHive.BaseRunnable):
                             )
                         )
 
-        # run insertion SQL
-        self.insert_to_db(
+        # run merging SQL, skip synonyms already present in db
+        self.merge_to_db(
             synonyms_from_json,
             "seq_region_synonym",
             ["seq_region_id", "synonym", "external_db_id"],
             self.pjc(work_dir, "new_seq_region_synonyms"),
-            ignore=True,
+            match_cols=["synonym"],
         )
 
     def add_sr_attribs(
@@ -424,12 +728,11 @@ class load_sequence_data(eHive.BaseRunnable):
                         attrib_trios.append((seq_region_id, attrib_id, self.quote_or_null(value)))
 
         # run insertion SQL
-        self.insert_to_db(
+        self.merge_to_db(
             attrib_trios,
             "seq_region_attrib",
             ["seq_region_id", "attrib_type_id", "value"],
             self.pjc(work_dir, "brc4_ebi_seq_region_synonyms"),
-            ignore=True,
         )
 
     def flattern_seq_region_item(
@@ -519,12 +822,11 @@ class load_sequence_data(eHive.BaseRunnable):
                     brc4_ebi_name_attrib_trios.append((seq_region_id, attrib_id, self.quote_or_null(value)))
 
         # run insertion SQL
-        self.insert_to_db(
+        self.merge_to_db(
             brc4_ebi_name_attrib_trios,
             "seq_region_attrib",
             ["seq_region_id", "attrib_type_id", "value"],
             self.pjc(work_dir, "brc4_ebi_seq_region_synonyms"),
-            ignore=True,
         )
 
     def add_karyotype_data(
@@ -648,13 +950,13 @@ class load_sequence_data(eHive.BaseRunnable):
                         )
                     )
 
-        # run insertion SQL
-        self.insert_to_db(
+        # run merging SQL, skip bands already present in db
+        self.merge_to_db(
             band_tuples,
             "karyotype",
             ["seq_region_id", "seq_region_start", "seq_region_end", "band", "stain"],
             self.pjc(work_dir, "karyotype_insertion"),
-            ignore=True,
+            match_cols=["seq_region_id", "seq_region_start", "seq_region_end"],
         )
 
         # return resulting list of regions with bands trios
@@ -726,31 +1028,32 @@ class load_sequence_data(eHive.BaseRunnable):
             coord_system_tag_attrib_seq_region_update_ids.append(seq_region_id)
 
         # run insertion SQL for "karyotype_rank"
-        self.insert_to_db(
+        self.merge_to_db(
             rank_insertions_trios,
             "seq_region_attrib",
             ["seq_region_id", "attrib_type_id", "value"],
             self.pjc(work_dir, "karyotype_rank_insertion"),
-            ignore=True,
         )
 
         # run insertion SQL for "coord_system_tag"
-        self.insert_to_db(
+        self.merge_to_db(
             coord_system_tag_attrib_insertion_trios,
             "seq_region_attrib",
             ["seq_region_id", "attrib_type_id", "value"],
             self.pjc(work_dir, "coord_system_tag_insertion"),
-            ignore=True,
         )
 
         # forcing update of the "coord_system_tag"
         if force_update_coord_system_tag and coord_system_tag_attrib_seq_region_update_ids:
-            seq_region_ids_str = ",".join(map(str, coord_system_tag_attrib_seq_region_update_ids))
-            self.update_db_single_group(
-                {"value": self.quote_or_null(coord_system_tag)},
+            self.update_db(
+                {
+                    (seq_region_id, coord_system_tag_attrib_id): self.quote_or_null(coord_system_tag)
+                    for seq_region_id in coord_system_tag_attrib_seq_region_update_ids
+                },
                 "seq_region_attrib",
+                ["seq_region_id", "attrib_type_id"],
+                ["value"],
                 self.pjc(work_dir, "coord_system_tag_update"),
-                where=f"attrib_type_id = {coord_system_tag_attrib_id} and seq_region_id in ({seq_region_ids_str})",
             )
 
         # return resulting list of regions with bands trios
@@ -794,12 +1097,11 @@ class load_sequence_data(eHive.BaseRunnable):
 
         # run insertion SQL for "karyotype_rank"
         #    do not alter "coord_system_tag" anyhow in the case of the "chromosome" coord_system
-        self.insert_to_db(
+        self.merge_to_db(
             rank_insertions_trios,
             "seq_region_attrib",
             ["seq_region_id", "attrib_type_id", "value"],
             self.pjc(work_dir, "karyotype_rank_insertion"),
-            ignore=True,
         )
 
         return chromomes_seq_regions
@@ -847,12 +1149,11 @@ class load_sequence_data(eHive.BaseRunnable):
 
         # run insertion SQL for "karyotype_rank"
         #    do not alter "coord_system_tag" anyhow in the case of the "chromosome" coord_system
-        self.insert_to_db(
+        self.merge_to_db(
             rank_insertions_trios,
             "seq_region_attrib",
             ["seq_region_id", "attrib_type_id", "value"],
             self.pjc(work_dir, "karyotype_rank_insertion"),
-            ignore=True,
         )
 
     def unversion_scaffolds(self, cs_rank, logs):
@@ -925,11 +1226,17 @@ class load_sequence_data(eHive.BaseRunnable):
         # add agps entry
         if agps is None:
             agps = dict()
-        agps[f"{_cs_name}-{chunks_cs_name}"] = _out_agp
+        chunks_pair = f"{_cs_name}-{chunks_cs_name}"
+        agps[chunks_pair] = AGPTable.from_file(_out_agp, chunks_pair)
 
         return _out_fasta, cs_ranks, agps
 
-    def prune_agps(self, agps, cs_order, agps_pruned_dir, pruning=True):
+    def prune_agps(self, agps, cs_order, pruning=True):
+        """
+        Parse AGPs (once) and remove already used components.
+
+        Returns { "asm-cmp" : AGPTable } dict, with tables in the loading order; or None if no agps provided
+        """
         # when loading agp sort by:
         #   highest component (cmp) cs level (lowest rank)
         #   lowest difference between cs ranks (asm - cmp)
@@ -942,16 +1249,10 @@ class load_sequence_data(eHive.BaseRunnable):
         agp_levels_sorted = self.order_agp_levels(agps, cs_order)
 
         # prune agps
-        agps_pruned = dict()
-        used_components = set()
-        if not pruning:
-            used_components = None
-        for asm_cmp in agp_levels_sorted:
-            agp_file_src = agps[asm_cmp]
-            agp_file_dst = self.pjc(agps_pruned_dir, asm_cmp + ".agp")
-            if self.agp_prune(agp_file_src, agp_file_dst, used_components) > 0:
-                agps_pruned[asm_cmp] = agp_file_dst
-        return agps_pruned
+        #   gaps are dropped on parsing, as they are not used by
+        #   'ensembl-analysis/scripts/assembly_loading/load_agp.pl'
+        agp_tables = load_agps(agps, agp_levels_sorted)
+        return prune_agp_tables(agp_tables, pruning)
 
     def order_agp_levels(self, agps, cs_order):
         # sort agp for loading by:
@@ -971,28 +1272,40 @@ class load_sequence_data(eHive.BaseRunnable):
         agp_levels_sorted = [e[0] for e in sorted(agp_levels, key=lambda x: (-x[2], x[1] - x[2]))]
         return agp_levels_sorted
 
-    def load_seq_data(self, fasta, agps, cs_rank, log_pfx):
-        """loads sequence data for various coordinate systems accordingly with their rank"""
+    def load_seq_data(self, fasta, agps, cs_rank, log_pfx, agps_dir, present_regions=None):
+        """loads sequence data for various coordinate systems accordingly with their rank
+
+        `agps` is a { "asm-cmp" : AGPTable } dict, tables are stored in `agps_dir` to be used by the loaders
+        `present_regions` is an optional { cs : set of names } dict
+        of the assembled seq_regions already in db, only their AGPs are loaded
+        """
         asm_v = self.asm_name()
 
         sequence_rank = max(cs_rank.values())
         for (cs, rank) in sorted(cs_rank.items(), key=lambda p: -p[1]):
             logs = self.pjc(log_pfx, "%02d_%s" % (rank, cs))
             if rank == sequence_rank:
-                self.load_cs_data(cs, rank, "fasta", asm_v, fasta, logs, loaded_regions=None, seq_level=True)
+                self.load_cs_data(
+                    cs, rank, "fasta", asm_v, None, fasta, logs, loaded_regions=None, seq_level=True
+                )
             else:
                 useful_agps = list(filter(lambda x: cs in x, agps and agps.keys() or []))
                 if len(useful_agps) == 0:
                     raise Exception("non-seq_level cs %s has no agps to assemble it from" % (cs))
-                loaded_regions = set()
-                for pair, agp_file_pruned in map(lambda k: (k, agps[k]), useful_agps):
-                    if not pair.startswith(cs + "-"):
+                loaded_regions = set(present_regions and present_regions.get(cs) or [])
+                for pair, agp_table in map(lambda k: (k, agps[k]), useful_agps):
+                    if not pair.startswith(cs + "-") or len(agp_table) == 0:
                         continue
-                    self.load_cs_data(cs, rank, pair, asm_v, agp_file_pruned, logs, loaded_regions)
+                    agp_file = self.pjc(agps_dir, pair + ".agp")
+                    self.load_cs_data(cs, rank, pair, asm_v, agp_table, agp_file, logs, loaded_regions)
 
-    def load_cs_data(self, cs, rank, pair, asm_v, src_file, log_pfx, loaded_regions=None, seq_level=False):
+    def load_cs_data(
+        self, cs, rank, pair, asm_v, src, src_file, log_pfx, loaded_regions=None, seq_level=False
+    ):
         """creates a coord_system and loads sequence or assembly(AGP) data for corresponding seqregions
 
+        `src` is an AGPTable for the non sequence-level coord_systems
+        (`src_file` is used to store it for loaders), ignored otherwise.
         doesn't load already seen sequences
         """
         # NB load_seq_region.pl and load_agp.pl are not failing on parameter errors (0 exit code)
@@ -1001,73 +1314,15 @@ class load_sequence_data(eHive.BaseRunnable):
         if seq_level:
             self.load_seq_region(cs, rank, asm_v, src_file, log_pfx, seq_level, additional_load)
         elif loaded_regions is not None:
-            new_regions = set()
-            clean_file = src_file + ".regions_deduped"
-            self.filter_already_loaded_regions_from_agp(src_file, clean_file, loaded_regions, new_regions)
+            # store only lines for the assembled regions not loaded yet
+            new_regions_agp = src.without_regions(loaded_regions)
+            clean_file = new_regions_agp.write(src_file + ".regions_deduped")
             self.load_seq_region(cs, rank, asm_v, clean_file, log_pfx, seq_level, additional_load)
-            loaded_regions.update(new_regions)
+            loaded_regions.update(new_regions_agp.asm_ids())
         if not seq_level:
+            src.write(src_file)
             self.load_agp(pair, asm_v, src_file, log_pfx)
 
-    def filter_already_loaded_regions_from_agp(self, src_file, dst_file, loaded_regions, new_regions):
-        with open(src_file) as src:
-            with open(dst_file, "w") as dst:
-                for line in src:
-                    fields = line.strip().split("\t")
-                    (
-                        asm_id,
-                        asm_start,
-                        asm_end,
-                        asm_part,
-                        type_,
-                        cmp_id,
-                        cmp_start,
-                        cmp_end,
-                        cmp_strand,
-                    ) = fields
-                    if type_ in "NU" or asm_id in loaded_regions:
-                        continue
-                    new_regions.add(asm_id)
-                    print(line.strip(), file=dst)
-
-    def agp_prune(self, from_file: str, to_file: str, used: set = None):
-        """
-        Remove already components from the AGP file if they are seen in "used" set
-        """
-        # reomve used component
-        #   and GAPS as they are not used by 'ensembl-analysis/scripts/assembly_loading/load_agp.pl'
-        os.makedirs(dirname(to_file), exist_ok=True)
-        open_ = self.is_gz(from_file) and gzip.open or open
-        if used is None:
-            cmd = r"""{_cat} {_file} > {_out}""".format(
-                _cat=self.is_gz(from_file) and "zcat" or "cat", _file=from_file, _out=to_file
-            )
-            print("running %s" % (cmd), file=sys.stderr)
-            sp.run(cmd, shell=True, check=True)
-            return 1
-        writes = 0
-        with open_(from_file, "r") as src:
-            with open(to_file, "w") as dst:
-                for line in src:
-                    fields = line.strip().split("\t")
-                    (
-                        asm_id,
-                        asm_start,
-                        asm_end,
-                        asm_part,
-                        type_,
-                        cmp_id,
-                        cmp_start,
-                        cmp_end,
-                        cmp_strand,
-                    ) = fields
-                    if type_ in "NU" or cmp_id in used:
-                        continue
-                    used.add(cmp_id)
-                    print(line.strip(), file=dst)
-                    writes += 1
-        return writes
-
     def get_external_db_mapping(self) -> dict:
         """
         Get a map from a file for external_dbs to Ensembl dbnames from "external_db_map" module(!) param
@@ -1527,41 +1782,83 @@ class load_sequence_data(eHive.BaseRunnable):
             raise Exception(f"No '{table}' map loaded from '{out_file}'")
         return data
 
-    def load_seq_region_synonyms_trios_from_core_db(self, work_dir: str) -> list:
-        # was get_db_syns
+    def load_seq_regions_info_from_core_db(self, work_dir: str) -> dict:
         """
-        Load seq_region_synonyms from from core db into [(seq_region_id, name, synonym)...] list
+        Load { (coord_system, name) : (seq_region_id, length, md5|None) } dict for the core db seq_regions
 
+        md5 is calculated by db for the (upper-cased) sequence if there's one,
+        None for the assembled seq_regions.
         SQL code
         """
-        out_pfx = self.pjc(work_dir, f"seq_region_synonyms")
-        sql = r"""select sr.seq_region_id as seq_region_id, sr.name, srs.synonym
-                 from seq_region sr left join seq_region_synonym srs
-                 on sr.seq_region_id = srs.seq_region_id
-                 order by sr.seq_region_id
+        out_pfx = self.pjc(work_dir, "seq_regions_info")
+        sql = r"""select cs.name, sr.name, sr.seq_region_id, sr.length, md5(upper(d.sequence)) as md5
+                 from seq_region sr
+                 join coord_system cs on sr.coord_system_id = cs.coord_system_id
+                 left join dna d on sr.seq_region_id = d.seq_region_id
               ;"""
 
         res = self.run_sql_req(sql, out_pfx)
 
-        syn_trios = []
+        regions = dict()
         out_file = out_pfx + ".stdout"
-        with open(out_file) as syns_file:
+        with open(out_file) as info_file:
             skip_header = True
-            for line in syns_file:
+            for line in info_file:
                 if skip_header:
                     skip_header = False
                     continue
-                (sr_id, name, syn) = line.strip().split("\t")
-                syn_trios.append((sr_id, name, syn))
-        return syn_trios
+                cs, name, seq_region_id, length, md5 = line.rstrip("\n").split("\t")
+                regions[(cs, name)] = (int(seq_region_id), int(length), md5 != "NULL" and md5 or None)
+        return regions
+
+    def load_assembly_info_from_core_db(self, work_dir: str) -> dict:
+        """
+        Load { (asm_seq_region_id, cmp_coord_system) : set of components } dict for the core db assembly
 
-    def insert_to_db(
-        self, list_of_tuples: list, table_name: str, col_names: list, work_dir: str, ignore: bool = True
+        Components are (cmp_name, asm_start, asm_end, cmp_start, cmp_end, ori) tuples.
+        """
+        out_pfx = self.pjc(work_dir, "assembly_info")
+        sql = r"""select a.asm_seq_region_id, cs_c.name, sr_c.name,
+                        a.asm_start, a.asm_end, a.cmp_start, a.cmp_end, a.ori
+                 from assembly a
+                 join seq_region sr_c on a.cmp_seq_region_id = sr_c.seq_region_id
+                 join coord_system cs_c on sr_c.coord_system_id = cs_c.coord_system_id
+              ;"""
+
+        res = self.run_sql_req(sql, out_pfx)
+
+        assembly = defaultdict(set)
+        out_file = out_pfx + ".stdout"
+        with open(out_file) as info_file:
+            skip_header = True
+            for line in info_file:
+                if skip_header:
+                    skip_header = False
+                    continue
+                asm_seq_region_id, cmp_cs, cmp_name, *coords = line.rstrip("\n").split("\t")
+                assembly[(int(asm_seq_region_id), cmp_cs)].add((cmp_name, *map(int, coords)))
+        return assembly
+
+    def merge_to_db(
+        self,
+        list_of_tuples: list,
+        table_name: str,
+        col_names: list,
+        work_dir: str,
+        match_cols: list = None,
     ):
         """
-        Insert into the core db's {table_name} tuples from {list_of_tuples} as col_names.
+        Merge tuples from {list_of_tuples} (as col_names) into the core db's {table_name},
+        using a staging table.
 
-        Use `quote_or_null` (see definition below) method for string values, when putting values into `list_of_tuples`
+        Tuples are bulk-loaded into a temporary table with the same columns as {table_name}
+        and then merged with a single `INSERT IGNORE ... SELECT DISTINCT ... WHERE NOT EXISTS` request,
+        skipping rows having the same values for all {match_cols} (`col_names` by default)
+        as the ones already present in {table_name}.
+        So no need to dump the target table to filter out already existing rows on the client side.
+
+        Use `quote_or_null` (see definition below) method for string values,
+        when putting values into `list_of_tuples`
         SQL code
         """
         # return if nothing to do
@@ -1569,22 +1866,51 @@ class load_sequence_data(eHive.BaseRunnable):
             return
 
         # prepare request parts
-        ignore_str = ignore and "IGNORE" or ""
+        stage_table = f"tmp_stage_{table_name}"
         cols_str = ", ".join(col_names)
+        stage_cols_str = ", ".join([f"stage.{col}" for col in col_names])
+        match_str = " AND ".join([f"tgt.{col} <=> stage.{col}" for col in (match_cols or col_names)])
+
+        # generate file with the staging and merging SQL commands
+        #   all the statements are run in a single session, so the temporary table is visible for all of them
+        merge_sql_file = self.pjc(work_dir, "merge.sql")
+        with open(merge_sql_file, "w") as sql:
+            print(f"DROP TEMPORARY TABLE IF EXISTS {stage_table};", file=sql)
+            print(
+                f"CREATE TEMPORARY TABLE {stage_table} SELECT {cols_str} FROM {table_name} LIMIT 0;", file=sql
+            )
+            self.print_insert_values_sql(list_of_tuples, f"INSERT INTO {stage_table} ({cols_str})", sql)
+            print(
+                f"""INSERT IGNORE INTO {table_name} ({cols_str})
+                      SELECT DISTINCT {stage_cols_str} FROM {stage_table} stage
+                      WHERE NOT EXISTS (SELECT 1 FROM {table_name} tgt WHERE {match_str});""",
+                file=sql,
+            )
+            print(f"DROP TEMPORARY TABLE {stage_table};", file=sql)
+
+        # run merge SQL from file
+        self.run_sql_req(merge_sql_file, self.pjc(work_dir, "merge"), from_file=True)
 
-        # generate file with the insert SQL command
-        insert_sql_file = self.pjc(work_dir, "insert.sql")
-        with open(insert_sql_file, "w") as sql:
-            print(f"INSERT {ignore_str} INTO {table_name} ({cols_str}) VALUES", file=sql)
-            values_sep = ""
-            for tpl in list_of_tuples:
-                tpl_str = ", ".join(map(str, tpl))
-                print(f"{values_sep}({tpl_str})", file=sql)
-                values_sep = ", "
-            print(";", file=sql)
+    def print_insert_values_sql(
+        self, list_of_tuples: list, insert_str: str, out_file, batch_size: int = 10_000
+    ):
+        """
+        Print "{insert_str} VALUES (...), ...;" statements for `list_of_tuples` to `out_file`
 
-        # run insert SQL from file
-        self.run_sql_req(insert_sql_file, self.pjc(work_dir, "insert"), from_file=True)
+        No more than `batch_size` tuples per statement, not to hit the "max_allowed_packet" limit.
+        """
+        values_sep = None
+        for idx, tpl in enumerate(list_of_tuples):
+            if idx % batch_size == 0:
+                if values_sep is not None:
+                    print(";", file=out_file)
+                print(f"{insert_str} VALUES", file=out_file)
+                values_sep = ""
+            tpl_str = ", ".join(map(str, tpl))
+            print(f"{values_sep}({tpl_str})", file=out_file)
+            values_sep = ", "
+        if values_sep is not None:
+            print(";", file=out_file)
 
     def quote_or_null(self, val: str, quotes: str = "'", null: str = "NULL", strings_only=True) -> str:
         """
@@ -1600,36 +1926,120 @@ class load_sequence_data(eHive.BaseRunnable):
 
     def update_db_single_group(
         self, dict_of_col_to_value: dict, table_name: str, work_dir: str, where: str = None
-    ):
+    ) -> int:
         """
         Update given `table` name in db; set `col = val` for all key/value pairs from `dict_of_cols_to_values`
 
         If `where` condition is present its value is used for the "WHERE" SQL clause.
-        Use `quote_or_null` (see definition below) method for string values, when putting values into `list_of_tuples`
+        Use `quote_or_null` (see definition above) method for string values,
+        when putting values into `dict_of_col_to_value`
+        Returns the number of affected rows.
 
         SQL code
         """
         # return if nothing to do
         if not dict_of_col_to_value:
-            return
+            return 0
 
         # prepare request parts
         where_str = where and f"WHERE {where}" or ""
         col_val_str = ", ".join([f"{col} = {val}" for col, val in dict_of_col_to_value.items()])
 
-        # generate file with the insert SQL command
+        # generate file with the update SQL command
         update_sql_file = self.pjc(work_dir, "update.sql")
-        with open(insert_sql_file, "w") as sql:
+        with open(update_sql_file, "w") as sql:
             print(f"UPDATE {table_name} SET {col_val_str} {where_str};", file=sql)
-            values_sep = ""
-            for tpl in list_of_tuples:
-                tpl_str = ", ".join(map(str, tpl))
-                print(f"{values_sep}({tpl_str})", file=sql)
-                values_sep = ", "
-            print(";", file=sql)
-
-        # run insert SQL from file
-        self.run_sql_req(update_sql_file, self.pjc(work_dir, "update"), from_file=True)
+            print("SELECT ROW_COUNT() AS affected_rows;", file=sql)
+
+        # run update SQL from file
+        update_pfx = self.pjc(work_dir, "update")
+        self.run_sql_req(update_sql_file, update_pfx, from_file=True)
+        return self.affected_rows_from_sql_stdout(update_pfx + ".stdout")
+
+    def update_db(
+        self,
+        rows: dict,
+        table_name: str,
+        key_cols: list,
+        col_names: list,
+        work_dir: str,
+        where: str = None,
+    ) -> int:
+        """
+        Batched update of the core db's {table_name}, using a staging table.
+
+        `rows` is a { key : values } dict, where `key` is a tuple of values for `key_cols`
+        (or a single value if there's only one key column) and `values` is a tuple of new values
+        for `col_names` (or a single value).
+        Rows are bulk-loaded into a temporary table with the same columns as {table_name} and applied with
+        a single multi-table `UPDATE ... JOIN` request. `where` (if present) is added to the join condition,
+        target table is aliased as "tgt", staging table as "stage".
+
+        Use `quote_or_null` (see definition above) method for string values, when putting values into `rows`
+        Returns the number of affected rows (as reported by db, i.e. rows with actually changed values).
+        """
+        # return if nothing to do
+        if not rows:
+            return 0
+
+        # normalise keys and values to tuples
+        tuples = []
+        for key, values in rows.items():
+            key = key if isinstance(key, tuple) else (key,)
+            values = values if isinstance(values, tuple) else (values,)
+            if len(key) != len(key_cols) or len(values) != len(col_names):
+                raise Exception(f"Wrong number of keys or values for {table_name} update: {key} -> {values}")
+            tuples.append(key + values)
+
+        # prepare request parts
+        stage_table = f"tmp_update_{table_name}"
+        cols_str = ", ".join(key_cols + col_names)
+        set_str = ", ".join([f"tgt.{col} = stage.{col}" for col in col_names])
+        join_str = " AND ".join([f"tgt.{col} = stage.{col}" for col in key_cols])
+        where_str = where and f"AND ({where})" or ""
+
+        # generate file with the staging and update SQL commands
+        #   all the statements are run in a single session, so the temporary table is visible for all of them
+        update_sql_file = self.pjc(work_dir, "update.sql")
+        with open(update_sql_file, "w") as sql:
+            print(f"DROP TEMPORARY TABLE IF EXISTS {stage_table};", file=sql)
+            print(
+                f"CREATE TEMPORARY TABLE {stage_table} SELECT {cols_str} FROM {table_name} LIMIT 0;", file=sql
+            )
+            self.print_insert_values_sql(tuples, f"INSERT INTO {stage_table} ({cols_str})", sql)
+            print(
+                f"""UPDATE {table_name} tgt JOIN {stage_table} stage ON {join_str} {where_str}
+                      SET {set_str};""",
+                file=sql,
+            )
+            print("SELECT ROW_COUNT() AS affected_rows;", file=sql)
+            print(f"DROP TEMPORARY TABLE {stage_table};", file=sql)
+
+        # run update SQL from file
+        update_pfx = self.pjc(work_dir, "update")
+        self.run_sql_req(update_sql_file, update_pfx, from_file=True)
+        affected_rows = self.affected_rows_from_sql_stdout(update_pfx + ".stdout")
+        print(f"{affected_rows} rows updated in {table_name}", file=sys.stderr)
+        return affected_rows
+
+    def affected_rows_from_sql_stdout(self, in_file: str) -> int:
+        """
+        Get the "affected_rows" value from the SQL output
+
+        Uses the last "affected_rows" column value, 0 if there's none.
+        """
+        affected_rows = 0
+        with open(in_file) as sql_out:
+            header = None
+            for line in sql_out:
+                fields = line.strip().split("\t")
+                if fields == ["affected_rows"]:
+                    header = fields
+                    continue
+                if header:
+                    affected_rows = int(fields[0])
+                    header = None
+        return affected_rows
 
     def get_toplevel_from_cs(self, coord_system_name, work_dir) -> list:
         """
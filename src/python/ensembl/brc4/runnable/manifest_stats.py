@@ -27,7 +27,7 @@ from typing import Dict, List, TextIO
 from BCBio import GFF
 import eHive
 
-from ensembl.brc4.runnable.utils import get_json
+from ensembl.brc4.runnable.utils import get_json, iter_json_array
 
 
 class manifest_stats(eHive.BaseRunnable):
@@ -78,7 +78,7 @@ class manifest_stats(eHive.BaseRunnable):
 
     def get_seq_region_stats(self, seq_region_path: Path) -> List:
 
-        seq_regions = get_json(seq_region_path)
+        seq_regions = iter_json_array(seq_region_path)
 
         # Get basic data
         coord_systems = {}
@@ -17,11 +17,10 @@
 
 import datetime
 from pathlib import Path
-import requests
-import xml.etree.ElementTree as ET
 
 import eHive
 
+from ensembl.brc4.runnable.taxonomy_cache import DEFAULT_TTL, open_taxonomy_cache
 from ensembl.brc4.runnable.utils import print_json, get_json
 
 
@@ -51,6 +50,11 @@ class process_genome_data(eHive.BaseRunnable):
                 },
             },
             "accession_api_url": "https://www.ebi.ac.uk/ena/browser/api/xml/%s",
+            # Shared SQLite cache for the taxonomy lookups (in memory only if not set)
+            "taxonomy_cache": None,
+            "taxonomy_cache_ttl": DEFAULT_TTL,
+            # Offline mode: only use the cache (and this NCBI taxdump for the codon tables)
+            "taxdump_dir": None,
         }
 
     def run(self):
@@ -160,38 +164,15 @@ class process_genome_data(eHive.BaseRunnable):
     def get_taxonomy_from_accession(self, accession):
         """Provided an accession, get the associated taxonomy metadata"""
 
-        url = self.param("accession_api_url")
-
-        # Use the GenBank accession without version
-        gb_accession = accession.replace("GCF", "GCA")
-        gb_accession = gb_accession.split(".")[0]
-
-        response = requests.get(url % gb_accession)
-        entry_xml = response.text
-
-        entry = ET.fromstring(entry_xml)
-        taxon_node = entry.find(".//TAXON")
-
-        taxon_id = self.get_node_text(taxon_node, "TAXON_ID")
-        strain = self.get_node_text(taxon_node, "STRAIN")
-        scientific_name = self.get_node_text(taxon_node, "SCIENTIFIC_NAME")
-
-        if not taxon_id:
-            raise Exception("No taxon_id found for accession %s" % accession)
-        if not scientific_name:
-            raise Exception("No scientific_name found for accession %s" % accession)
-
-        taxonomy = {
-            "taxon_id": int(taxon_id),
-            "scientific_name": scientific_name,
-        }
-        if strain:
-            taxonomy["strain"] = strain
+        with open_taxonomy_cache(
+            self.param("taxonomy_cache"),
+            ttl=self.param("taxonomy_cache_ttl"),
+            taxdump_dir=self.param("taxdump_dir"),
+            accession_api_url=self.param("accession_api_url"),
+        ) as cache:
+            taxonomy = cache.get_accession_taxonomy(accession)
+            # Prefetch the codon table used later for the seq_regions of this genome
+            if self.param("taxonomy_cache"):
+                cache.prefetch_taxa([taxonomy["taxon_id"]])
 
         return taxonomy
-
-    def get_node_text(self, node, tag):
-        try:
-            return node.find(tag).text
-        except:
-            return
@@ -18,15 +18,78 @@
 from collections import Counter
 from pathlib import Path
 import re
+from sys import intern
 import tempfile
-from typing import List, TextIO
+from typing import Any, Dict, List, NamedTuple, Optional, Set, TextIO, Tuple
 
 import eHive
 from BCBio import GFF
 from Bio.SeqRecord import SeqRecord
 from Bio.SeqFeature import SeqFeature
 
-from ensembl.brc4.runnable.utils import print_json
+from ensembl.brc4.runnable.utils import JsonArrayWriter
+
+
+class FuncAnnRecord(NamedTuple):
+    """One functional annotation entry (see schemas/functional_annotation_schema.json)."""
+
+    object_type: str
+    id: str
+    description: Optional[str] = None
+    synonym: Optional[str] = None
+    is_pseudogene: bool = False
+
+    def to_json(self) -> Dict[str, Any]:
+        """Json object of the entry."""
+        feature_object: Dict[str, Any] = {"object_type": self.object_type, "id": self.id}
+        if self.description is not None:
+            feature_object["description"] = self.description
+        if self.synonym is not None:
+            feature_object["synonyms"] = {"synonym": self.synonym, "default": True}
+        if self.is_pseudogene:
+            feature_object["is_pseudogene"] = True
+        return feature_object
+
+
+class FunctionalAnnotations:
+    """Functional annotation entries accumulator, streamed to a json file one seq_region at a time.
+
+    Entries are deduplicated on insert: only the first entry for a given object type and ID is kept.
+    Only the keys of the entries already written are kept in memory.
+
+    Attributes:
+        writer: Writer of the functional annotation json file.
+        duplicates: Number of duplicate entries ignored.
+    """
+
+    def __init__(self, writer: JsonArrayWriter) -> None:
+        self.writer = writer
+        self.duplicates = 0
+        self._seen: Set[Tuple[str, str]] = set()
+        self._pending: List[FuncAnnRecord] = []
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def add(self, record: FuncAnnRecord) -> bool:
+        """Add an entry, unless one with the same object type and ID was already added.
+
+        Returns:
+            True if the entry was added.
+        """
+        key = (record.object_type, intern(record.id))
+        if key in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen.add(key)
+        self._pending.append(record)
+        return True
+
+    def flush(self) -> None:
+        """Write the pending entries to the json file."""
+        for record in self._pending:
+            self.writer.write(record.to_json())
+        self._pending = []
 
 
 class process_gff3(eHive.BaseRunnable):
@@ -221,9 +284,8 @@ class process_gff3(eHive.BaseRunnable):
         allowed_non_gene_types = self.param("non_gene_types")
         to_exclude = self.param("exclude_seq_regions")
 
-        functional_annotation = []
-
-        with out_gff_path.open("w") as gff3_out:
+        with out_gff_path.open("w") as gff3_out, JsonArrayWriter(out_funcann_path) as funcann_out:
+            functional_annotation = FunctionalAnnotations(funcann_out)
             new_records = []
             fail_types = {}
 
@@ -261,16 +323,18 @@ class process_gff3(eHive.BaseRunnable):
                     new_record.features.append(feat)
                 new_records.append(new_record)
 
+                # Write the functional annotation of this seq_region
+                functional_annotation.flush()
+
             if fail_types and not skip_unrecognized:
                 raise Exception(f"Unrecognized types found ({' '.join(fail_types.keys())}): fail")
 
             GFF.write(new_records, gff3_out)
 
-        # Write functional annotation
-        functional_annotation = self.clean_functional_annotations(functional_annotation)
-        print_json(out_funcann_path, functional_annotation)
+        if functional_annotation.duplicates:
+            print(f"Ignored {functional_annotation.duplicates} duplicate functional annotation entries")
 
-    def format_mobile_element(self, feat, functional_annotation):
+    def format_mobile_element(self, feat, functional_annotation: FunctionalAnnotations):
         """Given a mobile_genetic_element feature, transform it into a transposable_element"""
         quals = feat.qualifiers
 
@@ -310,12 +374,14 @@ class process_gff3(eHive.BaseRunnable):
 
         return feat
 
-    def normalize_gene(self, gene: SeqFeature, functional_annotation: List, fail_types: List) -> SeqFeature:
+    def normalize_gene(
+        self, gene: SeqFeature, functional_annotation: FunctionalAnnotations, fail_types: List
+    ) -> SeqFeature:
         """Returns a normalized gene structure, separate from the functional elements.
 
         Args:
             gene: Gene object to normalize.
-            functional_annotation: List of feature annotations (appended by this method).
+            functional_annotation: Feature annotations accumulator (added to by this method).
             fail_types: List of feature types that are not supported (appended by this method).
 
         """
@@ -463,13 +529,6 @@ class process_gff3(eHive.BaseRunnable):
 
         return gene
 
-    def clean_functional_annotations(self, functional_annotation: List) -> List:
-        """Returns the functional annotations list without putative product descriptions."""
-        for feat in functional_annotation:
-            if "description" in feat and not self.check_product(feat["description"]):
-                del feat["description"]
-        return functional_annotation
-
     def check_product(self, product: str) -> bool:
         """Check a product string.
 
@@ -743,42 +802,39 @@ class process_gff3(eHive.BaseRunnable):
 
         return transcript
 
-    def add_funcann_feature(self, funcann: List, feature: SeqFeature, feat_type: str) -> None:
-        """Append a feature object following the specifications.
+    def add_funcann_feature(
+        self, funcann: FunctionalAnnotations, feature: SeqFeature, feat_type: str
+    ) -> None:
+        """Add a feature object following the specifications.
 
         Args:
-            funcann: The list to which the feature object are appended.
-            feature: The SeqFeature to add to the list.
+            funcann: The accumulator to which the feature object is added.
+            feature: The SeqFeature to add.
             feat_type: Feature type of the feature to store (e.g. gene, transcript, translation).
 
         """
-
-        feature_object = {"object_type": feat_type, "id": feature.id}
-
-        # Description?
-        if "product" in feature.qualifiers:
-            description = feature.qualifiers["product"][0]
-            if self.check_product(description):
-                feature_object["description"] = description
-
-        if "Name" in feature.qualifiers and "description" not in feature_object:
-            name = feature.qualifiers["Name"][0]
-
-            # Exclude Name if it just a variant of the feature ID
-            if feature.id not in name:
-                feature_object["description"] = name
-
-        # Synonyms?
-        if "Name" in feature.qualifiers:
-            feat_name = feature.qualifiers["Name"][0]
-            if feat_name != feature.id:
-                feature_object["synonyms"] = {"synonym": feat_name, "default": True}
-
-        # is_pseudogene?
-        if feature.type.startswith("pseudogen"):
-            feature_object["is_pseudogene"] = True
-
-        funcann.append(feature_object)
+        qualifiers = feature.qualifiers
+        feat_name = qualifiers["Name"][0] if "Name" in qualifiers else None
+
+        # Description? (without putative product descriptions)
+        description = None
+        if "product" in qualifiers and self.check_product(qualifiers["product"][0]):
+            description = qualifiers["product"][0]
+        # Exclude Name if it just a variant of the feature ID
+        elif feat_name is not None and feature.id not in feat_name and self.check_product(feat_name):
+            description = feat_name
+
+        funcann.add(
+            FuncAnnRecord(
+                object_type=feat_type,
+                id=feature.id,
+                description=description,
+                # Synonyms?
+                synonym=feat_name if feat_name is not None and feat_name != feature.id else None,
+                # is_pseudogene?
+                is_pseudogene=feature.type.startswith("pseudogen"),
+            )
+        )
 
     def normalize_gene_id(self, gene: SeqFeature) -> str:
         """Remove any unnecessary prefixes around the gene ID.
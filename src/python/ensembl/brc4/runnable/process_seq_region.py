@@ -15,17 +15,18 @@
 # limitations under the License.
 
 
-import csv
 import gzip
+from operator import itemgetter
 from pathlib import Path
 import re
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List
 
 from Bio import SeqIO, SeqRecord
 import eHive
-import requests
 
-from ensembl.brc4.runnable.utils import print_json
+from ensembl.brc4.runnable.assembly_report import AssemblyReport
+from ensembl.brc4.runnable.taxonomy_cache import DEFAULT_TTL, TAXON_API_URL, open_taxonomy_cache
+from ensembl.brc4.runnable.utils import print_json_array
 
 
 SeqRegion = Dict[str, Any]
@@ -54,6 +55,10 @@ class process_seq_region(eHive.BaseRunnable):
         gbff: Path to the INSDC/RefSeq gbff file to parse.
         brc4_mode: Activate BRC4 mode (default).
         exclude_seq_regions: Array of seq_regions to not include in the new file.
+        taxonomy_cache: Path to a shared SQLite taxonomy cache (no persistent cache if not set).
+        taxonomy_cache_ttl: Lifetime of the taxonomy cache entries, in seconds.
+        taxdump_dir: Offline mode: get the codon tables from this NCBI taxdump instead of ENA.
+        taxon_api_url: ENA taxonomy REST API URL, with a "%s" placeholder for the taxon id.
 
     Predefined params:
         synonym_map: Map from the INSDC report column names to the seq_region field names.
@@ -90,6 +95,10 @@ class process_seq_region(eHive.BaseRunnable):
             },
             "location_codon": {"apicoplast_chromosome": 4},
             "exclude_seq_regions": [],
+            "taxonomy_cache": None,
+            "taxonomy_cache_ttl": DEFAULT_TTL,
+            "taxdump_dir": None,
+            "taxon_api_url": TAXON_API_URL,
         }
 
     def run(self):
@@ -129,7 +138,7 @@ class process_seq_region(eHive.BaseRunnable):
         self.add_mitochondrial_codon_table(seq_regions, genome_data["species"]["taxonomy_id"])
 
         # Print out the file
-        print_json(final_path, seq_regions)
+        print_json_array(final_path, seq_regions)
 
         # Flow out the file and type
         output = {"metadata_type": metadata_type, "metadata_json": str(final_path)}
@@ -145,9 +154,10 @@ class process_seq_region(eHive.BaseRunnable):
         Returns:
             A list of seq_regions with the ones from the exclusion list removed.
         """
+        to_exclude = set(to_exclude)
         new_seq_regions = []
         for seqr in seq_regions:
-            if "name" in seqr and seqr["name"] in to_exclude:
+            if seqr.get("name") in to_exclude:
                 print("Remove seq_region %s" % seqr["name"])
             else:
                 new_seq_regions.append(seqr)
@@ -168,10 +178,10 @@ class process_seq_region(eHive.BaseRunnable):
 
         for seqr in seq_regions:
             # Don't overwrite the existing codon table
-            if "codon_table" in seqr:
-                continue
-            if "location" in seqr and seqr["location"] in location_codon:
-                seqr["codon_table"] = location_codon[seqr["location"]]
+            if "codon_table" not in seqr:
+                codon_table = location_codon.get(seqr.get("location"))
+                if codon_table is not None:
+                    seqr["codon_table"] = codon_table
 
     def add_brc4_ebi_name(self, seq_regions: List[SeqRegion]) -> List[SeqRegion]:
         """Use the INSDC seq_region name without version as the default BRC4 and EBI names.
@@ -182,32 +192,27 @@ class process_seq_region(eHive.BaseRunnable):
         Note:
             The seq_region_names data are directly added to the SeqRegion if found.
         """
-        sources = self.param("brc4_synonym_sources")
+        # Choose the synonym to use as the BRC name: use the first valid name from the source list
+        # (the last synonym of a given source wins)
+        sources = dict.fromkeys(self.param("brc4_synonym_sources"))
+        source_rank = {source_name: rank for rank, source_name in enumerate(sources)}
 
-        new_seq_regions = []
         for seqr in seq_regions:
-            names = dict()
-            if "synonyms" in seqr:
-                for syn in seqr["synonyms"]:
-                    names[syn["source"]] = syn["name"]
-
-            # Choose the synonym to use as the BRC name
-            # Use the first valid name from the source list
             brc_name = ""
-            for source_name in sources:
-                if source_name in names:
-                    brc_name = names[source_name]
-                    break
+            best_rank = len(source_rank)
+            for syn in seqr.get("synonyms", ()):
+                rank = source_rank.get(syn["source"])
+                if rank is not None and rank <= best_rank:
+                    best_rank = rank
+                    brc_name = syn["name"]
 
             if not brc_name:
                 raise Exception(f"Can't set BRC4/EBI name for {seqr}")
 
-            brc_name = brc_name.partition(".")[0]
-            seqr["BRC4_seq_region_name"] = brc_name
+            seqr["BRC4_seq_region_name"] = brc_name.partition(".")[0]
             seqr["EBI_seq_region_name"] = seqr["name"]
-            new_seq_regions.append(seqr)
 
-        return new_seq_regions
+        return seq_regions
 
     def add_mitochondrial_codon_table(self, seq_regions: List[SeqRegion], tax_id: int) -> None:
         """Add the codon table for mitochondria based on taxonomy.
@@ -238,20 +243,13 @@ class process_seq_region(eHive.BaseRunnable):
         Returns:
             The codon table number if found. 0 otherwise.
         """
-        server = "https://www.ebi.ac.uk"
-        ext = "/ena/data/taxonomy/v1/taxon/tax-id/" + str(tax_id)
-        genetic_code = 0
-
-        r = requests.get(server + ext, headers={"Content-Type": "application/json"})
-        decoded = r.json()
-
-        try:
-            if "mitochondrialGeneticCode" in decoded:
-                genetic_code = int(decoded["mitochondrialGeneticCode"])
-        except KeyError:
-            print(f"No Mitochondria genetic code found for taxon {tax_id}")
-
-        return genetic_code
+        with open_taxonomy_cache(
+            self.param("taxonomy_cache"),
+            ttl=self.param("taxonomy_cache_ttl"),
+            taxdump_dir=self.param("taxdump_dir"),
+            taxon_api_url=self.param("taxon_api_url"),
+        ) as cache:
+            return cache.get_mito_codon_table(tax_id)
 
     def merge_regions(
         self, regions1: Dict[str, SeqRegion], regions2: Dict[str, SeqRegion]
@@ -271,35 +269,19 @@ class process_seq_region(eHive.BaseRunnable):
         if not regions2:
             regions2 = {}
 
-        # Get all the names
-        names1 = frozenset(regions1)
-        names2 = frozenset(regions2)
-        all_names = names1.union(names2)
-
         # Create the seq_regions, merge if needed
         seq_regions = []
-        for name in all_names:
-
-            seqr1 = {}
-            seqr2 = {}
-            if name in names1:
-                seqr1 = regions1[name]
-            if name in names2:
-                seqr2 = regions2[name]
-
-            final_seqr = {}
+        for name in regions1.keys() | regions2.keys():
+            seqr1 = regions1.get(name)
+            seqr2 = regions2.get(name)
             if seqr1 and seqr2:
-                final_seqr = {**seqr1, **seqr2}
-            elif seqr1:
-                final_seqr = seqr1
-            elif seqr2:
-                final_seqr = seqr2
+                seq_regions.append({**seqr1, **seqr2})
+            elif seqr1 or seqr2:
+                seq_regions.append(seqr1 or seqr2)
             else:
                 raise Exception(f"No seq_region found for {name}")
 
-            seq_regions.append(final_seqr)
-
-        seq_regions.sort(key=lambda x: x["name"])
+        seq_regions.sort(key=itemgetter("name"))
 
         return seq_regions
 
@@ -433,25 +415,20 @@ class process_seq_region(eHive.BaseRunnable):
             A dict of SeqRegions, with their name as the key.
         """
 
-        # Get the report in a CSV format, easier to manipulate
-        report_csv, metadata = self.report_to_csv(report_path)
-
-        # Feed the csv string to the CSV reader
-        reader = csv.DictReader(report_csv.splitlines(), delimiter="\t", quoting=csv.QUOTE_NONE)
-
-        # Metadata
-        assembly_level = "contig"
-        if "Assembly level" in metadata:
-            assembly_level = metadata["Assembly level"].lower()
-
-        # Create the seq_regions
         seq_regions = {}
-        for row in reader:
-            seq_region = self.make_seq_region(row, assembly_level, use_refseq)
-            if not seq_region:
-                continue
-            name = seq_region["name"]
-            seq_regions[name] = seq_region
+        with AssemblyReport(report_path) as report:
+            # Metadata
+            assembly_level = "contig"
+            if "Assembly level" in report.metadata:
+                assembly_level = report.metadata["Assembly level"].lower()
+
+            # Create the seq_regions
+            for row in report:
+                seq_region = self.make_seq_region(row, assembly_level, use_refseq)
+                if not seq_region:
+                    continue
+                name = seq_region["name"]
+                seq_regions[name] = seq_region
 
         return seq_regions
 
@@ -528,34 +505,3 @@ class process_seq_region(eHive.BaseRunnable):
         else:
             raise Exception("Unrecognized sequence role: %s" % seq_role)
         return seq_region
-
-    def report_to_csv(self, report_path: str) -> Tuple[str, dict]:
-        """Load an assembly report as a csv string.
-
-        Args:
-            report_path: path to a seq_region file from INSDC/RefSeq
-
-        Returns:
-            The data as a string in csv format, and the head metadata as a dict.
-        """
-
-        _open = report_path.endswith(".gz") and gzip.open or open
-        with _open(report_path, "rt") as report:
-            data = ""
-            metadata = {}
-            last_head = ""
-            for line in report:
-                # Ignore header
-                if line.startswith("#"):
-                    # Get metadata values if possible
-                    match = re.search("# (.+?): (.+?)$", line)
-                    if match:
-                        metadata[match.group(1)] = match.group(2)
-                    last_head = line
-                    continue
-                else:
-                    if last_head:
-                        data += last_head[2:].strip() + "\n"
-                        last_head = ""
-                    data += line
-            return data, metadata
@@ -15,26 +15,197 @@
 # limitations under the License.
 
 
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import eHive
-from jsonschema import validate
+from jsonschema.exceptions import best_match
+from jsonschema.protocols import Validator
+from jsonschema.validators import validator_for
 
-from ensembl.brc4.runnable.utils import get_json
+from ensembl.brc4.runnable.utils import get_json, iter_json_array
+
+
+# A validation error: JSON pointer to the wrong value in the file, and error message
+SchemaError = Tuple[str, str]
+
+# Top-level keys of a schema that do not constrain a top-level array of items
+_SCHEMA_METADATA_KEYS = frozenset(
+    ["$schema", "$id", "id", "title", "description", "definitions", "$defs", "examples"]
+)
+
+
+class SchemaValidationError(Exception):
+    """Raised when a json file does not follow its schema."""
+
+
+def _json_pointer(path: Iterable[Any]) -> str:
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in path)
+
+
+def _iter_schema_errors(
+    validator: Validator, instance: Any, prefix: Tuple[Any, ...] = ()
+) -> Iterator[SchemaError]:
+    """Yield the errors of an instance, using the most relevant sub-error for the "oneOf"/"anyOf" failures."""
+    for error in validator.iter_errors(instance):
+        if error.context:
+            error = best_match([error])
+        yield (_json_pointer([*prefix, *error.absolute_path]), error.message)
+
+
+def get_items_schema(schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Get the schema of the items, if the schema allows a top-level array of those items.
+
+    This is the case of the metadata schemas, defined as "oneOf" an object or an array of the same objects.
+    Validating each item of an array with the returned schema is then equivalent to validating the array.
+
+    Args:
+        schema: A json schema.
+
+    Returns:
+        The items schema (keeping the top-level definitions), or None if the schema has no such array branch.
+    """
+    branches = schema.get("oneOf") or schema.get("anyOf")
+    if not branches or not set(schema) - {"oneOf", "anyOf"} <= _SCHEMA_METADATA_KEYS:
+        return None
+    base = {key: value for key, value in schema.items() if key in _SCHEMA_METADATA_KEYS and key != "examples"}
+
+    array_branches = [branch for branch in branches if branch.get("type") == "array"]
+    if len(array_branches) != 1:
+        return None
+    array_branch = array_branches[0]
+    if not isinstance(array_branch.get("items"), dict):
+        return None
+    if set(array_branch) - {"type", "items", "description"}:
+        return None
+
+    # Only the array branch should accept an array (as "oneOf" requires)
+    for branch in branches:
+        if branch is not array_branch:
+            branch_schema = {**base, **branch}
+            if validator_for(branch_schema)(branch_schema).is_valid([]):
+                return None
+
+    return {**base, **array_branch["items"]}
+
+
+@lru_cache(maxsize=None)
+def _load_validator(schema_path: str, mtime: float, items_only: bool) -> Optional[Validator]:
+    schema = get_json(Path(schema_path))
+    if items_only:
+        schema = get_items_schema(schema)
+        if schema is None:
+            return None
+    validator_class = validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def get_validator(schema_path: Path, items_only: bool = False) -> Optional[Validator]:
+    """Get a compiled validator for a json schema file, loaded once per process (and schema file change).
+
+    Args:
+        schema_path: Path to the json schema.
+        items_only: Get a validator for the items of a top-level array instead (see `get_items_schema`).
+
+    Returns:
+        The validator, or None if `items_only` and the schema has no top-level array of items.
+    """
+    schema_path = Path(schema_path).resolve()
+    return _load_validator(str(schema_path), schema_path.stat().st_mtime, items_only)
+
+
+def _is_json_array(json_path: Path) -> bool:
+    with json_path.open("r") as json_file:
+        while True:
+            char = json_file.read(1)
+            if not char.isspace():
+                return char == "["
+
+
+def _validate_chunk(schema_path: Path, start: int, items: List[Any]) -> List[SchemaError]:
+    """Validate a chunk of the items of a top-level array, the first item being at index `start`."""
+    validator = get_validator(schema_path, items_only=True)
+    errors = []
+    for index, item in enumerate(items, start):
+        errors += _iter_schema_errors(validator, item, (index,))
+    return errors
+
+
+def _iter_chunks(items: Iterator[Any], chunk_size: int) -> Iterator[Tuple[int, List[Any]]]:
+    start = 0
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def validate_json_file(
+    json_path: Path, schema_path: Path, workers: int = 1, chunk_size: int = 10_000
+) -> List[SchemaError]:
+    """Validate a json file against a json schema, and get all the errors.
+
+    A top-level array is read item by item, and validated by chunks, in parallel if several workers are used.
+
+    Args:
+        json_path: Path to the json file to validate.
+        schema_path: Path to the json schema.
+        workers: Number of processes validating the chunks of a top-level array.
+        chunk_size: Number of items per chunk.
+
+    Returns:
+        The errors found, as pairs of JSON pointer and message (in the order of the file).
+    """
+    json_path = Path(json_path)
+    if not (_is_json_array(json_path) and get_validator(schema_path, items_only=True)):
+        return list(_iter_schema_errors(get_validator(schema_path), get_json(json_path)))
+
+    chunks = _iter_chunks(iter_json_array(json_path), chunk_size)
+    errors: List[SchemaError] = []
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            # Only keep a few chunks in flight, to not load the whole array
+            pending: Deque[Future] = deque()
+            for start, chunk in chunks:
+                pending.append(executor.submit(_validate_chunk, schema_path, start, chunk))
+                if len(pending) >= 2 * workers:
+                    errors += pending.popleft().result()
+            while pending:
+                errors += pending.popleft().result()
+    else:
+        for start, chunk in chunks:
+            errors += _validate_chunk(schema_path, start, chunk)
+    return errors
 
 
 class schema_validator(eHive.BaseRunnable):
     """Check a json file with a provided json schema.
 
+    The schemas are compiled once per worker process, and top-level arrays are validated item by item.
+
     Args:
         json_file: Path to the json to check.
         json_schema: Dict of json schema paths.
         metadata_type: Key to find to schema path to use from the json_schema.
+        workers: Number of processes to validate the items of a top-level array.
+        chunk_size: Number of array items validated at once by a process.
 
     Dataflows:
         None
     """
 
+    def param_defaults(self):
+        return {
+            "workers": 1,
+            "chunk_size": 10_000,
+        }
+
     def run(self):
         json_file = Path(self.param_required("json_file"))
         json_schemas = self.param_required("json_schema")
@@ -45,7 +216,17 @@ class schema_validator(eHive.BaseRunnable):
         else:
             raise Exception(f"Schema not defined: {metadata_type}")
 
-        file = get_json(json_file)
-        schema = get_json(json_schema)
-
-        validate(instance=file, schema=schema)
+        errors = validate_json_file(
+            json_file,
+            json_schema,
+            workers=int(self.param("workers")),
+            chunk_size=int(self.param("chunk_size")),
+        )
+        if errors:
+            for pointer, message in errors:
+                print(f"{json_file}#{pointer}: {message}")
+            first_pointer, first_message = errors[0]
+            raise SchemaValidationError(
+                f"{len(errors)} schema errors in {json_file} ({metadata_type}),"
+                f" first one at {first_pointer}: {first_message}"
+            )
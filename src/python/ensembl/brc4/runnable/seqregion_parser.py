@@ -14,10 +14,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import re
-import gzip
-import csv
-from typing import Any, Dict, Tuple
+from typing import Any, Dict
+
+from ensembl.brc4.runnable.assembly_report import AssemblyReport
 
 
 class SeqregionParser:
@@ -56,56 +55,21 @@ class SeqregionParser:
         """
         if accession.startswith("GCF"):
             use_refseq = True
-        # Get the report in a CSV format, easier to manipulate
-        report_csv, metadata = self.report_to_csv(report_path)
-
-        # Feed the csv string to the CSV reader
-        reader = csv.DictReader(report_csv.splitlines(), delimiter="\t", quoting=csv.QUOTE_NONE)
-
-        # Metadata
-        assembly_level = "contig"
-        if "Assembly level" in metadata:
-            assembly_level = metadata["Assembly level"].lower()
-
-        # Create the seq_regions
         seq_regions = {}
-        for row in reader:
-            seq_region = self.make_seq_region(row, assembly_level, use_refseq)
-            name = seq_region["name"]
-            seq_regions[name] = seq_region
+        with AssemblyReport(report_path) as report:
+            # Metadata
+            assembly_level = "contig"
+            if "Assembly level" in report.metadata:
+                assembly_level = report.metadata["Assembly level"].lower()
+
+            # Create the seq_regions
+            for row in report:
+                seq_region = self.make_seq_region(row, assembly_level, use_refseq)
+                name = seq_region["name"]
+                seq_regions[name] = seq_region
 
         return seq_regions
 
-    def report_to_csv(self, report_path: str) -> Tuple[str, dict]:
-        """Load an assembly report as a csv string.
-
-        Args:
-            report_path: Path to the INSDC seq_region report.
-        Returns:
-            The csv as a string, and the head metadata as a dict.
-        """
-
-        _open = report_path.endswith(".gz") and gzip.open or open
-        with _open(report_path, "rt") as report:
-            data = ""
-            metadata = {}
-            last_head = ""
-            for line in report:
-                # Ignore header
-                if line.startswith("#"):
-                    # Get metadata values if possible
-                    match = re.search("# (.+?): (.+?)$", line)
-                    if match:
-                        metadata[match.group(1)] = match.group(2)
-                    last_head = line
-                    continue
-                else:
-                    if last_head:
-                        data += last_head[2:].strip() + "\n"
-                        last_head = ""
-                    data += line
-            return data, metadata
-
     def make_seq_region(self, row: Dict[str, str], assembly_level: str, use_refseq: bool) -> Dict[str, Any]:
         """From a row of the report, create one seq_region dict.
 
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Persistent local cache for the taxonomy lookups made to ENA (taxonomy REST API and browser XML API)."""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+from pathlib import Path
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional
+import xml.etree.ElementTree as ET
+
+import requests
+
+
+TAXON_API_URL = "https://www.ebi.ac.uk/ena/data/taxonomy/v1/taxon/tax-id/%s"
+ACCESSION_API_URL = "https://www.ebi.ac.uk/ena/browser/api/xml/%s"
+# Default cache entries lifetime: 30 days
+DEFAULT_TTL = 30 * 24 * 3600
+
+Taxonomy = Dict[str, Any]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS taxon (
+    tax_id INTEGER PRIMARY KEY,
+    mito_codon_table INTEGER NOT NULL,
+    fetched REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS accession (
+    accession TEXT PRIMARY KEY,
+    taxon_id INTEGER NOT NULL,
+    scientific_name TEXT NOT NULL,
+    strain TEXT,
+    fetched REAL NOT NULL
+);
+"""
+
+
+class TaxonomyError(Exception):
+    """Raised when some taxonomy data can't be retrieved."""
+
+
+def genbank_accession(accession: str) -> str:
+    """GenBank assembly accession without version, as used for the lookups (GCF_000001.1 -> GCA_000001)."""
+    return accession.replace("GCF", "GCA").split(".")[0]
+
+
+class TaxonomyCache:
+    """SQLite-backed cache of the taxonomy data used to prepare the genomes.
+
+    Two lookups are cached:
+        - the mitochondrial codon table of a taxon (ENA taxonomy REST API),
+        - the taxonomy (taxon id, scientific name, strain) of an assembly accession (ENA browser XML API).
+
+    Entries older than `ttl` seconds are fetched again, unless the cache is offline: then stale entries are
+    used as they are, and missing codon tables are read from a local NCBI taxdump (nodes.dmp), if provided.
+    Missing entries can be retrieved for a whole batch of genomes at once with the prefetch methods.
+
+    Attributes:
+        db_path: Path to the SQLite file (created if needed), or ":memory:".
+        ttl: Lifetime of the cache entries, in seconds.
+        offline: Never query ENA.
+        taxdump_dir: Directory of an NCBI taxdump, used for the codon tables in offline mode.
+        taxon_api_url: ENA taxonomy REST API URL, with a "%s" placeholder for the taxon id.
+        accession_api_url: ENA browser XML API URL, with a "%s" placeholder for the accessions.
+        session: HTTP session used for the ENA queries (a new one, closed with the cache, by default).
+    """
+
+    def __init__(
+        self,
+        db_path: str = ":memory:",
+        ttl: float = DEFAULT_TTL,
+        offline: bool = False,
+        taxdump_dir: Optional[str] = None,
+        taxon_api_url: str = TAXON_API_URL,
+        accession_api_url: str = ACCESSION_API_URL,
+        timeout: float = 60,
+        workers: int = 8,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        self.db_path = str(db_path)
+        self.ttl = ttl
+        self.offline = offline
+        self.taxdump_dir = taxdump_dir
+        self.taxon_api_url = taxon_api_url
+        self.accession_api_url = accession_api_url
+        self.timeout = timeout
+        self.workers = workers
+        self._own_session = session is None
+        self._session = requests.Session() if session is None else session
+
+        if self.db_path != ":memory:":
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # The same cache file can be shared by several workers
+        #   keep the default rollback journal: WAL relies on shared memory, not working on network filesystems
+        self._db = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def __enter__(self) -> "TaxonomyCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+        if self._own_session:
+            self._session.close()
+
+    def _fresh_since(self) -> float:
+        """Oldest fetch time of the entries that can be used."""
+        if self.offline:
+            return float("-inf")
+        return time.time() - self.ttl
+
+    # Mitochondrial codon tables
+    def get_mito_codon_table(self, tax_id: int) -> int:
+        """Get the mitochondrial codon table of a taxon.
+
+        Args:
+            tax_id: Taxonomy id.
+
+        Returns:
+            The codon table number if found, 0 otherwise.
+        """
+        tax_id = int(tax_id)
+        cached = self._cached_codon_tables([tax_id])
+        if tax_id not in cached:
+            self.prefetch_taxa([tax_id])
+            cached = self._cached_codon_tables([tax_id])
+        return cached.get(tax_id, 0)
+
+    def _cached_codon_tables(self, tax_ids: Iterable[int]) -> Dict[int, int]:
+        tax_ids = list(tax_ids)
+        if not tax_ids:
+            return {}
+        placeholders = ",".join("?" * len(tax_ids))
+        rows = self._db.execute(
+            f"SELECT tax_id, mito_codon_table FROM taxon WHERE tax_id IN ({placeholders}) AND fetched >= ?",
+            [*tax_ids, self._fresh_since()],
+        )
+        return dict(rows.fetchall())
+
+    def prefetch_taxa(self, tax_ids: Iterable[int]) -> None:
+        """Retrieve and store the codon tables of all the taxa that are not (freshly) cached.
+
+        Online, the taxa are queried concurrently. Offline, they are read from the taxdump in a single pass.
+        """
+        tax_ids = {int(tax_id) for tax_id in tax_ids}
+        missing = tax_ids - self._cached_codon_tables(tax_ids).keys()
+        if not missing:
+            return
+
+        if self.offline:
+            if self.taxdump_dir:
+                self.import_taxdump(self.taxdump_dir, missing)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            codon_tables = list(executor.map(self._fetch_mito_codon_table, sorted(missing)))
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO taxon (tax_id, mito_codon_table, fetched) VALUES (?, ?, ?)",
+            [(tax_id, code, now) for tax_id, code in zip(sorted(missing), codon_tables)],
+        )
+        self._db.commit()
+
+    def _fetch_mito_codon_table(self, tax_id: int) -> int:
+        response = self._session.get(
+            self.taxon_api_url % tax_id, headers={"Content-Type": "application/json"}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        decoded = response.json()
+        # The taxon can be returned on its own, or in a list
+        if isinstance(decoded, list):
+            decoded = decoded[0] if decoded else {}
+        if "mitochondrialGeneticCode" in decoded:
+            return int(decoded["mitochondrialGeneticCode"])
+        print(f"No Mitochondria genetic code found for taxon {tax_id}")
+        return 0
+
+    def import_taxdump(self, taxdump_dir: str, tax_ids: Optional[Iterable[int]] = None) -> int:
+        """Store the mitochondrial codon tables from an NCBI taxdump nodes.dmp file.
+
+        Args:
+            taxdump_dir: Directory of the extracted taxdump.
+            tax_ids: Only import those taxa (all of them by default).
+
+        Returns:
+            The number of taxa imported.
+        """
+        nodes_path = Path(taxdump_dir, "nodes.dmp")
+        wanted = None if tax_ids is None else {int(tax_id) for tax_id in tax_ids}
+        fetched = nodes_path.stat().st_mtime
+
+        def _codon_tables():
+            with nodes_path.open("r") as nodes:
+                for line in nodes:
+                    # tax_id | parent | rank | embl code | division | inherited div | genetic code
+                    #   | inherited GC | mitochondrial genetic code | ...
+                    fields = line.split("\t|\t", 9)
+                    tax_id = int(fields[0])
+                    if wanted is None or tax_id in wanted:
+                        yield (tax_id, int(fields[8]), fetched)
+
+        cursor = self._db.executemany(
+            "INSERT OR REPLACE INTO taxon (tax_id, mito_codon_table, fetched) VALUES (?, ?, ?)",
+            _codon_tables(),
+        )
+        self._db.commit()
+        return cursor.rowcount
+
+    # Accessions taxonomy
+    def get_accession_taxonomy(self, accession: str) -> Taxonomy:
+        """Get the taxonomy metadata of an assembly accession.
+
+        Args:
+            accession: INSDC or RefSeq assembly accession (the GenBank accession without version is used).
+
+        Returns:
+            A dict with the keys "taxon_id", "scientific_name" and "strain" (only if there is one).
+
+        Raises:
+            TaxonomyError: If the taxonomy can't be found.
+        """
+        gb_accession = genbank_accession(accession)
+        cached = self._cached_accessions([gb_accession])
+        if gb_accession not in cached:
+            self.prefetch_accessions([gb_accession])
+            cached = self._cached_accessions([gb_accession])
+        if gb_accession not in cached:
+            raise TaxonomyError(f"No taxonomy found for accession {accession}")
+        return cached[gb_accession]
+
+    def _cached_accessions(self, accessions: Iterable[str]) -> Dict[str, Taxonomy]:
+        accessions = list(accessions)
+        if not accessions:
+            return {}
+        placeholders = ",".join("?" * len(accessions))
+        rows = self._db.execute(
+            "SELECT accession, taxon_id, scientific_name, strain FROM accession"
+            f" WHERE accession IN ({placeholders}) AND fetched >= ?",
+            [*accessions, self._fresh_since()],
+        )
+        cached = {}
+        for accession, taxon_id, scientific_name, strain in rows:
+            taxonomy: Taxonomy = {"taxon_id": taxon_id, "scientific_name": scientific_name}
+            if strain:
+                taxonomy["strain"] = strain
+            cached[accession] = taxonomy
+        return cached
+
+    def prefetch_accessions(self, accessions: Iterable[str], batch_size: int = 50) -> None:
+        """Retrieve and store the taxonomy of all the accessions that are not (freshly) cached.
+
+        The ENA browser API accepts a comma-separated list of accessions, so they are queried in batches.
+        Nothing is fetched in offline mode.
+        """
+        accessions = {genbank_accession(accession) for accession in accessions}
+        missing = sorted(accessions - self._cached_accessions(accessions).keys())
+        if not missing or self.offline:
+            return
+
+        batches = [missing[i : i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self._fetch_accessions, batches))
+        now = time.time()
+        rows = []
+        for taxonomies in results:
+            for accession, taxonomy in taxonomies.items():
+                rows.append(
+                    (
+                        accession,
+                        taxonomy["taxon_id"],
+                        taxonomy["scientific_name"],
+                        taxonomy.get("strain"),
+                        now,
+                    )
+                )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO accession (accession, taxon_id, scientific_name, strain, fetched)"
+            " VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._db.commit()
+
+    def _fetch_accessions(self, accessions: List[str]) -> Dict[str, Taxonomy]:
+        response = self._session.get(self.accession_api_url % ",".join(accessions), timeout=self.timeout)
+        response.raise_for_status()
+        root = ET.fromstring(response.text)
+        # One entry per assembly under the root (i.e. ASSEMBLY_SET/ASSEMBLY)
+        entries = [entry for entry in root if entry.get("accession")]
+        if len(accessions) == 1 and len(entries) == 1:
+            entries[0].set("accession", accessions[0])
+
+        taxonomies = {}
+        for entry in entries:
+            taxon_node = entry.find(".//TAXON")
+            if taxon_node is None or not entry.get("accession"):
+                continue
+            taxon_id = _get_node_text(taxon_node, "TAXON_ID")
+            scientific_name = _get_node_text(taxon_node, "SCIENTIFIC_NAME")
+            strain = _get_node_text(taxon_node, "STRAIN")
+            if not taxon_id or not scientific_name:
+                continue
+            taxonomy: Taxonomy = {"taxon_id": int(taxon_id), "scientific_name": scientific_name}
+            if strain:
+                taxonomy["strain"] = strain
+            taxonomies[genbank_accession(entry.get("accession"))] = taxonomy
+        return taxonomies
+
+    def prefetch_genomes(self, genome_jsons: Iterable[Path]) -> None:
+        """Prefetch the accessions taxonomy and the codon tables needed by a batch of genome json files."""
+        accessions = []
+        tax_ids = []
+        for genome_json in genome_jsons:
+            with Path(genome_json).open("r") as genome_file:
+                genome = json.load(genome_file)
+            accessions.append(genome["assembly"]["accession"])
+            if "taxonomy_id" in genome.get("species", {}):
+                tax_ids.append(genome["species"]["taxonomy_id"])
+        self.prefetch_accessions(accessions)
+        # The taxa of the accessions lookups are needed for the codon tables as well
+        cached = self._cached_accessions({genbank_accession(accession) for accession in accessions})
+        tax_ids += [taxonomy["taxon_id"] for taxonomy in cached.values()]
+        self.prefetch_taxa(tax_ids)
+
+
+def _get_node_text(node: ET.Element, tag: str) -> Optional[str]:
+    child = node.find(tag)
+    if child is None:
+        return None
+    return child.text
+
+
+def open_taxonomy_cache(
+    db_path: Optional[str] = None, ttl: float = DEFAULT_TTL, taxdump_dir: Optional[str] = None, **kwargs
+) -> TaxonomyCache:
+    """Open a taxonomy cache for the runnable params: in memory without a path, offline with a taxdump."""
+    return TaxonomyCache(
+        db_path or ":memory:", ttl=ttl, offline=bool(taxdump_dir), taxdump_dir=taxdump_dir, **kwargs
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefetch the taxonomy data of a batch of genomes")
+    parser.add_argument("--cache", type=str, required=True, help="Path to the SQLite cache file")
+    parser.add_argument("--genome_json", type=str, nargs="*", default=[], help="Genome json files")
+    parser.add_argument("--accession", type=str, nargs="*", default=[], help="Assembly accessions")
+    parser.add_argument("--tax_id", type=int, nargs="*", default=[], help="Taxonomy ids")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="Cache entries lifetime in seconds")
+    parser.add_argument(
+        "--taxdump_dir", type=str, help="Offline: NCBI taxdump directory for the codon tables"
+    )
+    args = parser.parse_args()
+
+    with open_taxonomy_cache(args.cache, ttl=args.ttl, taxdump_dir=args.taxdump_dir) as cache:
+        cache.prefetch_genomes(args.genome_json)
+        cache.prefetch_accessions(args.accession)
+        cache.prefetch_taxa(args.tax_id)
@@ -15,9 +15,17 @@
 # limitations under the License.
 
 
+from contextlib import contextmanager
+import gc
 import json
+from json.encoder import encode_basestring_ascii
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator, List, Optional, TextIO
+
+
+_INFINITY = float("inf")
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789+-.eE"
 
 
 def print_json(path: Path, data: Any) -> None:
@@ -31,11 +39,222 @@ def print_json(path: Path, data: Any) -> None:
         json_out.write(json.dumps(data, sort_keys=True, indent=4))
 
 
+def print_json_array(path: Path, items: Iterable[Any]) -> None:
+    """Json dumper for a (large) list, streamed to the file one item at a time.
+
+    The output is identical to `print_json` for the same list.
+
+    Args:
+        path: Path to the json to create.
+        items: Items of the list to store.
+    """
+    with JsonArrayWriter(path) as writer:
+        for item in items:
+            writer.write(item)
+
+
+class JsonArrayWriter:
+    """Write a json list to a file item by item, with the same format as `print_json`.
+
+    Usage:
+        with JsonArrayWriter(path) as writer:
+            writer.write(item)
+
+    Attributes:
+        path: Path to the json to create.
+        count: Number of items written so far.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.count = 0
+        self._json_out: Optional[TextIO] = None
+
+    def __enter__(self) -> "JsonArrayWriter":
+        self._json_out = self.path.open("w")
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, item: Any) -> None:
+        """Append one item to the list."""
+        parts = ["[\n    " if self.count == 0 else ",\n    "]
+        _encode_indented(item, "\n    ", parts)
+        self._json_out.write("".join(parts))
+        self.count += 1
+
+    def close(self) -> None:
+        """End the list and close the file."""
+        if self._json_out is not None:
+            self._json_out.write("\n]" if self.count else "[]")
+            self._json_out.close()
+            self._json_out = None
+
+
+def _encode_float(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == _INFINITY:
+        return "Infinity"
+    if value == -_INFINITY:
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def _encode_scalar(value: Any) -> str:
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return _encode_float(value)
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def _encode_key(key: Any) -> str:
+    if isinstance(key, str):
+        return encode_basestring_ascii(key)
+    if isinstance(key, (bool, int, float)) or key is None:
+        return f'"{_encode_scalar(key)}"'
+    raise TypeError(f"keys must be str, int, float, bool or None, not {key.__class__.__name__}")
+
+
+def _encode_indented(value: Any, indent: str, parts: List[str]) -> None:
+    """Append the json chunks of a value to `parts`, as `json.dumps(value, sort_keys=True, indent=4)` would.
+
+    This is equivalent to the pure Python encoder used by the json module when indenting, with fast paths
+    for the most common values (strings and integers in containers).
+
+    Args:
+        value: Value to encode.
+        indent: Current indentation (with a leading line break).
+        parts: List of chunks to add the value to.
+    """
+    if isinstance(value, dict):
+        if not value:
+            parts.append("{}")
+            return
+        inner = indent + "    "
+        separator = "{" + inner
+        for key, item in sorted(value.items()):
+            item_type = type(item)
+            if item_type is str:
+                parts.append(f"{separator}{_encode_key(key)}: {encode_basestring_ascii(item)}")
+            elif item_type is int:
+                parts.append(f"{separator}{_encode_key(key)}: {int.__repr__(item)}")
+            else:
+                parts.append(f"{separator}{_encode_key(key)}: ")
+                _encode_indented(item, inner, parts)
+            separator = "," + inner
+        parts.append(indent + "}")
+    elif isinstance(value, (list, tuple)):
+        if not value:
+            parts.append("[]")
+            return
+        inner = indent + "    "
+        separator = "[" + inner
+        for item in value:
+            if type(item) is str:
+                parts.append(separator + encode_basestring_ascii(item))
+            else:
+                parts.append(separator)
+                _encode_indented(item, inner, parts)
+            separator = "," + inner
+        parts.append(indent + "]")
+    else:
+        parts.append(_encode_scalar(value))
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Pause the garbage collector, which is triggered again and again when loading many objects at once."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
 def get_json(json_path: Path) -> Any:
     """Generic data json loader.
 
     Args:
         path: Path to the json file to load.
     """
-    with json_path.open("r") as json_file:
+    with json_path.open("r") as json_file, _gc_paused():
         return json.load(json_file)
+
+
+def iter_json_array(json_path: Path, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Incremental loader for a json file made of a (large) list, yielding one item at a time.
+
+    Only the current item (and the file chunk it is in) is kept in memory.
+
+    Args:
+        json_path: Path to the json file to load.
+        chunk_size: Number of characters to read from the file at once.
+
+    Raises:
+        ValueError: If the file is not a json list.
+    """
+    decoder = json.JSONDecoder()
+    with json_path.open("r") as json_file:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def _fill() -> None:
+            """Drop the parsed part of the buffer and read the next chunk (at least as big as the buffer)."""
+            nonlocal buffer, pos, eof
+            chunk = json_file.read(max(chunk_size, len(buffer) - pos))
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def _next_char() -> str:
+            """Move to the next non whitespace character and return it (empty string at the file end)."""
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return buffer[pos : pos + 1]
+                _fill()
+
+        if _next_char() != "[":
+            raise ValueError(f"Json file {json_path} does not contain a list")
+        pos += 1
+        if _next_char() == "]":
+            return
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                _fill()
+                continue
+            # A number may continue in the next chunk (i.e. "1.5" read from "1.5e10")
+            if not eof and (end == len(buffer) or buffer[end] in _NUMBER_CHARS):
+                _fill()
+                continue
+            pos = end
+            yield item
+
+            char = _next_char()
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Json file {json_path}: expected ',' or ']' at {buffer[pos : pos + 20]!r}")
+            pos += 1
+            _next_char()
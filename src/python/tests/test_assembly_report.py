@@ -0,0 +1,44 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the `assembly_report` module."""
+
+from pathlib import Path
+
+import pytest
+
+from ensembl.brc4.runnable.assembly_report import AssemblyReport
+
+REPORTS = Path(__file__).parent / "data" / "assembly_report"
+
+
+@pytest.mark.parametrize("report_name", ["report.txt", "report.txt.gz"])
+def test_assembly_report(report_name: str) -> None:
+    """Metadata and columns are read from the header, rows are yielded with the raw string values."""
+    with AssemblyReport(str(REPORTS / report_name)) as report:
+        assert report.metadata["Assembly level"].strip() == "Chromosome"
+        assert report.columns[0] == "Sequence-Name"
+        assert report.columns[-1] == "UCSC-style-name"
+        rows = list(report)
+
+    assert len(rows) == 2
+    assert rows[0]["GenBank-Accn"] == "CM000001.1"
+    # no conversion: the readers expect strings and "na" for the missing values
+    assert rows[0]["Sequence-Length"] == "1000"
+    assert rows[1]["RefSeq-Accn"] == "na"
+
+
+def test_assembly_report_not_open() -> None:
+    with pytest.raises(ValueError):
+        list(AssemblyReport(str(REPORTS / "report.txt")))
@@ -0,0 +1,239 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the batched db updates and the incremental loading deltas of the `load_sequence_data` runnable."""
+
+import hashlib
+import re
+import shutil
+from pathlib import Path
+from typing import List
+
+import pytest
+
+pytest.importorskip("eHive")
+
+from ensembl.brc4.runnable.agp import AGPTable
+from ensembl.brc4.runnable.load_sequence_data import load_sequence_data
+
+DB_CMD_OUTPUTS = Path(__file__).parent / "data" / "db_cmd"
+
+
+class RecordingLoader(load_sequence_data):
+    """`load_sequence_data` with the db requests recorded instead of run.
+
+    Every request gets the content of the `db_cmd_output` file (recorded `db_cmd.pl` output) as its stdout.
+    """
+
+    def __init__(self, db_cmd_output: Path) -> None:
+        # no eHive worker initialisation
+        self.db_cmd_output = db_cmd_output
+        self.requests: List[str] = []
+
+    def run_sql_req(self, sql, log_pfx, from_file=False):
+        if from_file:
+            sql = Path(sql).read_text()
+        self.requests.append(sql)
+        shutil.copyfile(self.db_cmd_output, log_pfx + ".stdout")
+
+
+def statements(sql: str) -> List[str]:
+    """Split SQL into statements with the whitespace normalised."""
+    return [re.sub(r"\s+", " ", stmt).strip() for stmt in sql.split(";") if stmt.strip()]
+
+
+@pytest.fixture(name="loader")
+def fixture_loader() -> RecordingLoader:
+    return RecordingLoader(DB_CMD_OUTPUTS / "update.stdout")
+
+
+def test_update_db_sql(loader: RecordingLoader, tmp_path: Path) -> None:
+    """Rows are staged in a temporary table and applied with a single `UPDATE ... JOIN`."""
+    affected_rows = loader.update_db(
+        {11: 1000, 12: 2000}, "seq_region", ["seq_region_id"], ["length"], str(tmp_path / "update")
+    )
+
+    assert affected_rows == 2
+    assert len(loader.requests) == 1
+    assert statements(loader.requests[0]) == [
+        "DROP TEMPORARY TABLE IF EXISTS tmp_update_seq_region",
+        "CREATE TEMPORARY TABLE tmp_update_seq_region SELECT seq_region_id, length FROM seq_region LIMIT 0",
+        "INSERT INTO tmp_update_seq_region (seq_region_id, length) VALUES (11, 1000) , (12, 2000)",
+        "UPDATE seq_region tgt JOIN tmp_update_seq_region stage"
+        " ON tgt.seq_region_id = stage.seq_region_id SET tgt.length = stage.length",
+        "SELECT ROW_COUNT() AS affected_rows",
+        "DROP TEMPORARY TABLE tmp_update_seq_region",
+    ]
+
+
+def test_update_db_composite_key(loader: RecordingLoader, tmp_path: Path) -> None:
+    """Tuple keys and values are matched to the columns, `where` is added to the join condition."""
+    q = loader.quote_or_null
+    loader.update_db(
+        {(1, q("a.1")): (q("x"), None), (2, q("b.1")): (q("y"), 5)},
+        "seq_region_attrib",
+        ["seq_region_id", "value"],
+        ["code", "rank"],
+        str(tmp_path / "update"),
+        where="tgt.attrib_type_id = 6",
+    )
+
+    stmts = statements(loader.requests[0])
+    assert stmts[2] == (
+        "INSERT INTO tmp_update_seq_region_attrib (seq_region_id, value, code, rank)"
+        " VALUES (1, 'a.1', 'x', None) , (2, 'b.1', 'y', 5)"
+    )
+    assert stmts[3] == (
+        "UPDATE seq_region_attrib tgt JOIN tmp_update_seq_region_attrib stage"
+        " ON tgt.seq_region_id = stage.seq_region_id AND tgt.value = stage.value"
+        " AND (tgt.attrib_type_id = 6)"
+        " SET tgt.code = stage.code, tgt.rank = stage.rank"
+    )
+
+
+def test_update_db_batches(loader: RecordingLoader, tmp_path: Path) -> None:
+    """Staged rows are inserted in batches, not to hit the "max_allowed_packet" limit."""
+    loader.update_db(
+        {i: i * 10 for i in range(25_000)}, "seq_region", ["seq_region_id"], ["length"], str(tmp_path / "u")
+    )
+
+    inserts = [stmt for stmt in statements(loader.requests[0]) if stmt.startswith("INSERT INTO")]
+    assert len(inserts) == 3
+    assert sum(stmt.count("(") - 1 for stmt in inserts) == 25_000
+
+
+def test_update_db_nothing_to_do(loader: RecordingLoader, tmp_path: Path) -> None:
+    assert loader.update_db({}, "seq_region", ["seq_region_id"], ["length"], str(tmp_path / "update")) == 0
+    assert not loader.requests
+
+
+def test_update_db_wrong_arity(loader: RecordingLoader, tmp_path: Path) -> None:
+    with pytest.raises(Exception, match="Wrong number of keys or values"):
+        loader.update_db({11: (1, 2)}, "seq_region", ["seq_region_id"], ["length"], str(tmp_path / "update"))
+    assert not loader.requests
+
+
+@pytest.mark.parametrize(
+    "db_cmd_output, expected",
+    [
+        ("update.stdout", 2),
+        ("update_unchanged.stdout", 0),
+        ("update_multi.stdout", 3),
+        ("empty.stdout", 0),
+    ],
+)
+def test_affected_rows_from_sql_stdout(loader: RecordingLoader, db_cmd_output: str, expected: int) -> None:
+    """The last "affected_rows" value is used, other result sets are ignored."""
+    assert loader.affected_rows_from_sql_stdout(str(DB_CMD_OUTPUTS / db_cmd_output)) == expected
+
+
+def md5(seq: str) -> str:
+    return hashlib.md5(seq.encode()).hexdigest()
+
+
+@pytest.mark.parametrize("unversion, new_name", [(False, "ctg1.1"), (True, "ctg1.1"), (True, "ctg9.1")])
+def test_fasta_delta(loader: RecordingLoader, tmp_path: Path, unversion: bool, new_name: str) -> None:
+    """Only new sequences are stored, changed ones are reported but not reloaded."""
+    regions_in_db = {
+        ("contig", "ctg1"): (1, 8, md5("ACGTACGT")),
+        ("contig", "ctg2"): (2, 4, md5("AAAA")),
+        ("contig", "ctg3"): (3, 4, md5("AAAA")),
+        ("scaffold", "ctg4"): (4, 4, None),
+    }
+    fasta = tmp_path / "seq.fasta"
+    fasta.write_text(f">{new_name} desc\nacgt\nACGT\n>ctg2\nAAAA\n>ctg3\nAAAC\n>ctg4\nAAAA\n>ctg5\nAA\nCC\n")
+
+    delta_fasta, regions = loader.fasta_delta(
+        str(fasta),
+        "contig",
+        regions_in_db,
+        str(tmp_path / "delta.fasta"),
+        str(tmp_path / "changed.tsv"),
+        unversion=unversion,
+    )
+
+    new = {"ctg4", "ctg5"} | ({new_name} if not unversion or new_name == "ctg9.1" else set())
+    assert regions == new | {"ctg3"}
+    names = [line[1:].split()[0] for line in Path(delta_fasta).read_text().splitlines() if line[0] == ">"]
+    assert set(names) == new
+    changed = [line.split("\t")[0] for line in (tmp_path / "changed.tsv").read_text().splitlines()]
+    assert changed == ["name", "ctg3"]
+
+
+def agp_table(pair: str, lines: List[str]) -> AGPTable:
+    table = AGPTable(pair)
+    for line in lines:
+        table.append(*line.split())
+    return table
+
+
+@pytest.fixture(name="assembly_in_db")
+def fixture_assembly_in_db() -> dict:
+    """Chromosomes chr1 (built from SCAF) and chr2 (built from SCAF2) with their scaffolds in db."""
+    regions_in_db = {
+        ("scaffold", "SCAF"): (10, 100, None),
+        ("scaffold", "SCAF2"): (11, 50, None),
+        ("chromosome", "chr1"): (20, 100, None),
+        ("chromosome", "chr2"): (21, 50, None),
+    }
+    assembly_in_db = {
+        (20, "scaffold"): {("SCAF", 1, 100, 1, 100, 1)},
+        (21, "scaffold"): {("SCAF2", 1, 50, 1, 50, 1)},
+    }
+    return {"regions_in_db": regions_in_db, "assembly_in_db": assembly_in_db}
+
+
+CHROMOSOME_AGP = [
+    "chr1 1 100 1 W SCAF.1 1 100 +",
+    "chr2 1 50 1 W SCAF2.1 1 50 +",
+    "chr2 51 60 2 W NEWSCAF.1 1 10 -",
+    "chr3 1 100 1 W SCAF.1 1 100 -",
+]
+
+
+def test_agps_delta_unversion(loader: RecordingLoader, tmp_path: Path, assembly_in_db: dict) -> None:
+    """New and changed assemblies are kept, components already in db get their (unversioned) db names."""
+    agps = {"chromosome-scaffold": agp_table("chromosome-scaffold", CHROMOSOME_AGP)}
+
+    delta, changed = loader.agps_delta(
+        agps, changed_report=str(tmp_path / "changed.tsv"), unversion=True, **assembly_in_db
+    )
+
+    assert list(delta["chromosome-scaffold"].lines()) == [
+        "chr2\t1\t50\t1\tW\tSCAF2\t1\t50\t+",
+        "chr2\t51\t60\t2\tW\tNEWSCAF.1\t1\t10\t-",
+        "chr3\t1\t100\t1\tW\tSCAF\t1\t100\t-",
+    ]
+    assert changed == [("chromosome-scaffold", "chr2", "chr2", 21, 60)]
+    report = (tmp_path / "changed.tsv").read_text().splitlines()
+    assert report[1:] == ["chromosome-scaffold\tchr2\t1\t2"]
+
+
+def test_agps_delta_versioned(loader: RecordingLoader, tmp_path: Path, assembly_in_db: dict) -> None:
+    """With no unversioning, components are compared and referenced by their full names."""
+    agps = {"chromosome-scaffold": agp_table("chromosome-scaffold", CHROMOSOME_AGP[:1])}
+
+    delta, changed = loader.agps_delta(agps, changed_report=str(tmp_path / "changed.tsv"), **assembly_in_db)
+
+    assert list(delta["chromosome-scaffold"].lines()) == ["chr1\t1\t100\t1\tW\tSCAF.1\t1\t100\t+"]
+    assert changed == [("chromosome-scaffold", "chr1", "chr1", 20, 100)]
+
+
+def test_agps_delta_unchanged(loader: RecordingLoader, tmp_path: Path, assembly_in_db: dict) -> None:
+    agps = {"chromosome-scaffold": agp_table("chromosome-scaffold", ["chr1 1 100 1 W SCAF 1 100 +"])}
+
+    delta, changed = loader.agps_delta(agps, changed_report=str(tmp_path / "changed.tsv"), **assembly_in_db)
+
+    assert len(delta["chromosome-scaffold"]) == 0
+    assert not changed
@@ -0,0 +1,178 @@
+# See the NOTICE file distributed with this work for additional information
+# regarding copyright ownership.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit tests for the `taxonomy_cache` module, with ENA replaced by a local stub HTTP server."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Iterator, List
+
+import pytest
+import requests
+
+from ensembl.brc4.runnable.taxonomy_cache import TaxonomyCache, TaxonomyError
+
+# Mitochondrial codon tables served by the stub taxonomy API
+CODON_TABLES = {7165: 5, 9606: 2}
+
+# Taxonomy served by the stub browser API
+ASSEMBLIES = {
+    "GCA_000005575": (180454, "Anopheles gambiae str. PEST", "PEST"),
+    "GCA_000001405": (9606, "Homo sapiens", None),
+}
+
+
+class StubENAHandler(BaseHTTPRequestHandler):
+    """Answer the taxonomy (JSON) and browser (XML) API requests from the tables above."""
+
+    # All the request paths, shared by the handler instances
+    requests: List[str] = []
+
+    def do_GET(self) -> None:
+        self.requests.append(" ".join(filter(None, [self.path, self.headers.get("X-Test")])))
+        if self.path.startswith("/taxon/"):
+            tax_id = int(self.path.rsplit("/", 1)[1])
+            if tax_id not in CODON_TABLES:
+                self.reply(404, "text/plain", "Not found")
+                return
+            body = json.dumps([{"taxId": str(tax_id), "mitochondrialGeneticCode": str(CODON_TABLES[tax_id])}])
+            self.reply(200, "application/json", body)
+        elif self.path.startswith("/xml/"):
+            entries = []
+            for accession in self.path.rsplit("/", 1)[1].split(","):
+                if accession not in ASSEMBLIES:
+                    continue
+                taxon_id, name, strain = ASSEMBLIES[accession]
+                strain_tag = f"<STRAIN>{strain}</STRAIN>" if strain else ""
+                entries.append(
+                    f'<ASSEMBLY accession="{accession}.1"><TAXON><TAXON_ID>{taxon_id}</TAXON_ID>'
+                    f"<SCIENTIFIC_NAME>{name}</SCIENTIFIC_NAME>{strain_tag}</TAXON></ASSEMBLY>"
+                )
+            self.reply(200, "application/xml", f"<ASSEMBLY_SET>{''.join(entries)}</ASSEMBLY_SET>")
+        else:
+            self.reply(404, "text/plain", "Not found")
+
+    def reply(self, code: int, content_type: str, body: str) -> None:
+        data = body.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture(name="ena_url", scope="module")
+def fixture_ena_url() -> Iterator[str]:
+    """Base URL of a local stub ENA server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubENAHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(name="ena_requests")
+def fixture_ena_requests() -> List[str]:
+    StubENAHandler.requests.clear()
+    return StubENAHandler.requests
+
+
+def open_cache(db_path: Path, ena_url: str, **kwargs) -> TaxonomyCache:
+    return TaxonomyCache(
+        str(db_path),
+        taxon_api_url=f"{ena_url}/taxon/%s",
+        accession_api_url=f"{ena_url}/xml/%s",
+        **kwargs,
+    )
+
+
+def test_codon_tables(tmp_path: Path, ena_url: str, ena_requests: List[str]) -> None:
+    """Codon tables are fetched once and then read from the cache file."""
+    db_path = tmp_path / "cache.sqlite"
+    with open_cache(db_path, ena_url) as cache:
+        assert cache.get_mito_codon_table(7165) == 5
+        assert cache.get_mito_codon_table(7165) == 5
+    assert ena_requests == ["/taxon/7165"]
+
+    with open_cache(db_path, ena_url) as cache:
+        cache.prefetch_taxa([7165, 9606])
+        assert cache.get_mito_codon_table(9606) == 2
+    assert ena_requests == ["/taxon/7165", "/taxon/9606"]
+
+
+def test_expired_entries(tmp_path: Path, ena_url: str, ena_requests: List[str]) -> None:
+    """Stale entries are fetched again online, but used as they are offline."""
+    db_path = tmp_path / "cache.sqlite"
+    with open_cache(db_path, ena_url) as cache:
+        cache.get_mito_codon_table(7165)
+    with sqlite3.connect(db_path) as db:
+        db.execute("UPDATE taxon SET fetched = 0")
+    with open_cache(db_path, ena_url, offline=True) as cache:
+        assert cache.get_mito_codon_table(7165) == 5
+        assert cache.get_mito_codon_table(9606) == 0
+    assert len(ena_requests) == 1
+    with open_cache(db_path, ena_url) as cache:
+        assert cache.get_mito_codon_table(7165) == 5
+    assert len(ena_requests) == 2
+
+
+def test_accessions_batches(tmp_path: Path, ena_url: str, ena_requests: List[str]) -> None:
+    """Accessions are queried in batches, using the unversioned GenBank accession."""
+    with open_cache(tmp_path / "cache.sqlite", ena_url, workers=1) as cache:
+        cache.prefetch_accessions(["GCF_000005575.2", "GCA_000001405.28", "GCA_000000000.1"], batch_size=2)
+        assert len(ena_requests) == 2
+        assert cache.get_accession_taxonomy("GCA_000005575.1") == {
+            "taxon_id": 180454,
+            "scientific_name": "Anopheles gambiae str. PEST",
+            "strain": "PEST",
+        }
+        assert cache.get_accession_taxonomy("GCF_000001405.40") == {
+            "taxon_id": 9606,
+            "scientific_name": "Homo sapiens",
+        }
+        assert len(ena_requests) == 2
+        with pytest.raises(TaxonomyError):
+            cache.get_accession_taxonomy("GCA_000000000.1")
+
+
+def test_http_errors(tmp_path: Path, ena_url: str, ena_requests: List[str]) -> None:
+    with open_cache(tmp_path / "cache.sqlite", ena_url) as cache:
+        with pytest.raises(requests.HTTPError):
+            cache.get_mito_codon_table(1)
+
+
+def test_injected_session(tmp_path: Path, ena_url: str, ena_requests: List[str]) -> None:
+    """An injected session is used for the queries and left open."""
+    with requests.Session() as session:
+        session.headers["X-Test"] = "injected"
+        with open_cache(tmp_path / "cache.sqlite", ena_url, session=session) as cache:
+            assert cache.get_mito_codon_table(9606) == 2
+        assert session.get(f"{ena_url}/taxon/7165").ok
+    assert ena_requests == ["/taxon/9606 injected", "/taxon/7165 injected"]
+
+
+def test_rollback_journal(tmp_path: Path, ena_url: str) -> None:
+    """The cache file keeps the default rollback journal, to be usable on network filesystems."""
+    db_path = tmp_path / "cache.sqlite"
+    with open_cache(db_path, ena_url):
+        pass
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "delete"